@@ -0,0 +1,38 @@
+''' 运行全部基准测试，可输出json用于对比不同版本
+
+    python -m benchmarks [--only sign,xml] [--json result.json] [--latency 0.002] [--error-rate 0.01] [-n 2000] [--concurrency 16]
+'''
+import argparse
+import importlib
+from . import bench_e2e
+from .common import dump
+
+# 名字 -> 模块，按顺序运行
+BENCHMARKS = ('import', 'sign', 'xml', 'nonce', 'refund_decode', 'notify_pool', 'e2e', 'retry')
+
+
+def main():
+    p = argparse.ArgumentParser(description='weixinpayx基准测试', parents=[bench_e2e.parser()])
+    p.add_argument('--only', help='只运行指定的测试，逗号分隔，可选：' + ','.join(BENCHMARKS))
+    p.add_argument('--json', help='结果写入的json文件')
+    args = p.parse_args()
+
+    names = args.only.split(',') if args.only else BENCHMARKS
+    for name in names:
+        if name not in BENCHMARKS:
+            p.error('未知的测试：%s' % name)
+
+    for name in names:
+        print('== %s' % name)
+        if name == 'e2e':
+            bench_e2e.main(args.latency, args.error_rate, args.n, args.concurrency)
+        else:
+            importlib.import_module('.bench_' + name, __package__).main()
+
+    if args.json:
+        dump(args.json, only=list(names), latency=args.latency, error_rate=args.error_rate,
+             n=args.n, concurrency=args.concurrency)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+''' 端到端基准测试：四个接口在本地MockServer上的吞吐量和延迟
+
+    python -m benchmarks.bench_e2e [--latency 0.002] [--error-rate 0.01] [-n 2000] [--concurrency 16]
+'''
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from weixinpayx import Unifiedorder, Orderquery, Refund, RefundQuery
+from weixinpayx.mock_server import MockServer
+from .common import KEY, record, percentile
+
+_APPID = 'wx0000000000000000'
+_MCH_ID = '10000100'
+
+
+def _run(name, call, n, concurrency):
+    latencies = []
+    errors = 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for ok, latency in executor.map(one, range(n)):
+            latencies.append(latency)
+            if not ok:
+                errors += 1
+    elapsed = time.perf_counter() - start
+
+    item = record(name, n=n, concurrency=concurrency, qps=n / elapsed, error_rate=errors / n,
+                  p50_ms=percentile(latencies, 0.5) * 1e3, p99_ms=percentile(latencies, 0.99) * 1e3,
+                  max_ms=max(latencies) * 1e3)
+    print('%-14s %8.0f req/s  error %5.1f%%  p50 %6.2fms  p99 %6.2fms  max %6.2fms' % (
+        name, item['qps'], item['error_rate'] * 100, item['p50_ms'], item['p99_ms'], item['max_ms']))
+    return item
+
+
+def _ok(res):
+    return isinstance(res, dict) and res.get('result_code') == 'SUCCESS'
+
+
+def main(latency=0, error_rate=0, n=2000, concurrency=16):
+    ''' 依次压测四个接口
+    --
+        @param latency: MockServer每个请求增加的延迟秒数
+        @param error_rate: MockServer返回SYSTEMERROR的概率
+        @param n: 每个接口的请求数
+        @param concurrency: 并发线程数
+    '''
+    with MockServer(KEY, latency=latency, error_rate=error_rate, seed=1) as mock:
+        transport = mock.transport(pool_maxsize=concurrency)
+        order = Unifiedorder(_APPID, _MCH_ID, KEY, transport)
+        query = Orderquery(_APPID, _MCH_ID, KEY, transport)
+        refund = Refund(_APPID, _MCH_ID, KEY, transport)
+        refundQuery = RefundQuery(_APPID, _MCH_ID, KEY, transport)
+
+        def pay(i):
+            res, pay = order.pay(1, 'o%d' % i, 'test', '127.0.0.1', 'https://example.com/notify', openid='o')
+            return _ok(res)
+
+        _run('unifiedorder', pay, n, concurrency)
+        _run('orderquery', lambda i: _ok(query.query(out_trade_no='o%d' % i)), n, concurrency)
+        _run('refund', lambda i: _ok(refund.refund('r%d' % i, 1, 1, out_trade_no='o%d' % i)), n, concurrency)
+        _run('refundquery', lambda i: _ok(refundQuery.query(out_refund_no='r%d' % i)), n, concurrency)
+        transport.close()
+
+
+def parser():
+    p = argparse.ArgumentParser(add_help=False)
+    p.add_argument('--latency', type=float, default=0, help='MockServer每个请求增加的延迟秒数')
+    p.add_argument('--error-rate', type=float, default=0, help='MockServer返回SYSTEMERROR的概率')
+    p.add_argument('-n', type=int, default=2000, help='每个接口的请求数')
+    p.add_argument('--concurrency', type=int, default=16, help='并发线程数')
+    return p
+
+
+if __name__ == '__main__':
+    args = argparse.ArgumentParser(parents=[parser()]).parse_args()
+    main(args.latency, args.error_rate, args.n, args.concurrency)
@@ -0,0 +1,53 @@
+''' 导入耗时基准测试，每种用法在新的解释器中测量，并检查加载了哪些第三方依赖
+
+    python -m benchmarks.bench_import
+'''
+import sys
+import json
+import subprocess
+from .common import record
+
+# 用法 -> 导入语句
+CASES = (
+    ('import weixinpayx', 'import weixinpayx'),
+    ('Signer', 'from weixinpayx import Signer'),
+    ('NotifyHandler', 'from weixinpayx import NotifyHandler'),
+    ('Orderquery', 'from weixinpayx import Orderquery'),
+    ('Transport', 'from weixinpayx import Transport'),
+    ('RefundDecode', 'from weixinpayx import RefundDecode'),
+    ('from weixinpayx import *', 'from weixinpayx import *'),
+)
+
+_HEAVY = ('requests', 'urllib3', 'Crypto', 'aiohttp')
+
+_SCRIPT = '''
+import sys, time, json
+start = time.perf_counter()
+%s
+seconds = time.perf_counter() - start
+print(json.dumps([seconds, [m for m in %r if m in sys.modules]]))
+'''
+
+
+def measure(stmt, repeat=5):
+    ''' 在新的解释器中执行导入语句
+    --
+        @return 最快一次的秒数, 加载的第三方依赖
+    '''
+    best = None
+    for i in range(repeat):
+        out = subprocess.check_output([sys.executable, '-c', _SCRIPT % (stmt, _HEAVY)])
+        seconds, heavy = json.loads(out)
+        best = seconds if best is None else min(best, seconds)
+    return best, heavy
+
+
+def main():
+    for name, stmt in CASES:
+        seconds, heavy = measure(stmt)
+        record('import ' + name, ms=seconds * 1e3, loaded=heavy)
+        print('%-40s %8.2f ms  %s' % (name, seconds * 1e3, ','.join(heavy) or '-'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+''' 随机字符串基准测试，对比原来每次新建Random逐个取字符的getRandomStr
+
+    python -m benchmarks.bench_nonce
+'''
+from random import Random
+from weixinpayx.nonce import NonceGenerator, NoncePool
+from .common import bench, report
+
+_chars = 'AaBbCcDdEeFfGgHhIiJjKkLlMmNnOoPpQqRrSsTtUuVvWwXxYyZz0123456789'
+
+
+def _legacyRandomStr(length=16):
+    ''' 原来的getRandomStr实现
+    --
+    '''
+    salt = ''
+    len_chars = len(_chars) - 1
+    random = Random()
+    for i in range(length):
+        salt += _chars[random.randint(0, len_chars)]
+    return salt
+
+
+def main():
+    base = bench(_legacyRandomStr)
+    report('getRandomStr(legacy)', base)
+    gen = NonceGenerator()
+    report('NonceGenerator.next', bench(gen.next), base)
+    pool = NoncePool(size=100000)
+    report('NoncePool.next', bench(pool.next), base)
+
+
+if __name__ == '__main__':
+    main()
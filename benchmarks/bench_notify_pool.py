@@ -0,0 +1,62 @@
+''' 回调通知多进程处理的扩展性测试：对比单进程NotifyHandler和不同进程数的NotifyPool的吞吐量
+
+    python -m benchmarks.bench_notify_pool
+'''
+import os
+import time
+from weixinpayx import NotifyHandler, NotifyPool
+from weixinpayx.signer import Signer
+from weixinpayx.wx_utils import dumpXML
+from .bench_refund_decode import SAMPLE_REQ_INFO, encrypt
+from .common import KEY, record
+
+
+def notifications(n):
+    ''' 生成n个通知，支付通知和退款通知各一半
+    --
+    '''
+    signer = Signer(KEY)
+    refund = dumpXML({'return_code': 'SUCCESS', 'appid': 'wxd930ea5d5a258f4f', 'mch_id': '10000100',
+                      'nonce_str': 'TeqClE3i0mvn3DrK', 'req_info': encrypt(KEY, SAMPLE_REQ_INFO)}, 'xml')
+    bodies = []
+    for i in range(n // 2):
+        values = {
+            'return_code': 'SUCCESS', 'result_code': 'SUCCESS', 'appid': 'wxd930ea5d5a258f4f',
+            'mch_id': '10000100', 'nonce_str': 'ibuaiVcKdpRxkhJA', 'openid': 'oUpF8uMuAJO_M2pxb1Q9zNjWeS6o',
+            'trade_type': 'JSAPI', 'bank_type': 'CMC', 'total_fee': '1', 'cash_fee': '1',
+            'transaction_id': '4200000%021d' % i, 'out_trade_no': 'o%d' % i, 'time_end': '20141030133525',
+        }
+        values['sign'] = signer.sign(values)
+        bodies.append(dumpXML(values, 'xml'))
+        bodies.append(refund)
+    return bodies
+
+
+def _run(name, parse, bodies, base=None):
+    start = time.perf_counter()
+    res = parse(bodies)
+    seconds = time.perf_counter() - start
+    assert all(res), '有通知校验失败'
+    rate = len(bodies) / seconds
+    item = record(name, per_second=rate, speedup=rate / base if base else 1.0)
+    print('%-28s %10.0f notifications/s  x%.2f' % (name, rate, item['speedup']))
+    return rate
+
+
+def main(n=20000):
+    bodies = notifications(n)
+    handler = NotifyHandler(KEY)
+    base = _run('NotifyHandler.parse', lambda bodies: [handler.parse(body) for body in bodies], bodies)
+
+    processes = 1
+    cpus = os.cpu_count() or 1
+    while True:
+        with NotifyPool(KEY, processes=processes) as pool:
+            _run('NotifyPool(processes=%d)' % processes, pool.parseMany, bodies, base)
+        if processes >= cpus:
+            break
+        processes = min(processes * 2, cpus)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+''' 退款回调解密基准测试，对比每次重新计算密钥、创建解密器的写法和RefundDecode
+
+    python -m benchmarks.bench_refund_decode
+'''
+import base64
+import hashlib
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+from weixinpayx.refund_decode import RefundDecode
+from weixinpayx.xml2dict import XML2Dict
+from .common import bench, report, KEY
+
+# 典型的退款通知req_info解密后的内容
+SAMPLE_REQ_INFO = (
+    '<root>'
+    '<out_refund_no><![CDATA[131811191610442717309]]></out_refund_no>'
+    '<out_trade_no><![CDATA[71106718111915575302817]]></out_trade_no>'
+    '<refund_account><![CDATA[REFUND_SOURCE_RECHARGE_FUNDS]]></refund_account>'
+    '<refund_fee><![CDATA[3960]]></refund_fee>'
+    '<refund_id><![CDATA[50000408942018111907145868882]]></refund_id>'
+    '<refund_recv_accout><![CDATA[支付用户零钱]]></refund_recv_accout>'
+    '<refund_request_source><![CDATA[API]]></refund_request_source>'
+    '<refund_status><![CDATA[SUCCESS]]></refund_status>'
+    '<settlement_refund_fee><![CDATA[3960]]></settlement_refund_fee>'
+    '<settlement_total_fee><![CDATA[3960]]></settlement_total_fee>'
+    '<success_time><![CDATA[2018-11-19 16:24:13]]></success_time>'
+    '<total_fee><![CDATA[3960]]></total_fee>'
+    '<transaction_id><![CDATA[4200000215201811190261405420]]></transaction_id>'
+    '</root>'
+)
+
+
+def encrypt(key, text):
+    ''' 按微信的方式加密req_info
+    --
+    '''
+    aesKey = hashlib.md5(key.encode('utf-8')).hexdigest().encode('utf-8')
+    data = AES.new(aesKey, AES.MODE_ECB).encrypt(pad(text.encode('utf-8'), AES.block_size))
+    return base64.b64encode(data).decode('ascii')
+
+
+def _legacyDecode(key, req_info):
+    ''' 每次计算密钥、创建解密器，用XML2Dict解析
+    --
+    '''
+    aesKey = hashlib.md5(key.encode('utf-8')).hexdigest().encode('utf-8')
+    text = AES.new(aesKey, AES.MODE_ECB).decrypt(base64.b64decode(req_info))
+    text = text[:-text[-1]]
+    return XML2Dict().parse(text)['root']
+
+
+def main():
+    req_info = encrypt(KEY, SAMPLE_REQ_INFO)
+    batch = [req_info] * 1000
+    decoder = RefundDecode(KEY)
+    assert decoder.decode(req_info) == _legacyDecode(KEY, req_info)
+
+    base = bench(lambda: _legacyDecode(KEY, req_info))
+    report('RefundDecode(legacy)', base)
+    report('RefundDecode.decode', bench(lambda: decoder.decode(req_info)), base)
+    per = bench(lambda: decoder.decodeMany(batch), repeat=3) / len(batch)
+    report('RefundDecode.decodeMany (per item)', per, base)
+
+
+if __name__ == '__main__':
+    main()
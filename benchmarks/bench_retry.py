@@ -0,0 +1,62 @@
+''' 重试策略效果测试：在丢包、SYSTEMERROR的本地MockServer上对比有无重试的错误率和尾延迟
+
+    python -m benchmarks.bench_retry
+'''
+import time
+from concurrent.futures import ThreadPoolExecutor
+from weixinpayx import Unifiedorder, Refund, RetryPolicy
+from weixinpayx.mock_server import MockServer
+from .common import KEY, record, percentile
+
+
+def _run(name, call, n=500, concurrency=8):
+    latencies = []
+    errors = 0
+
+    def one(i):
+        start = time.perf_counter()
+        try:
+            ok = call(i)
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        for ok, latency in executor.map(one, range(n)):
+            latencies.append(latency)
+            if not ok:
+                errors += 1
+    item = record(name, error_rate=errors / n, p50_ms=percentile(latencies, 0.5) * 1e3,
+                  p99_ms=percentile(latencies, 0.99) * 1e3, max_ms=max(latencies) * 1e3)
+    print('%-28s error %5.1f%%  p50 %6.1fms  p99 %6.1fms  max %6.1fms' % (
+        name, item['error_rate'] * 100, item['p50_ms'], item['p99_ms'], item['max_ms']))
+
+
+def main():
+    with MockServer(KEY, latency=0.005, error_rate=0.05, drop_rate=0.05, seed=1) as mock:
+        transport = mock.transport(pool_maxsize=8, read_timeout=1)
+        policy = RetryPolicy(retries=3, backoff=0.02, timeout=(0.5, 0.5), deadline=2)
+        for retry in (None, policy):
+            order = Unifiedorder('wx0000000000000000', '10000100', KEY, transport).setRetry(retry)
+            refund = Refund('wx0000000000000000', '10000100', KEY, transport).setRetry(retry)
+            tag = 'retry' if retry else 'no retry'
+
+            def pay(i):
+                res, pay = order.pay(1, 'o%d%s' % (i, tag), 'test', '127.0.0.1', 'https://example.com/notify', openid='o')
+                return res is not False and res['result_code'] == 'SUCCESS'
+
+            def refundOne(i):
+                res = refund.refund('r%d%s' % (i, tag), 1, 1, out_trade_no='o%d' % i)
+                return isinstance(res, dict) and res['result_code'] == 'SUCCESS'
+
+            _run('unifiedorder (%s)' % tag, pay)
+            _run('refund (%s)' % tag, refundOne)
+
+        # 重试时同一笔退款的nonce_str不变，说明发送的是同一个已签名请求
+        replayed = [v for (path, no), v in mock.nonces.items() if path == '/secapi/pay/refund' and len(v) > 1]
+        print('refunds retried: %d, all replayed identically: %s' % (
+            len(replayed), all(len(set(v)) == 1 for v in replayed)))
+
+
+if __name__ == '__main__':
+    main()
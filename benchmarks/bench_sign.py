@@ -0,0 +1,46 @@
+''' 签名基准测试，对比原来逐个拼接字符串的createSign和Signer
+
+    python -m benchmarks.bench_sign
+'''
+import hmac
+import base64
+import hashlib
+from weixinpayx.signer import Signer
+from .common import bench, report, SAMPLE_REQUEST, KEY
+
+
+def _legacySign(values, key, sign_type='MD5'):
+    ''' 原来的createSign实现
+    --
+    '''
+    sortArr = sorted(values.items(), key=lambda item: item[0])
+    signStr = ''
+    for i in sortArr:
+        if i[1]:
+            signStr += str(i[0]) + '=' + str(i[1]) + '&'
+    signStr += 'key=' + key
+    if sign_type == 'MD5':
+        m2 = hashlib.md5()
+        m2.update(signStr.encode('utf-8'))
+        return m2.hexdigest().upper()
+    elif sign_type == 'HMAC-SHA256':
+        appsecret = key.encode('utf-8')
+        data = signStr.encode('utf-8')
+        signature = base64.b64encode(
+            hmac.new(appsecret, data, digestmod=hashlib.sha256).digest())
+        return signature.upper()
+
+
+def main():
+    batch = [dict(SAMPLE_REQUEST, out_trade_no=str(i)) for i in range(1000)]
+    for sign_type in ('MD5', 'HMAC-SHA256'):
+        signer = Signer(KEY, sign_type)
+        base = bench(lambda: _legacySign(SAMPLE_REQUEST, KEY, sign_type))
+        report('%s createSign(legacy)' % sign_type, base)
+        report('%s Signer.sign' % sign_type, bench(lambda: signer.sign(SAMPLE_REQUEST)), base)
+        per = bench(lambda: signer.signMany(batch), repeat=3) / len(batch)
+        report('%s Signer.signMany (per item)' % sign_type, per, base)
+
+
+if __name__ == '__main__':
+    main()
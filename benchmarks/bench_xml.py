@@ -0,0 +1,46 @@
+''' xml编解码基准测试
+
+    python -m benchmarks.bench_xml
+'''
+from weixinpayx import xmlcodec
+from weixinpayx.wx_utils import decodeXML, dumpXML
+from weixinpayx.dict2xml import Dict2XML
+from weixinpayx.xml2dict import XML2Dict
+from .common import bench, report, SAMPLE_REQUEST, SAMPLE_RESPONSE
+
+
+def _legacyEncode(data):
+    values = {}
+    for k, v in data.items():
+        if v:
+            values[k] = v if isinstance(v, str) else str(v)
+    return Dict2XML().parse({'xml': values}).encode('utf-8')
+
+
+def _legacyDecode(xmlStr):
+    return XML2Dict().parse(xmlStr)['xml']
+
+
+def main():
+    body = SAMPLE_RESPONSE.encode('utf-8')
+
+    base = bench(lambda: _legacyEncode(SAMPLE_REQUEST))
+    report('encode Dict2XML', base)
+    report('encode xmlcodec.dumps', bench(lambda: xmlcodec.dumps(SAMPLE_REQUEST)), base)
+
+    base = bench(lambda: _legacyDecode(body))
+    report('decode XML2Dict', base)
+    report('decode xmlcodec.loads', bench(lambda: xmlcodec.loads(body)), base)
+
+    # 整个请求、响应路径：原来是dict -> str -> bytes发送，r.text -> encode -> decode -> 解析
+    base = bench(lambda: decodeXML(SAMPLE_REQUEST).encode('utf-8'))
+    report('request body via str', base)
+    report('request body dumpXML (bytes)', bench(lambda: dumpXML(SAMPLE_REQUEST)), base)
+    text = body.decode('utf-8')
+    base = bench(lambda: xmlcodec.loads(text.encode('utf-8').decode('utf-8')))
+    report('response via r.text', base)
+    report('response from r.content (bytes)', bench(lambda: xmlcodec.loads(body)), base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import json
+import time
+import timeit
+import platform
+
+__all__ = ['bench', 'report', 'record', 'percentile', 'dump', 'RESULTS', 'SAMPLE_REQUEST', 'SAMPLE_RESPONSE', 'KEY']
+
+# 本次运行的所有结果，用于输出json
+RESULTS = []
+
+# 测试用的商户密钥
+KEY = '192006250b4c09247ec02edce69f6a2d'
+
+# 典型的统一下单请求参数
+SAMPLE_REQUEST = {
+    'appid': 'wxd930ea5d5a258f4f',
+    'mch_id': '10000100',
+    'device_info': 'WEB',
+    'nonce_str': 'ibuaiVcKdpRxkhJA',
+    'body': '腾讯充值中心-QQ会员充值',
+    'out_trade_no': '20150806125346',
+    'total_fee': 88,
+    'spbill_create_ip': '123.12.12.123',
+    'notify_url': 'https://www.weixin.qq.com/wxpay/pay.php',
+    'trade_type': 'JSAPI',
+    'openid': 'oUpF8uMuAJO_M2pxb1Q9zNjWeS6o',
+    'attach': '深圳分店',
+}
+
+# 典型的订单查询返回报文
+SAMPLE_RESPONSE = (
+    '<xml><return_code><![CDATA[SUCCESS]]></return_code>'
+    '<return_msg><![CDATA[OK]]></return_msg>'
+    '<appid><![CDATA[wxd930ea5d5a258f4f]]></appid>'
+    '<mch_id><![CDATA[10000100]]></mch_id>'
+    '<device_info><![CDATA[1000]]></device_info>'
+    '<nonce_str><![CDATA[TN55wO9Pba5yENl8]]></nonce_str>'
+    '<sign><![CDATA[BDF0099C15FF7BC6B1585FBB110AB635]]></sign>'
+    '<result_code><![CDATA[SUCCESS]]></result_code>'
+    '<openid><![CDATA[oUpF8uN95-Ptaags6E_roPHg7AG0]]></openid>'
+    '<is_subscribe><![CDATA[Y]]></is_subscribe>'
+    '<trade_type><![CDATA[MICROPAY]]></trade_type>'
+    '<bank_type><![CDATA[CCB_DEBIT]]></bank_type>'
+    '<total_fee>1</total_fee>'
+    '<fee_type><![CDATA[CNY]]></fee_type>'
+    '<transaction_id><![CDATA[1008450740201411110005820873]]></transaction_id>'
+    '<out_trade_no><![CDATA[1415757673]]></out_trade_no>'
+    '<attach><![CDATA[订单额外描述]]></attach>'
+    '<time_end><![CDATA[20141111170043]]></time_end>'
+    '<trade_state><![CDATA[SUCCESS]]></trade_state>'
+    '</xml>'
+)
+
+
+def bench(func, number=None, repeat=5):
+    ''' 测量func单次调用耗时，取多轮中最快的一轮
+    --
+        @param number: 每轮调用次数，默认自动估算到每轮约0.2秒
+        @return 单次调用的秒数
+    '''
+    timer = timeit.Timer(func)
+    if number is None:
+        number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def report(name, seconds, baseline=None):
+    ''' 打印一行结果
+    --
+    '''
+    line = '%-40s %10.2f us/op' % (name, seconds * 1e6)
+    item = {'name': name, 'us_per_op': seconds * 1e6}
+    if baseline:
+        line += '  x%.2f' % (baseline / seconds)
+        item['speedup'] = baseline / seconds
+    RESULTS.append(item)
+    print(line)
+
+
+def record(name, **fields):
+    ''' 记录一条非微基准的结果，如端到端的吞吐量和延迟
+    --
+    '''
+    item = dict(fields, name=name)
+    RESULTS.append(item)
+    return item
+
+
+def percentile(values, p):
+    ''' 百分位数，values不需要有序
+    --
+        @param p: 0到1之间
+    '''
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def dump(path, **meta):
+    ''' 把本次运行的结果写成json，用于对比不同版本
+    --
+        @param meta: 额外记录的运行参数
+    '''
+    data = {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'meta': meta,
+        'results': RESULTS,
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
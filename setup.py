@@ -22,8 +22,14 @@ setup(
     author="lijin",
     author_email="lijin@dingtalk.com",
 
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*', 'tests', 'tests.*']),
     include_package_data=True,
     platforms="any",
-    install_requires=[]
+    install_requires=[],
+    extras_require={
+        'aio': ['aiohttp'],
+    },
+    entry_points={
+        'console_scripts': ['weixinpayx-loadgen = weixinpayx.loadgen:main'],
+    }
 )
@@ -0,0 +1,41 @@
+''' 测试共用的商户配置和报文构造函数
+'''
+import base64
+import hashlib
+from Crypto.Cipher import AES
+from Crypto.Util.Padding import pad
+from weixinpayx.signer import Signer
+from weixinpayx.wx_utils import dumpXML
+
+APPID = 'wx0000000000000000'
+MCH_ID = '10000100'
+KEY = '192006250b4c09247ec02edce69f6a2d'
+
+# Unifiedorder.pay的参数
+CART = dict(total_fee=1, out_trade_no='o1', body='test', spbill_create_ip='127.0.0.1',
+            notify_url='https://example.com/notify', openid='oUpF8uMuAJO_M2pxb1Q9zNjWeS6o')
+
+
+def encryptReqInfo(text, key=KEY):
+    ''' 按微信的方式加密退款通知的req_info
+    --
+    '''
+    aesKey = hashlib.md5(key.encode('utf-8')).hexdigest().encode('utf-8')
+    data = AES.new(aesKey, AES.MODE_ECB).encrypt(pad(text.encode('utf-8'), AES.block_size))
+    return base64.b64encode(data).decode('ascii')
+
+
+def payNotification(transaction_id, mch_id=MCH_ID, key=KEY):
+    values = {
+        'return_code': 'SUCCESS', 'result_code': 'SUCCESS', 'appid': APPID, 'mch_id': mch_id,
+        'nonce_str': 'ibuaiVcKdpRxkhJA', 'openid': 'o', 'total_fee': '1', 'transaction_id': transaction_id,
+        'out_trade_no': 'o' + transaction_id,
+    }
+    values['sign'] = Signer(key).sign(values)
+    return dumpXML(values)
+
+
+def refundNotification(out_refund_no, mch_id=MCH_ID, key=KEY):
+    info = '<root><out_refund_no>%s</out_refund_no><refund_status>SUCCESS</refund_status></root>' % out_refund_no
+    return dumpXML({'return_code': 'SUCCESS', 'appid': APPID, 'mch_id': mch_id, 'nonce_str': 'TeqClE3i0mvn3DrK',
+                    'req_info': encryptReqInfo(info, key)})
@@ -0,0 +1,16 @@
+import pytest
+from weixinpayx.mock_server import MockServer
+from .common import KEY
+
+
+@pytest.fixture
+def mock():
+    with MockServer(KEY, seed=1) as server:
+        yield server
+
+
+@pytest.fixture
+def transport(mock):
+    transport = mock.transport(pool_maxsize=16)
+    yield transport
+    transport.close()
@@ -0,0 +1,121 @@
+from weixinpayx import BatchOrderquery, BatchRefund, RefundJournal
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+class _BadGatewayServer(MockServer):
+    ''' 订单号含bad时像代理一样返回html错误页
+    --
+    '''
+
+    def handle(self, path, body):
+        if b'bad' in body:
+            return 502, b'<html>502 Bad Gateway</html>'
+        return super(_BadGatewayServer, self).handle(path, body)
+
+
+class _CountingLimiter(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def acquire(self):
+        self.calls += 1
+
+
+def test_orderquery_batch_survives_bad_items():
+    with _BadGatewayServer(KEY) as mock:
+        batch = BatchOrderquery(APPID, MCH_ID, KEY, mock.transport(), concurrency=4, retries=0)
+        results = {r.order_id: r for r in batch.query(['o1', '', 'bad1', 'o2'])}
+    assert results['o1'].ok and results['o2'].ok
+    assert not results[''].ok and not results['bad1'].ok
+    assert batch.progress.completed == 4
+    assert batch.progress.failed == 2
+
+
+def test_orderquery_batch_rate_limits_every_attempt():
+    with MockServer(KEY, error_rate=1) as mock:
+        batch = BatchOrderquery(APPID, MCH_ID, KEY, mock.transport(), concurrency=2, retries=2, backoff=0)
+        batch.limiter = _CountingLimiter()
+        results = list(batch.query(['o1', 'o2']))
+    assert [r.attempts for r in results] == [3, 3]
+    assert batch.limiter.calls == 6
+
+
+def _refunds(n, prefix='r'):
+    return [('%s%d' % (prefix, i), 1, 1, 'o%d' % i) for i in range(n)]
+
+
+def test_refund_journal_resume(tmp_path, mock, transport):
+    path = str(tmp_path / 'refund.journal')
+    with BatchRefund(APPID, MCH_ID, KEY, transport=transport, concurrency=4, journal=path) as batch:
+        first = list(batch.refund(_refunds(10)))
+    assert all(r.ok for r in first)
+    assert mock.requests['/secapi/pay/refund'] == 10
+
+    with BatchRefund(APPID, MCH_ID, KEY, transport=transport, concurrency=4, journal=path) as batch:
+        second = list(batch.refund(_refunds(12)))
+    assert sorted(r.order_id for r in second) == ['r10', 'r11']
+    assert batch.progress.skipped == 10
+    assert mock.requests['/secapi/pay/refund'] == 12
+
+
+def test_refund_batch_survives_bad_records(tmp_path):
+    path = str(tmp_path / 'refund.journal')
+    records = [
+        ('r1', 1, 1, 'o1'),
+        ('r2', 1, 1),                                   # 缺少订单号
+        {'out_refund_no': 'r3', 'total_fee': 1, 'refund_fee': 1},   # 订单号都为空
+        {'out_refund_no': 'r4', 'total_fee': 1, 'refund_fee': 1, 'out_trade_no': 'o4', 'bogus': 1},
+        ('r5', 1, 1, 'bad5'),                           # 返回502错误页，按网络错误处理
+        ('r6', 1, 1, 'o6'),
+    ]
+    with _BadGatewayServer(KEY) as mock:
+        with BatchRefund(APPID, MCH_ID, KEY, transport=mock.transport(), concurrency=2, retries=0, journal=path) as batch:
+            results = list(batch.refund(records))
+    ok = sorted(r.order_id for r in results if r.ok)
+    assert ok == ['r1', 'r6']
+    assert batch.progress.completed == 6
+    assert batch.progress.failed == 4
+
+    # 失败的退款写入了进度文件，但续传时重新提交；网络错误结果未知，不写入
+    journal = RefundJournal(path)
+    lines = open(path, encoding='utf-8').read().splitlines()
+    assert len(lines) == 4
+    assert 'r1' in journal and 'r6' in journal
+    assert 'r3' not in journal and 'r4' not in journal and 'r5' not in journal
+    journal.close()
+
+
+def test_refund_batch_rate_limits_every_attempt():
+    with MockServer(KEY, error_rate=1) as mock:
+        batch = BatchRefund(APPID, MCH_ID, KEY, transport=mock.transport(), concurrency=2, retries=1, backoff=0)
+        batch.limiter = _CountingLimiter()
+        results = list(batch.refund(_refunds(3)))
+    assert [r.attempts for r in results] == [2, 2, 2]
+    assert batch.limiter.calls == 6
+
+
+def test_batch_close_only_owned_resources(tmp_path):
+    closed = []
+
+    class _Transport(object):
+
+        def close(self):
+            closed.append('given')
+
+    journal = RefundJournal(str(tmp_path / 'given.journal'))
+    with BatchRefund(APPID, MCH_ID, KEY, transport=_Transport(), journal=journal):
+        pass
+    with BatchOrderquery(APPID, MCH_ID, KEY, _Transport()):
+        pass
+    # 传入的连接池和进度文件由调用方关闭
+    assert closed == [] and not journal._file.closed
+    journal.close()
+
+    with BatchRefund(APPID, MCH_ID, KEY, cert=None, journal=str(tmp_path / 'owned.journal')) as batch:
+        batch.transport.close = lambda: closed.append('refund')
+    assert batch.journal._file.closed
+    with BatchOrderquery(APPID, MCH_ID, KEY) as batch:
+        batch.transport.close = lambda: closed.append('orderquery')
+    assert closed == ['refund', 'orderquery']
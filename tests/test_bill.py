@@ -0,0 +1,33 @@
+from decimal import Decimal
+from weixinpayx import BillReader, BillTable, Downloadbill
+from .common import APPID, MCH_ID, KEY
+
+_BILL = [
+    '交易时间,商户订单号,应结订单金额,手续费,费率',
+    '`2024-01-01 10:00:00,`o1,`1.00,`0.00600,`0.60%',
+    '`2024-01-01 10:00:01,`o2,`0.05,`0.00030,`0.60%',
+    '`2024-01-01 10:00:02,`o3,`12.3,`,`0.60%',
+    '总交易单数,应结订单总金额,手续费总金额',
+    '`3,`13.35,`0.00630',
+]
+
+
+def test_poundage_keeps_sub_fen_precision():
+    reader = BillReader(iter(_BILL))
+    rows = list(reader)
+    assert [r.settlement_total_fee for r in rows] == [100, 5, 1230]
+    assert [r.poundage for r in rows] == [Decimal('0.00600'), Decimal('0.00030'), Decimal('0')]
+    assert reader.summary == {'total_count': 3, 'settlement_total_fee': 1335, 'poundage': Decimal('0.00630')}
+
+    table = BillTable(BillReader(iter(_BILL)))
+    assert len(table) == 3
+    assert table.sum('settlement_total_fee') == 1335
+    assert table.sum('poundage') == table.summary['poundage']
+
+
+def test_download_bill_rows(mock, transport):
+    reader = Downloadbill(APPID, MCH_ID, KEY, transport).rows('20240101')
+    rows = list(reader)
+    assert len(rows) == mock.bill_rows == reader.summary['total_count']
+    assert sum(r.settlement_total_fee for r in rows) == reader.summary['settlement_total_fee']
+    assert reader.summary['poundage'] == Decimal('0.00000')
@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+import pytest
+from weixinpayx import Cassette, CassetteMiss, Orderquery, RecordingTransport, ReplayTransport
+from .common import APPID, MCH_ID, KEY
+
+_URL = 'https://api.mch.weixin.qq.com/pay/orderquery'
+
+
+def _request(i):
+    return ('<xml><mch_id>%s</mch_id><out_trade_no>o%d</out_trade_no><nonce_str>n%d</nonce_str></xml>'
+            % (MCH_ID, i, i)).encode('utf-8')
+
+
+def test_record_and_replay_with_test_key(tmp_path, transport):
+    path = str(tmp_path / 'orderquery.cas')
+    with Cassette(path) as cassette:
+        recorded = Orderquery(APPID, MCH_ID, KEY, RecordingTransport(transport, cassette)).query(out_trade_no='o1')
+        assert recorded['trade_state'] == 'SUCCESS'
+
+    testKey = 'z' * 32
+    with Cassette(path) as cassette:
+        assert len(cassette) == 1
+        replay = ReplayTransport(cassette, key=testKey)
+        # nonce_str和sign不参与匹配，用测试密钥签名的请求也能命中
+        for i in range(2):
+            res = Orderquery(APPID, MCH_ID, testKey, replay).query(out_trade_no='o1')
+            assert res['transaction_id'] == recorded['transaction_id']
+        assert replay.hits == 2
+        with pytest.raises(CassetteMiss):
+            Orderquery(APPID, MCH_ID, testKey, replay).query(out_trade_no='o2')
+        assert replay.misses == 1
+
+
+def test_truncated_tail_is_dropped(tmp_path):
+    path = str(tmp_path / 'truncated.cas')
+    with Cassette(path) as cassette:
+        cassette.append(_URL, _request(1), b'<xml>1</xml>')
+        size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'\x20\x00\x10')
+    with Cassette(path) as cassette:
+        assert len(cassette) == 1
+        assert os.path.getsize(path) == size
+        key = cassette.append(_URL, _request(2), b'<xml>2</xml>')
+        assert cassette.get(key) == b'<xml>2</xml>'
+        assert [response for path_, request, response in cassette.records()] == [b'<xml>1</xml>', b'<xml>2</xml>']
+
+
+def test_get_while_appending(tmp_path):
+    with Cassette(str(tmp_path / 'concurrent.cas')) as cassette:
+        keys = [cassette.append(_URL, _request(0), b'<xml>0</xml>')]
+        cassette.get(keys[0])
+        errors = []
+        done = threading.Event()
+
+        def read():
+            try:
+                while not done.is_set():
+                    for i, key in enumerate(list(keys)):
+                        assert cassette.get(key) == ('<xml>%d</xml>' % i).encode('ascii')
+            except Exception as e:
+                errors.append(e)
+
+        readers = [threading.Thread(target=read) for i in range(4)]
+        # 频繁切换线程，让读取和重新映射交错
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)
+        try:
+            for t in readers:
+                t.start()
+            for i in range(1, 500):
+                keys.append(cassette.append(_URL, _request(i), ('<xml>%d</xml>' % i).encode('ascii')))
+        finally:
+            done.set()
+            for t in readers:
+                t.join()
+            sys.setswitchinterval(interval)
+    assert errors == []
+
+
+def test_remap_keeps_earlier_map_readable(tmp_path):
+    with Cassette(str(tmp_path / 'remap.cas')) as cassette:
+        first = cassette.append(_URL, _request(1), b'<xml>1</xml>')
+        cassette.get(first)
+        # 模拟一个读取线程已经取到了映射，还没有切片
+        data = cassette._map
+        second = cassette.append(_URL, _request(2), b'<xml>2</xml>')
+        assert cassette.get(second) == b'<xml>2</xml>'
+        assert cassette._map is not data
+        offset, length = cassette._index[first]
+        assert data[offset:offset + length] == b'<xml>1</xml>'
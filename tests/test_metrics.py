@@ -0,0 +1,27 @@
+from weixinpayx import Metrics, Unifiedorder, setMetrics
+from .common import APPID, MCH_ID, KEY, CART
+
+
+
+def test_failing_exporter_and_hook_do_not_change_result(mock, transport):
+    def export(spans):
+        raise ConnectionError('collector unreachable')
+
+    calls = []
+
+    def hook(call):
+        calls.append(call.result_code)
+        raise ValueError('bad hook')
+
+    metrics = Metrics(spans=10, exporter=export).addHook(hook).addHook(lambda call: calls.append(call.endpoint))
+    setMetrics(metrics)
+    try:
+        res, reSign = Unifiedorder(APPID, MCH_ID, KEY, transport).pay(**CART)
+    finally:
+        setMetrics(None)
+    assert res['result_code'] == 'SUCCESS'
+    assert sum(mock.requests.values()) == 1
+    # 后面的回调照常执行，统计照常记录
+    assert calls == ['SUCCESS', 'unifiedorder']
+    assert metrics.snapshot()[('unifiedorder', 'total', 'SUCCESS', 'SUCCESS')]['count'] == 1
+    assert len(metrics.spans) == 1
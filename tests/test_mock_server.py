@@ -0,0 +1,34 @@
+from weixinpayx import Orderquery, Refund, RefundQuery, Unifiedorder
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+def test_unifiedorder_returns_prepay_id_and_resign(transport):
+    res, reSign = Unifiedorder(APPID, MCH_ID, KEY, transport).pay(1, 'o1', 'test', '127.0.0.1', 'https://example.com/notify', openid='o')
+    assert res['result_code'] == 'SUCCESS'
+    assert reSign['package'] == 'prepay_id=' + res['prepay_id']
+
+
+def test_same_order_gets_same_prepay_id(transport):
+    client = Unifiedorder(APPID, MCH_ID, KEY, transport)
+    first, _ = client.pay(1, 'o1', 'test', '127.0.0.1', 'https://example.com/notify', openid='o')
+    second, _ = client.pay(1, 'o1', 'test', '127.0.0.1', 'https://example.com/notify', openid='o')
+    assert first['prepay_id'] == second['prepay_id']
+
+
+def test_query_and_refund_verify_signature(mock, transport):
+    assert Orderquery(APPID, MCH_ID, KEY, transport).query(out_trade_no='o1')['trade_state'] == 'SUCCESS'
+    assert Refund(APPID, MCH_ID, KEY, transport).refund('r1', 1, 1, out_trade_no='o1')['result_code'] == 'SUCCESS'
+    assert RefundQuery(APPID, MCH_ID, KEY, transport).query(out_refund_no='r1')['refund_status_0'] == 'SUCCESS'
+    assert mock.requests['/pay/orderquery'] == 1
+
+
+def test_wrong_key_fails_verification(transport):
+    res = Orderquery(APPID, MCH_ID, 'x' * 32, transport).query(out_trade_no='o1')
+    assert isinstance(res, str)
+
+
+def test_systemerror():
+    with MockServer(KEY, error_rate=1) as mock:
+        res = Orderquery(APPID, MCH_ID, KEY, mock.transport()).query(out_trade_no='o1')
+    assert res['err_code'] == 'SYSTEMERROR'
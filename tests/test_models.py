@@ -0,0 +1,26 @@
+from weixinpayx import OrderqueryResult, RefundqueryResult, UnifiedorderResult
+
+
+def test_result_fields_and_round_trip():
+    res = {'return_code': 'SUCCESS', 'result_code': 'SUCCESS', 'appid': 'wx1', 'mch_id': '1',
+           'nonce_str': 'n', 'sign': 's', 'trade_state': 'SUCCESS', 'total_fee': '101', 'coupon_fee': '',
+           'promotion_detail': 'x'}
+    obj = OrderqueryResult.fromDict(res)
+    assert obj.ok and obj.total_fee == 101 and obj.coupon_fee is None
+    assert obj.get('promotion_detail') == 'x' and obj.get('cash_fee', 0) == 0
+    assert obj.toDict() == {'return_code': 'SUCCESS', 'result_code': 'SUCCESS', 'appid': 'wx1', 'mch_id': '1',
+                            'trade_state': 'SUCCESS', 'total_fee': 101, 'promotion_detail': 'x'}
+
+    prepay = UnifiedorderResult.fromDict({'return_code': 'SUCCESS', 'prepay_id': 'p1'})
+    assert UnifiedorderResult.fromDict(prepay.toDict()).prepay_id == 'p1'
+
+
+def test_refundquery_records():
+    res = {'return_code': 'SUCCESS', 'result_code': 'SUCCESS', 'refund_count': '2',
+           'out_refund_no_0': 'r0', 'refund_fee_0': '10', 'refund_status_0': 'SUCCESS',
+           'coupon_refund_count_0': '1', 'coupon_refund_id_0_0': 'c0', 'coupon_refund_fee_0_0': '3',
+           'out_refund_no_1': 'r1', 'refund_fee_1': '20', 'refund_status_1': 'PROCESSING'}
+    refunds = RefundqueryResult.fromDict(res).refunds
+    assert [(r.out_refund_no, r.refund_fee, r.refund_status) for r in refunds] == [
+        ('r0', 10, 'SUCCESS'), ('r1', 20, 'PROCESSING')]
+    assert refunds[0].coupons == (('c0', None, 3),) and refunds[1].coupons == ()
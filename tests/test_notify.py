@@ -0,0 +1,37 @@
+from weixinpayx import NotifyHandler
+from weixinpayx.cache import LRUCache
+from weixinpayx.wx_utils import encodeXML
+from .common import MCH_ID, KEY, payNotification, refundNotification
+
+
+def test_handle_replies_fail_for_malformed_body():
+    handler = NotifyHandler(KEY)
+    for body in (b'not xml', b'<html>502</html>', b''):
+        assert handler.parse(body) is None
+        assert encodeXML(handler.handle(body))['return_code'] == 'FAIL'
+
+
+def test_handle_dedups_pay_notification():
+    handler = NotifyHandler(KEY)
+    calls = []
+    body = payNotification('4200001')
+    assert encodeXML(handler.handle(body, calls.append))['return_code'] == 'SUCCESS'
+    assert encodeXML(handler.handle(body, calls.append))['return_code'] == 'SUCCESS'
+    assert len(calls) == 1
+
+
+def test_handle_rejects_bad_signature():
+    body = payNotification('4200001', key='x' * 32)
+    assert encodeXML(NotifyHandler(KEY).handle(body))['return_code'] == 'FAIL'
+
+
+def test_dedup_key_is_per_merchant():
+    cache = LRUCache()
+    first = NotifyHandler(KEY, cache=cache)
+    other = NotifyHandler('y' * 32, cache=cache)
+    calls = []
+    first.handle(refundNotification('r1'), calls.append)
+    other.handle(refundNotification('r1', mch_id='10000200', key='y' * 32), calls.append)
+    first.handle(refundNotification('r1'), calls.append)
+    assert [(n.type, n.values['mch_id'], n.values['refund_status']) for n in calls] == [
+        ('refund', MCH_ID, 'SUCCESS'), ('refund', '10000200', 'SUCCESS')]
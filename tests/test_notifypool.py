@@ -0,0 +1,39 @@
+import pytest
+from weixinpayx import NotifyPool
+from weixinpayx.wx_utils import encodeXML
+from .common import MCH_ID, KEY, payNotification, refundNotification
+
+OTHER_MCH_ID = '10000200'
+OTHER_KEY = 'y' * 32
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_pool_dedups_per_merchant(processes):
+    bodies = [refundNotification('r1'), refundNotification('r1', OTHER_MCH_ID, OTHER_KEY),
+              payNotification('4200001'), payNotification('4200001', OTHER_MCH_ID, OTHER_KEY)]
+    calls = []
+    with NotifyPool({MCH_ID: KEY, OTHER_MCH_ID: OTHER_KEY}, processes=processes) as pool:
+        # 逐个处理，同号的通知到达时另一个商户的已经记录为处理过
+        replies = [pool.handle(body, calls.append) for body in bodies]
+        assert all(encodeXML(reply)['return_code'] == 'SUCCESS' for reply in replies)
+        assert [(n.type, n.values['mch_id']) for n in calls] == [
+            ('refund', MCH_ID), ('refund', OTHER_MCH_ID), ('pay', MCH_ID), ('pay', OTHER_MCH_ID)]
+        # 再次推送全部是重复通知
+        pool.handleMany(bodies, calls.append)
+        assert len(calls) == 4
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+def test_pool_malformed_body_fails_alone(processes):
+    bodies = [payNotification('4200001'), b'not xml', refundNotification('r1'), b'<html>502</html>',
+              payNotification('4200002', key='x' * 32)]
+    with NotifyPool(KEY, processes=processes) as pool:
+        notifications = pool.parseMany(bodies)
+        assert pool.parse(b'not xml') is None
+        assert encodeXML(pool.handle(b''))['return_code'] == 'FAIL'
+    assert [n and n.type for n in notifications] == ['pay', None, 'refund', None, None]
+
+
+def test_pool_reply():
+    pool = NotifyPool(KEY, processes=0)
+    assert encodeXML(pool.reply(False, 'x')) == {'return_code': 'FAIL', 'return_msg': 'x'}
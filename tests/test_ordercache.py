@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from weixinpayx import CachedOrderquery, Orderquery, OrderqueryResult
+from weixinpayx.cache import RedisCache
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+class _FakeRedis(object):
+    ''' 只实现RedisCache用到的get、set、delete
+    --
+    '''
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, name):
+        return self.data.get(name)
+
+    def set(self, name, value, ex=None):
+        self.data[name] = value
+
+    def delete(self, name):
+        self.data.pop(name, None)
+
+
+def test_typed_query_with_redis_cache(mock, transport):
+    cached = CachedOrderquery(Orderquery(APPID, MCH_ID, KEY, transport).setTyped(), cache=RedisCache(_FakeRedis()))
+    first = cached.query(out_trade_no='o1')
+    second = cached.query(out_trade_no='o1')
+    assert isinstance(first, OrderqueryResult) and isinstance(second, OrderqueryResult)
+    assert first.transaction_id == second.transaction_id and first is not second
+    assert cached.stats == {'miss': 1, 'hit': 1}
+    assert sum(mock.requests.values()) == 1
+
+
+def test_typed_concurrent_callers_get_own_results():
+    with MockServer(KEY, latency=0.2) as mock:
+        cached = CachedOrderquery(Orderquery(APPID, MCH_ID, KEY, mock.transport()).setTyped())
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda i: cached.query(out_trade_no='o1'), range(4)))
+        results.append(cached.query(out_trade_no='o1'))
+    assert sum(mock.requests.values()) == 1
+    assert all(isinstance(res, OrderqueryResult) for res in results)
+    assert len({id(res) for res in results}) == 5
+    results[0].trade_state = 'CLOSED'
+    assert cached.query(out_trade_no='o1').trade_state == 'SUCCESS'
+
+
+def test_pending_result_expires_and_final_result_stays():
+    with MockServer(KEY, trade_state='NOTPAY') as mock:
+        cached = CachedOrderquery(Orderquery(APPID, MCH_ID, KEY, mock.transport()), pending_ttl=0.2, final_ttl=60)
+        assert cached.query(out_trade_no='o1')['trade_state'] == 'NOTPAY'
+        assert cached.query(out_trade_no='o1')['trade_state'] == 'NOTPAY'
+        assert mock.requests['/pay/orderquery'] == 1
+
+        # 未支付的结果过期后重新查询，查到终态后长期缓存
+        mock.trade_state = 'SUCCESS'
+        time.sleep(0.3)
+        assert cached.query(out_trade_no='o1')['trade_state'] == 'SUCCESS'
+        time.sleep(0.3)
+        assert cached.query(out_trade_no='o1')['trade_state'] == 'SUCCESS'
+        assert mock.requests['/pay/orderquery'] == 2
+
+        cached.invalidate(out_trade_no='o1')
+        cached.query(out_trade_no='o1')
+        assert mock.requests['/pay/orderquery'] == 3
+    assert cached.stats == {'miss': 3, 'hit': 2}
+
+
+def test_failed_result_is_not_cached():
+    with MockServer(KEY, error_rate=1) as mock:
+        cached = CachedOrderquery(Orderquery(APPID, MCH_ID, KEY, mock.transport()))
+        assert cached.query(out_trade_no='o1')['err_code'] == 'SYSTEMERROR'
+        cached.query(out_trade_no='o1')
+        assert mock.requests['/pay/orderquery'] == 2
+
+
+def test_concurrent_queries_share_one_request():
+    with MockServer(KEY, latency=0.2) as mock:
+        cached = CachedOrderquery(Orderquery(APPID, MCH_ID, KEY, mock.transport()))
+        with ThreadPoolExecutor(4) as executor:
+            results = list(executor.map(lambda i: cached.query(out_trade_no='o1'), range(4)))
+        assert mock.requests['/pay/orderquery'] == 1
+    assert cached.stats == {'miss': 1, 'shared': 3}
+    assert all(res['trade_state'] == 'SUCCESS' for res in results)
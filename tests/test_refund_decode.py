@@ -0,0 +1,26 @@
+import base64
+from weixinpayx.refund_decode import RefundDecode
+from .common import KEY, encryptReqInfo
+
+
+def _info(out_refund_no):
+    return encryptReqInfo('<root><out_refund_no>%s</out_refund_no><refund_fee>1</refund_fee></root>' % out_refund_no)
+
+
+def test_decode_many_isolates_bad_items():
+    req_infos = [
+        _info('r0'),
+        encryptReqInfo('<root><out_refund_no>r1', key='x' * 32),   # 其他密钥加密，填充不正确
+        'not base64!',
+        base64.b64encode(b'short').decode('ascii'),         # 长度不是16的整数倍
+        encryptReqInfo('<root><unclosed></root>'),                  # xml不合法
+        '',
+        _info('r6'),
+    ]
+    decoder = RefundDecode(KEY)
+    res = decoder.decodeMany(req_infos)
+    assert len(res) == len(req_infos)
+    assert res[0] == {'out_refund_no': 'r0', 'refund_fee': '1'}
+    assert res[1:6] == [None] * 5
+    assert res[6] == decoder.decode(req_infos[6])
+    assert decoder.decodeMany([]) == []
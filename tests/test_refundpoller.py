@@ -0,0 +1,77 @@
+from weixinpayx import RefundPoller, RefundQuery
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+class _Clock(object):
+
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+class _NotExist(object):
+
+    def query(self, out_refund_no=None):
+        return {'return_code': 'SUCCESS', 'result_code': 'FAIL', 'err_code': 'REFUNDNOTEXIST'}
+
+
+def _poller(client, clock, **kwargs):
+    events = []
+    poller = RefundPoller(client, lambda *args: events.append(args[:3]), concurrency=2, clock=clock, **kwargs)
+    return poller, events
+
+
+def test_poller_reports_transitions_until_final():
+    clock = _Clock()
+    with MockServer(KEY, refund_status='PROCESSING') as mock:
+        poller, events = _poller(RefundQuery(APPID, MCH_ID, KEY, mock.transport()), clock)
+        poller.add('r1')
+        assert poller.poll() == 0           # 还没到期
+
+        clock.now = poller.nextDue()
+        assert poller.poll() == 1
+        assert events == [('r1', None, 'PROCESSING')]
+        # 零钱退款按最短间隔60秒后再查
+        assert poller.nextDue() == clock.now + 60
+
+        mock.refund_status = 'SUCCESS'
+        clock.now = poller.nextDue()
+        assert poller.poll() == 1
+        poller.close()
+    assert events[-1] == ('r1', 'PROCESSING', 'SUCCESS')
+    assert len(poller) == 0 and poller.nextDue() is None
+
+
+def test_poller_removed_refund_is_not_queried():
+    clock = _Clock()
+    with MockServer(KEY, refund_status='PROCESSING') as mock:
+        poller, events = _poller(RefundQuery(APPID, MCH_ID, KEY, mock.transport()), clock)
+        poller.add('r1')
+        poller.add('r2')
+        poller.remove('r1')
+        clock.now += 3600
+        assert poller.poll() == 1
+        poller.close()
+    assert events == [('r2', None, 'PROCESSING')]
+
+
+def test_poller_not_exist_and_timeout():
+    clock = _Clock()
+    poller, events = _poller(_NotExist(), clock)
+    poller.add('r1')
+    clock.now += 3600
+    poller.poll()
+    assert events == [('r1', None, 'REFUNDNOTEXIST')]
+    assert 'r1' not in poller
+
+    with MockServer(KEY, refund_status='PROCESSING') as mock:
+        poller, events = _poller(RefundQuery(APPID, MCH_ID, KEY, mock.transport()), clock, max_age=100)
+        poller.add('r2')
+        clock.now += 3600
+        poller.poll()
+        poller.close()
+    assert events == [('r2', None, 'PROCESSING'), ('r2', 'PROCESSING', 'TIMEOUT')]
+    assert len(poller) == 0
@@ -0,0 +1,34 @@
+import pytest
+from weixinpayx import MerchantRegistry
+from .common import APPID, KEY
+
+
+def test_loaded_configs_are_bounded(transport):
+    loads = []
+
+    def loader(mch_id):
+        loads.append(mch_id)
+        if mch_id.startswith('missing'):
+            return None
+        return {'appid': APPID, 'mch_id': mch_id, 'key': KEY}
+
+    registry = MerchantRegistry(loader=loader, maxsize=2, transport=transport)
+    for i in range(5):
+        assert registry.orderquery('m%d' % i).config.mch_id == 'm%d' % i
+    # 只有最近使用的maxsize个商户留在内存中，配置也随之淘汰
+    assert len(registry._merchants) == 2 and registry._configs == {}
+    assert 'm4' in registry and 'm0' not in registry
+
+    merchant = registry.get('m4')
+    assert registry.get('m4') is merchant
+    registry.get('m0')
+    assert loads == ['m0', 'm1', 'm2', 'm3', 'm4', 'm0']
+    with pytest.raises(KeyError):
+        registry.get('missing')
+
+
+def test_added_configs_stay_registered(transport):
+    registry = MerchantRegistry([{'appid': APPID, 'mch_id': 'm%d' % i, 'key': KEY} for i in range(3)],
+                                maxsize=1, transport=transport)
+    assert all(registry.get('m%d' % i).config.mch_id == 'm%d' % i for i in range(3))
+    assert 'm0' in registry and len(registry._merchants) == 1
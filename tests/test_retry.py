@@ -0,0 +1,65 @@
+import asyncio
+import pytest
+import requests
+from weixinpayx import Orderquery, RetryPolicy
+from weixinpayx.aio import AsyncTransport, Orderquery as AsyncOrderquery
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+class _FlakyServer(MockServer):
+    ''' 前failures次请求像负载均衡一样返回503错误页
+    --
+    '''
+
+    def __init__(self, key, failures, **kwargs):
+        super(_FlakyServer, self).__init__(key, **kwargs)
+        self.failures = failures
+        self.calls = 0
+
+    def handle(self, path, body):
+        self.calls += 1
+        if self.calls <= self.failures:
+            return 503, b'<html>503 Service Unavailable</html>'
+        return super(_FlakyServer, self).handle(path, body)
+
+
+def test_retry_http_5xx():
+    with _FlakyServer(KEY, 2) as mock:
+        client = Orderquery(APPID, MCH_ID, KEY, mock.transport()).setRetry(RetryPolicy(3, 0))
+        assert client.query(out_trade_no='o1')['trade_state'] == 'SUCCESS'
+        assert mock.calls == 3
+
+
+def test_http_5xx_raises_after_retries():
+    with _FlakyServer(KEY, 10) as mock:
+        client = Orderquery(APPID, MCH_ID, KEY, mock.transport()).setRetry(RetryPolicy(2, 0))
+        with pytest.raises(requests.HTTPError):
+            client.query(out_trade_no='o1')
+        assert mock.calls == 3
+
+
+def test_async_retry_http_5xx():
+    async def query(url):
+        transport = AsyncTransport(base_url=url)
+        try:
+            client = AsyncOrderquery(APPID, MCH_ID, KEY, transport).setRetry(RetryPolicy(3, 0))
+            return await client.query(out_trade_no='o1')
+        finally:
+            await transport.close()
+
+    with _FlakyServer(KEY, 2) as mock:
+        assert asyncio.run(query(mock.url))['trade_state'] == 'SUCCESS'
+        assert mock.calls == 3
+
+
+def test_retry_replays_same_signed_request():
+    with MockServer(KEY, error_rate=1) as mock:
+        client = Orderquery(APPID, MCH_ID, KEY, mock.transport()).setRetry(RetryPolicy(2, 0))
+        res = client.query(out_trade_no='o1')
+        client.query(out_trade_no='o1')
+    assert res['err_code'] == 'SYSTEMERROR'
+    first, second = mock.nonces[('/pay/orderquery', 'o1')][:3], mock.nonces[('/pay/orderquery', 'o1')][3:]
+    # 重试原样发送同一个请求，nonce_str不变；新的调用重新生成
+    assert len(first) == len(second) == 3
+    assert len(set(first)) == 1 and len(set(second)) == 1 and first[0] != second[0]
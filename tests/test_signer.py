@@ -0,0 +1,29 @@
+import re
+from weixinpayx.signer import Signer
+
+# 微信支付文档“签名算法”一节的示例
+_VALUES = {'appid': 'wxd930ea5d5a258f4f', 'mch_id': '10000100', 'device_info': '1000', 'body': 'test',
+           'nonce_str': 'ibuaiVcKdpRxkhJA'}
+_KEY = '192006250b4c09247ec02edce69f6a2d'
+
+
+def test_md5_matches_documented_vector():
+    assert Signer(_KEY).sign(_VALUES) == '9A0A8659F005D6984697E2CA0A9CF3B7'
+
+
+def test_hmac_sha256_is_uppercase_hex():
+    sign = Signer(_KEY, 'HMAC-SHA256').sign(_VALUES)
+    assert sign == '6A9AE1657590FD6257D693A078E1C3E4BB6BA4DC30B23E0EE2496E54170DACD6'
+    assert re.fullmatch('[0-9A-F]{64}', sign)
+
+
+def test_verify():
+    for sign_type in ('MD5', 'HMAC-SHA256'):
+        signer = Signer(_KEY, sign_type)
+        values = dict(_VALUES, sign=signer.sign(_VALUES))
+        assert signer.verify(values)
+        # 空值和sign本身不参与签名
+        assert signer.verify(dict(values, attach=''))
+        assert not signer.verify(dict(values, body='changed'))
+        assert not signer.verify(dict(values, sign='签名'))
+        assert not Signer('x' * 32, sign_type).verify(values)
@@ -0,0 +1,105 @@
+import asyncio
+import aiohttp
+import pytest
+import requests
+from weixinpayx import Downloadbill, RateLimiter
+from weixinpayx.aio import AsyncTransport, Orderquery as AsyncOrderquery
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY
+
+
+class _BadGatewayServer(MockServer):
+
+    def handle(self, path, body):
+        return 502, b'<html>502 Bad Gateway</html>'
+
+
+def _state(limiter):
+    (item, ) = limiter.metrics().values()
+    return item['state']
+
+
+def test_stream_records_success(mock):
+    limiter = RateLimiter(failure_threshold=1)
+    client = Downloadbill(APPID, MCH_ID, KEY, mock.transport(limiter=limiter))
+    assert len(list(client.rows('20240101'))) == mock.bill_rows
+    assert _state(limiter) == 'closed'
+
+
+def test_stream_records_error_xml_as_failure():
+    limiter = RateLimiter(failure_threshold=1)
+    with MockServer(KEY, error_rate=1) as mock:
+        client = Downloadbill(APPID, MCH_ID, KEY, mock.transport(limiter=limiter))
+        with pytest.raises(Exception):
+            list(client.rows('20240101'))
+    assert _state(limiter) == 'open'
+
+
+def test_stream_records_http_5xx_as_failure():
+    limiter = RateLimiter(failure_threshold=1)
+    with _BadGatewayServer(KEY) as mock:
+        with pytest.raises(requests.HTTPError):
+            mock.transport(limiter=limiter).stream('https://api.mch.weixin.qq.com/pay/downloadbill', b'<xml></xml>', MCH_ID)
+    assert _state(limiter) == 'open'
+
+
+def test_bill_download_fails_on_error_page(tmp_path):
+    path = tmp_path / 'bill.csv'
+    with _BadGatewayServer(KEY) as mock:
+        client = Downloadbill(APPID, MCH_ID, KEY, mock.transport())
+        with pytest.raises(requests.HTTPError):
+            client.rows('20240101')
+        with pytest.raises(requests.HTTPError):
+            client.download('20240101', str(path))
+    assert not path.exists()
+
+
+class _TruncatedGzipServer(MockServer):
+
+    def handle(self, path, body):
+        status, data = super(_TruncatedGzipServer, self).handle(path, body)
+        return status, data[:len(data) // 2]
+
+
+def test_bill_truncated_gzip_raises():
+    with _TruncatedGzipServer(KEY, bill_rows=1000) as mock:
+        client = Downloadbill(APPID, MCH_ID, KEY, mock.transport())
+        with pytest.raises(Exception, match='不完整'):
+            list(client.rows('20240101'))
+
+
+def test_post_records_http_5xx_as_failure():
+    limiter = RateLimiter(failure_threshold=1)
+    with _BadGatewayServer(KEY) as mock:
+        with pytest.raises(requests.HTTPError):
+            mock.transport(limiter=limiter).post('https://api.mch.weixin.qq.com/pay/orderquery', b'<xml></xml>', MCH_ID)
+    assert _state(limiter) == 'open'
+
+
+def test_async_post_records_http_5xx_as_failure():
+    limiter = RateLimiter(failure_threshold=1)
+
+    async def post(url):
+        transport = AsyncTransport(base_url=url, limiter=limiter)
+        try:
+            await transport.post('https://api.mch.weixin.qq.com/pay/orderquery', b'<xml></xml>', MCH_ID)
+        finally:
+            await transport.close()
+
+    with _BadGatewayServer(KEY) as mock:
+        with pytest.raises(aiohttp.ClientResponseError):
+            asyncio.run(post(mock.url))
+    assert _state(limiter) == 'open'
+
+
+def test_async_transport_survives_new_event_loop(mock):
+    transport = AsyncTransport(base_url=mock.url, merchant_limit=1)
+
+    async def query():
+        client = AsyncOrderquery(APPID, MCH_ID, KEY, transport)
+        return await asyncio.gather(*(client.query(out_trade_no='o%d' % i) for i in range(3)))
+
+    # 每次asyncio.run都是新的事件循环，如每个任务一个事件循环的worker
+    for i in range(2):
+        assert all(res['trade_state'] == 'SUCCESS' for res in asyncio.run(query()))
+    asyncio.run(transport.close())
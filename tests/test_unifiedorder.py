@@ -0,0 +1,34 @@
+from weixinpayx import Unifiedorder, UnifiedorderResult
+from weixinpayx.cache import LRUCache
+from weixinpayx.mock_server import MockServer
+from .common import APPID, MCH_ID, KEY, CART
+
+
+
+def test_prepay_cache_returns_copies(mock, transport):
+    order = Unifiedorder(APPID, MCH_ID, KEY, transport).setPrepayCache(LRUCache())
+    res, reSign = order.pay(**CART)
+    prepay_id = res['prepay_id']
+    res['prepay_id'] = 'changed'
+
+    again, reSign = order.pay(**CART)
+    assert again['prepay_id'] == prepay_id
+    assert reSign['package'] == 'prepay_id=' + prepay_id
+    again['prepay_id'] = 'changed'
+    assert order.pay(**CART)[0]['prepay_id'] == prepay_id
+    assert sum(mock.requests.values()) == 1
+
+
+def test_concurrent_typed_pay_with_prepay_cache():
+    with MockServer(KEY, latency=0.2) as mock:
+        order = Unifiedorder(APPID, MCH_ID, KEY, mock.transport()).setTyped().setPrepayCache(LRUCache())
+        results = order.payMany([CART] * 4, concurrency=4)
+        results.append(order.pay(**CART))
+    assert sum(mock.requests.values()) == 1
+    assert all(isinstance(res, UnifiedorderResult) for res, reSign in results)
+    prepay_ids = {res.prepay_id for res, reSign in results}
+    assert len(prepay_ids) == 1
+    assert {reSign['package'] for res, reSign in results} == {'prepay_id=' + prepay_ids.pop()}
+    # 每个调用方各自的对象和二次签名
+    assert len({id(res) for res, reSign in results}) == 5
+    assert len({reSign['nonceStr'] for res, reSign in results}) == 5
@@ -0,0 +1,27 @@
+import pytest
+from weixinpayx import xmlcodec
+
+
+def test_flat_round_trip_escapes_cdata_end():
+    data = {'body': 'a]]>b <c> & d', 'total_fee': 1, 'attach': '', 'detail': '中文'}
+    body = xmlcodec.dumps(data)
+    assert body.startswith(b'<xml><body><![CDATA[a]]]]><![CDATA[>b')
+    # 空值不编码
+    assert b'attach' not in body
+    assert xmlcodec.loads(body) == {'body': 'a]]>b <c> & d', 'total_fee': '1', 'detail': '中文'}
+
+
+def test_loads_strips_text_and_checks_root():
+    assert xmlcodec.loads('<xml><a> 1 </a><b/></xml>') == {'a': '1', 'b': ''}
+    assert xmlcodec.loads('<?xml version="1.0" encoding="UTF-8"?><xml><a>中</a></xml>'.encode('utf-8')) == {'a': '中'}
+    assert xmlcodec.loads(b'<root><a>1</a></root>', 'root') == {'a': '1'}
+    with pytest.raises(KeyError):
+        xmlcodec.loads(b'<root><a>1</a></root>')
+
+
+def test_nested_falls_back_to_generic_codec():
+    body = xmlcodec.dumps({'a': '1', 'scene_info': {'store_info': {'id': 's1'}}})
+    assert body == b'<xml><a>1</a><scene_info><store_info><id>s1</id></store_info></scene_info></xml>'
+    assert xmlcodec.loads(body) == {'a': '1', 'scene_info': {'store_info': {'id': 's1'}}}
+    # 重复的节点
+    assert xmlcodec.loads(b'<xml><a>1</a><a>2</a></xml>') == {'a_all': ['1', '2']}
@@ -1,8 +1,84 @@
 __version__ = '0.0.2'
 
-from .unifiedorder import Unifiedorder
-from .orderquery import Orderquery
-from .refund import Refund
-from .refundquery import RefundQuery
-from .wx_utils import *
-from .refund_decode import RefundDecode
+import importlib
+
+# 名字 -> 所在模块，第一次访问时才导入模块（PEP 562）
+# 只用签名、xml、回调验签时不会加载requests、Crypto等依赖
+_LAZY = {
+    'Unifiedorder': 'unifiedorder',
+    'Orderquery': 'orderquery',
+    'Downloadbill': 'downloadbill',
+    'Downloadfundflow': 'downloadfundflow',
+    'Refund': 'refund',
+    'RefundQuery': 'refundquery',
+    'getRandomStr': 'wx_utils',
+    'createSign': 'wx_utils',
+    'decodeXML': 'wx_utils',
+    'dumpXML': 'wx_utils',
+    'encodeXML': 'wx_utils',
+    'post': 'wx_utils',
+    'getIp': 'wx_utils',
+    'RefundDecode': 'refund_decode',
+    'LRUCache': 'cache',
+    'RedisCache': 'cache',
+    'SingleFlight': 'cache',
+    'NotifyHandler': 'notify',
+    'Notification': 'notify',
+    'NotifyPool': 'notifypool',
+    'CachedOrderquery': 'ordercache',
+    'MerchantRegistry': 'registry',
+    'Merchant': 'registry',
+    'MerchantConfig': 'models',
+    'ApiRequest': 'models',
+    'UnifiedorderResult': 'models',
+    'OrderqueryResult': 'models',
+    'RefundResult': 'models',
+    'RefundqueryResult': 'models',
+    'RefundRecord': 'models',
+    'Signer': 'signer',
+    'getSigner': 'signer',
+    'NonceGenerator': 'nonce',
+    'NoncePool': 'nonce',
+    'getNonceSource': 'nonce',
+    'setNonceSource': 'nonce',
+    'Transport': 'transport',
+    'getDefaultTransport': 'transport',
+    'setDefaultTransport': 'transport',
+    'getCertTransport': 'transport',
+    'BillReader': 'bill',
+    'BillTable': 'bill',
+    'TokenBucket': 'ratelimit',
+    'CircuitBreaker': 'ratelimit',
+    'CircuitOpenError': 'ratelimit',
+    'RateLimiter': 'ratelimit',
+    'RetryPolicy': 'retry',
+    'BatchOrderquery': 'batch',
+    'BatchRefund': 'batch',
+    'RefundJournal': 'batch',
+    'BatchProgress': 'batch',
+    'BatchResult': 'batch',
+    'RefundPoller': 'refundpoller',
+    'Metrics': 'metrics',
+    'getMetrics': 'metrics',
+    'setMetrics': 'metrics',
+    'Cassette': 'cassette',
+    'CassetteMiss': 'cassette',
+    'RecordingTransport': 'cassette',
+    'ReplayTransport': 'cassette',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    value = getattr(importlib.import_module('.' + module, __name__), name)
+    # 缓存到模块字典，之后的访问不再经过__getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
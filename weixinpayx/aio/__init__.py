@@ -0,0 +1,7 @@
+from .transport import AsyncTransport, getDefaultTransport, getCertTransport
+from .unifiedorder import Unifiedorder
+from .orderquery import Orderquery
+from .refund import Refund
+from .refundquery import RefundQuery
+
+__all__ = ['AsyncTransport', 'getDefaultTransport', 'getCertTransport', 'Unifiedorder', 'Orderquery', 'Refund', 'RefundQuery']
@@ -0,0 +1,28 @@
+from .. import refund as _refund
+from ..metrics import startCall
+from .transport import getCertTransport
+
+__all__ = ['Refund']
+
+
+class Refund(_refund.Refund):
+    ''' Refund的异步版本
+    --
+        @param transport: 带证书的AsyncTransport(cert=..., key=...)，默认按refund的cert、key参数共享证书连接池
+    '''
+
+    async def refund(self, out_refund_no, total_fee, refund_fee, transaction_id=None, out_trade_no=None, refund_desc='', notify_url='', cert='./cert.pem', key='./key.pem'):
+        '''发起退款请求，参数和返回值见Refund.refund
+        --
+        '''
+        with startCall('refund', self.config.mch_id) as call:
+            request = self._prepare(out_refund_no, total_fee, refund_fee, transaction_id, out_trade_no, refund_desc, notify_url, call=call)
+            if request is None:
+                return '参数不合法，请检查请求参数！'
+            transport = self.transport or getCertTransport(cert, key)
+            if self.retry is None:
+                text = await transport.post(request.url, request.body, self.config.mch_id)
+            else:
+                text = await self.retry.apost(transport, request.url, request.body, self.config.mch_id)
+            call.lap('http')
+            return self._parse(text, call)
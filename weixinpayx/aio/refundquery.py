@@ -0,0 +1,28 @@
+from .. import refundquery as _refundquery
+from ..metrics import startCall
+from .transport import getDefaultTransport
+
+__all__ = ['RefundQuery']
+
+
+class RefundQuery(_refundquery.RefundQuery):
+    ''' RefundQuery的异步版本
+    --
+        @param transport: AsyncTransport，默认使用全局共享的异步连接池
+    '''
+
+    async def query(self, transaction_id=None, out_trade_no=None, out_refund_no=None, refund_id=None, offset=''):
+        '''发起查询请求，参数和返回值见RefundQuery.query
+        --
+        '''
+        with startCall('refundquery', self.config.mch_id) as call:
+            request = self._prepare(transaction_id, out_trade_no, out_refund_no, refund_id, offset, call=call)
+            if request is None:
+                return '参数不合法，请检查请求参数！'
+            transport = self.transport or getDefaultTransport()
+            if self.retry is None:
+                text = await transport.post(request.url, request.body, self.config.mch_id)
+            else:
+                text = await self.retry.apost(transport, request.url, request.body, self.config.mch_id)
+            call.lap('http')
+            return self._parse(text, call)
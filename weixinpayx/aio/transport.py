@@ -0,0 +1,160 @@
+import ssl
+import asyncio
+import aiohttp
+from urllib.parse import urlsplit
+
+__all__ = ['AsyncTransport', 'getDefaultTransport', 'getCertTransport']
+
+# 默认共享连接池
+_default = None
+# 证书连接池，按(cert, key)路径缓存
+_certTransports = {}
+
+
+class AsyncTransport(object):
+
+    # 可以重试的网络错误
+    errors = (aiohttp.ClientError, asyncio.TimeoutError)
+
+    def __init__(self, limit=100, limit_per_host=0, merchant_limit=20, connect_timeout=5, read_timeout=10, keep_alive=True, cert=None, key=None, limiter=None, base_url=None):
+        ''' 基于aiohttp的异步长连接池，可被aio下的四个接口类共享
+        --
+            @param limit: 连接池最大连接数，0为不限制
+            @param limit_per_host: 每个host的最大连接数，0为不限制
+            @param merchant_limit: 每个商户号同时进行的最大请求数，None为不限制
+            @param connect_timeout: 建立连接超时时间，单位秒
+            @param read_timeout: 读取响应超时时间，单位秒
+            @param keep_alive: 是否保持长连接
+            @param cert, key: 微信支付证书路径，退款等接口需要
+            @param limiter: weixinpayx.RateLimiter，按接口和商户号限流、熔断
+            @param base_url: 替换接口地址的域名，如备用域名https://api2.mch.weixin.qq.com或本地MockServer
+        '''
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.merchant_limit = merchant_limit
+        self.timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        self.keep_alive = keep_alive
+        self.cert = cert
+        self.limiter = limiter
+        if cert:
+            # 证书只加载一次，之后所有连接复用
+            self.ssl_context = ssl.create_default_context()
+            self.ssl_context.load_cert_chain(cert, key)
+        else:
+            self.ssl_context = None
+        self.session = None
+        self._loop = None
+        self._semaphores = {}
+
+    def _getSession(self):
+        ''' 在当前事件循环中创建连接池
+        --
+            连接池和按商户的并发限制都绑定在创建时的事件循环上，多次asyncio.run等事件循环变化时重新创建
+        '''
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 旧的事件循环已经结束或不是当前循环，其中的连接无法再使用，直接丢弃
+            self.session = None
+            self._semaphores = {}
+            self._loop = loop
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                force_close=not self.keep_alive,
+                ssl=self.ssl_context if self.ssl_context else True)
+            self.session = aiohttp.ClientSession(
+                connector=connector, timeout=self.timeout)
+        return self.session
+
+    def _getSemaphore(self, mch_id):
+        ''' 获取商户号对应的并发限制
+        --
+        '''
+        semaphore = self._semaphores.get(mch_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.merchant_limit)
+            self._semaphores[mch_id] = semaphore
+        return semaphore
+
+    async def post(self, url, data, mch_id=None, timeout=None):
+        ''' 发送post请求
+        --
+            @param url: 接口地址
+            @param data: 请求的xml，字节串直接发送，字符串按utf-8编码
+            @param mch_id: 商户号，用于按商户限制并发
+            @param timeout: 本次请求的超时秒数或(连接超时, 读取超时)，默认使用创建时的设置
+        '''
+        if self.base_url:
+            url = self.base_url + urlsplit(url).path
+        if timeout is not None:
+            if isinstance(timeout, tuple):
+                timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+        session = self._getSession()
+        if self.merchant_limit is None or mch_id is None:
+            return await self._post(session, url, data, mch_id, timeout)
+        async with self._getSemaphore(mch_id):
+            return await self._post(session, url, data, mch_id, timeout)
+
+    async def _post(self, session, url, data, mch_id, timeout):
+        limiter = self.limiter
+        if limiter is None:
+            return await self._send(session, url, data, timeout)
+
+        wait = limiter.reserve(url, mch_id)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            text = await self._send(session, url, data, timeout)
+        except self.errors as e:
+            limiter.record(url, mch_id, error=e)
+            raise
+        limiter.record(url, mch_id, text)
+        return text
+
+    async def _send(self, session, url, data, timeout):
+        ''' 发送请求
+        --
+            5xx错误页抛出aiohttp.ClientResponseError，属于errors，可以重试，也计入熔断
+        '''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        async with session.post(url, data=data, timeout=timeout or self.timeout) as r:
+            if r.status >= 500:
+                r.raise_for_status()
+            return await r.read()
+
+    async def close(self):
+        ''' 关闭连接池
+        --
+        '''
+        if self.session is not None:
+            if self._loop is asyncio.get_running_loop():
+                await self.session.close()
+            self.session = None
+
+
+def getDefaultTransport():
+    ''' 获取全局共享的异步连接池
+    --
+    '''
+    global _default
+    if _default is None:
+        _default = AsyncTransport()
+    return _default
+
+
+def getCertTransport(cert, key):
+    ''' 获取带证书的异步连接池，相同证书路径共享同一个连接池
+    --
+        @param cert, key: 微信支付证书路径
+    '''
+    k = (cert, key)
+    transport = _certTransports.get(k)
+    if transport is None:
+        transport = AsyncTransport(cert=cert, key=key)
+        _certTransports[k] = transport
+    return transport
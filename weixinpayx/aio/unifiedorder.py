@@ -0,0 +1,58 @@
+import asyncio
+import logging
+from .. import unifiedorder as _unifiedorder
+from ..metrics import startCall
+from .transport import getDefaultTransport
+
+__all__ = ['Unifiedorder']
+
+_log = logging.getLogger()
+
+
+class Unifiedorder(_unifiedorder.Unifiedorder):
+    ''' Unifiedorder的异步版本，参数设置与签名逻辑与同步版本一致
+    --
+        @param transport: AsyncTransport，默认使用全局共享的异步连接池
+    '''
+
+    async def pay(self, total_fee, out_trade_no, body, spbill_create_ip, notify_url, trade_type='JSAPI', openid='', product_id='', time_start='', time_expire='', scene_info=''):
+        '''发起支付请求，参数和返回值见Unifiedorder.pay
+        --
+        '''
+        with startCall('unifiedorder', self.config.mch_id) as call:
+            request = self._prepare(total_fee, out_trade_no, body, spbill_create_ip, notify_url, trade_type,
+                                   openid, product_id, time_start, time_expire, scene_info, call=call)
+            if request is None:
+                return False, '参数不合法，请检查请求参数！'
+            key = None
+            if self.prepayCache is not None:
+                key, res = self._fromCache(request, call)
+                if res is not None:
+                    return self._result(res)
+            transport = self.transport or getDefaultTransport()
+            if self.retry is None:
+                text = await transport.post(request.url, request.body, self.config.mch_id)
+            else:
+                text = await self.retry.apost(transport, request.url, request.body, self.config.mch_id)
+            call.lap('http')
+            res, msg = self._decode(text, call)
+            self._toCache(key, res)
+            if res is False:
+                return res, msg
+            return self._result(res)
+
+    async def payMany(self, carts, concurrency=10):
+        ''' 并发下单，参数和返回值见Unifiedorder.payMany
+        --
+        '''
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def payOne(cart):
+            async with semaphore:
+                try:
+                    return await self.pay(**cart)
+                except Exception as e:
+                    _log.error('下单失败：%s' % e)
+                    return False, str(e)
+
+        return await asyncio.gather(*(payOne(cart) for cart in carts))
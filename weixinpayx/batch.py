@@ -0,0 +1,380 @@
+import os
+import json
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .orderquery import Orderquery
+from .refund import Refund
+from .ratelimit import TokenBucket
+from .retry import RetryPolicy, TRANSIENT_CODES
+from .transport import Transport
+from .wx_utils import encodeXML
+
+__all__ = ['BatchOrderquery', 'BatchRefund', 'RefundJournal', 'BatchProgress', 'BatchResult']
+
+_log = logging.getLogger()
+
+# 单个订单的查询结果
+# order_id: 查询的订单号
+# result: 成功时为微信返回的结果，失败时为失败原因
+# ok: 是否拿到了校验通过的返回结果
+# attempts: 请求次数
+BatchResult = namedtuple('BatchResult', ['order_id', 'result', 'ok', 'attempts'])
+
+
+class BatchProgress(object):
+    ''' 批量查询进度
+    --
+    '''
+    __slots__ = ('submitted', 'completed', 'succeeded', 'failed', 'retried', 'skipped')
+
+    def __init__(self):
+        self.submitted = 0
+        self.completed = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.retried = 0
+        # 断点续传时跳过的已完成条目
+        self.skipped = 0
+
+    def __repr__(self):
+        return 'BatchProgress(submitted=%d, completed=%d, succeeded=%d, failed=%d, retried=%d, skipped=%d)' % (
+            self.submitted, self.completed, self.succeeded, self.failed, self.retried, self.skipped)
+
+
+class BatchOrderquery(object):
+
+    def __init__(self, appid, mch_id, key, transport=None, concurrency=10, rate=None, retries=2, backoff=0.5, id_type='out_trade_no'):
+        ''' 批量查询订单状态，用于对账时补查没有收到回调的订单
+        --
+            @param appid: 微信分配的小程序ID
+            @param mch_id: 微信支付分配的商户号
+            @param key: 商户平台API密钥
+            @param transport: 连接池，默认新建一个连接数等于concurrency的Transport
+            @param concurrency: 同时进行的查询数
+            @param rate: 每秒最多发起的查询数，None为不限制
+            @param retries: 网络错误或SYSTEMERROR时的最大重试次数
+            @param backoff: 第一次重试前等待的秒数，之后每次翻倍，带随机抖动
+            @param id_type: 传入的订单号类型，transaction_id或out_trade_no
+        '''
+        if id_type not in ('transaction_id', 'out_trade_no'):
+            raise Exception('id_type只能是transaction_id或out_trade_no')
+
+        self.transport = transport or Transport(pool_maxsize=concurrency)
+        # 自己创建的连接池由close关闭，传入的由调用方管理
+        self._ownsTransport = transport is None
+        # 请求参数每次调用单独生成，所有工作线程共享同一个client
+        self.client = Orderquery(appid, mch_id, key, self.transport)
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate) if rate else None
+        # 重试时原样发送同一个请求
+        self.retry = RetryPolicy(retries, backoff)
+        self.id_type = id_type
+        self.progress = BatchProgress()
+
+    def query(self, order_ids, callback=None):
+        ''' 批量查询，按完成顺序逐个返回BatchResult
+        --
+            @param order_ids: 订单号的可迭代对象，可以是生成器，不会一次性读入内存
+            @param callback: 每完成一个订单调用一次callback(progress)
+        '''
+        self.progress = progress = BatchProgress()
+        # 最多同时保留2倍并发数的任务，保证内存占用不随订单数增长
+        window = self.concurrency * 2
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = set()
+        try:
+            for order_id in order_ids:
+                pending.add(executor.submit(self._queryOne, order_id))
+                progress.submitted += 1
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._finish(future, callback)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self._finish(future, callback)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _finish(self, future, callback):
+        result = future.result()
+        progress = self.progress
+        progress.completed += 1
+        progress.retried += result.attempts - 1
+        if result.ok:
+            progress.succeeded += 1
+        else:
+            progress.failed += 1
+        if callback:
+            callback(progress)
+        return result
+
+    def close(self):
+        ''' 关闭自己创建的连接池
+        --
+        '''
+        if self._ownsTransport:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _queryOne(self, order_id):
+        ''' 查询单个订单，网络错误和SYSTEMERROR按RetryPolicy重试
+        --
+            单个订单的任何异常（参数不合法、返回的不是xml等）只记为该订单失败，不中断整批查询
+        '''
+        client = self.client
+        attempts = 1
+        try:
+            request = client._prepare(**{self.id_type: order_id})
+            if request is None:
+                return BatchResult(order_id, '参数不合法，请检查请求参数！', False, attempts)
+            text, attempts, error = self.retry._send(self.transport, request.url, request.body, client.config.mch_id,
+                                                     self.limiter.acquire if self.limiter else None)
+
+            if error is not None:
+                _log.error('订单%s查询失败：%s' % (order_id, error))
+                return BatchResult(order_id, str(error), False, attempts)
+            res = encodeXML(text)
+            if client._checkValues(res):
+                return BatchResult(order_id, res, True, attempts)
+            _log.error('订单%s查询失败，返回结果：%s' % (order_id, res))
+            return BatchResult(order_id, '返回参数校验不通过或者请求失败!', False, attempts)
+        except Exception as e:
+            _log.error('订单%s查询失败：%s' % (order_id, e))
+            return BatchResult(order_id, '%s: %s' % (type(e).__name__, e), False, attempts)
+
+
+class RefundJournal(object):
+
+    def __init__(self, path, fsync=False):
+        ''' 批量退款的进度文件，每完成一笔追加一行json
+        --
+            拿到了微信明确结果（成功或业务失败）的退款记为已完成，续传时跳过
+            参数不合法、返回报文无法解析的退款也会记录，但不算完成，续传时重新提交；网络错误等未知结果不记录
+            @param path: 文件路径，不存在时创建
+            @param fsync: 每写一行是否fsync，进程崩溃不丢进度只需flush，机器掉电不丢进度需要fsync
+        '''
+        self.path = path
+        self.fsync = fsync
+        # out_refund_no -> 是否退款成功
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        # 崩溃时最后一行可能没写完
+                        continue
+                    if item.get('final', True):
+                        self.done[item['out_refund_no']] = item['ok']
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def __contains__(self, out_refund_no):
+        return out_refund_no in self.done
+
+    def record(self, out_refund_no, ok, res, final=True):
+        ''' 记录一笔退款的结果
+        --
+            @param res: 微信返回的结果，或失败原因
+            @param final: 是否是明确结果，否则只记录，续传时重新提交
+        '''
+        item = {'out_refund_no': out_refund_no, 'ok': ok}
+        if isinstance(res, dict):
+            item['refund_id'] = res.get('refund_id')
+            item['err_code'] = res.get('err_code')
+        else:
+            item['error'] = str(res)
+        if not final:
+            item['final'] = False
+        line = json.dumps(item, ensure_ascii=False) + '\n'
+        with self._lock:
+            if final:
+                self.done[out_refund_no] = ok
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+class BatchRefund(object):
+
+    def __init__(self, appid, mch_id, key, cert='./cert.pem', cert_key='./key.pem', transport=None, concurrency=10, rate=None, retries=2, backoff=0.5, journal=None, id_type='out_trade_no'):
+        ''' 批量退款，用于大促后集中取消订单
+        --
+            同一个out_refund_no重复提交微信只会退款一次，重试和续传时重新提交未知结果的退款不会重复退款
+            @param appid: 微信分配的小程序ID
+            @param mch_id: 微信支付分配的商户号
+            @param key: 商户平台API密钥
+            @param cert, cert_key: 微信支付证书路径
+            @param transport: 带证书的连接池，默认新建一个连接数等于concurrency的Transport
+            @param concurrency: 同时进行的退款数
+            @param rate: 每秒最多提交的退款数，None为不限制
+            @param retries: 网络错误或SYSTEMERROR时的最大重试次数
+            @param backoff: 第一次重试前等待的秒数，之后每次翻倍，带随机抖动
+            @param journal: 进度文件路径或RefundJournal，中断后用同一个文件重新运行会跳过已完成的退款
+            @param id_type: 传入元组时订单号的类型，transaction_id或out_trade_no
+        '''
+        if id_type not in ('transaction_id', 'out_trade_no'):
+            raise Exception('id_type只能是transaction_id或out_trade_no')
+
+        self.transport = transport or Transport(pool_maxsize=concurrency, cert=cert, key=cert_key)
+        # 自己创建的连接池和进度文件由close关闭，传入的由调用方管理
+        self._ownsTransport = transport is None
+        self._ownsJournal = isinstance(journal, str)
+        # 请求参数每次调用单独生成，所有工作线程共享同一个client
+        self.client = Refund(appid, mch_id, key, self.transport)
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate) if rate else None
+        # 重试时原样发送同一个请求
+        self.retry = RetryPolicy(retries, backoff)
+        if isinstance(journal, str):
+            journal = RefundJournal(journal)
+        self.journal = journal
+        self.id_type = id_type
+        self.progress = BatchProgress()
+
+    def refund(self, records, callback=None):
+        ''' 批量退款，按完成顺序逐个返回BatchResult，order_id为out_refund_no
+        --
+            @param records: 退款的可迭代对象，可以是生成器，不会一次性读入内存
+                            每项为(out_refund_no, total_fee, refund_fee, 订单号)元组，订单号类型见id_type
+                            或包含Refund.refund同名参数的字典
+            @param callback: 每完成一笔调用一次callback(progress)
+        '''
+        self.progress = progress = BatchProgress()
+        # 最多同时保留2倍并发数的任务，保证内存占用不随退款数增长
+        window = self.concurrency * 2
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = set()
+        journal = self.journal
+        try:
+            for record in records:
+                try:
+                    params = self._params(record)
+                except Exception as e:
+                    # 单条记录不合法只记为失败，不中断整批退款
+                    _log.error('退款记录%r不合法：%s' % (record, e))
+                    progress.submitted += 1
+                    yield self._count(BatchResult(None, '退款记录不合法：%s' % e, False, 1), callback)
+                    continue
+                if journal is not None and params['out_refund_no'] in journal:
+                    progress.skipped += 1
+                    continue
+                pending.add(executor.submit(self._refundOne, params))
+                progress.submitted += 1
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._finish(future, callback)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield self._finish(future, callback)
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _params(self, record):
+        if isinstance(record, dict):
+            params = dict(record)
+        else:
+            out_refund_no, total_fee, refund_fee, order_id = record
+            params = {'out_refund_no': out_refund_no, 'total_fee': total_fee, 'refund_fee': refund_fee,
+                      self.id_type: order_id}
+        if not params.get('out_refund_no'):
+            raise Exception('out_refund_no不能为空')
+        params.setdefault('transaction_id', None)
+        params.setdefault('out_trade_no', None)
+        params.setdefault('refund_desc', '')
+        params.setdefault('notify_url', '')
+        return params
+
+    def _finish(self, future, callback):
+        return self._count(future.result(), callback)
+
+    def _count(self, result, callback):
+        progress = self.progress
+        progress.completed += 1
+        progress.retried += result.attempts - 1
+        if result.ok:
+            progress.succeeded += 1
+        else:
+            progress.failed += 1
+        if callback:
+            callback(progress)
+        return result
+
+    def close(self):
+        ''' 关闭自己创建的连接池和由路径打开的进度文件
+        --
+        '''
+        if self._ownsJournal:
+            self.journal.close()
+        if self._ownsTransport:
+            self.transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _refundOne(self, params):
+        ''' 提交单笔退款，网络错误和SYSTEMERROR按RetryPolicy重试
+        --
+            参数不合法、返回的不是xml等异常只记为该笔失败并写入进度文件，不中断整批退款
+        '''
+        out_refund_no = params['out_refund_no']
+        try:
+            return self._submit(out_refund_no, params)
+        except Exception as e:
+            _log.error('退款%s提交失败：%s' % (out_refund_no, e))
+            error = '%s: %s' % (type(e).__name__, e)
+            if self.journal is not None:
+                self.journal.record(out_refund_no, False, error, final=False)
+            return BatchResult(out_refund_no, error, False, 1)
+
+    def _submit(self, out_refund_no, params):
+        client = self.client
+        request = client._prepare(**params)
+        if request is None:
+            if self.journal is not None:
+                self.journal.record(out_refund_no, False, '参数不合法', final=False)
+            return BatchResult(out_refund_no, '参数不合法，请检查请求参数！', False, 1)
+        text, attempts, error = self.retry._send(self.transport, request.url, request.body, client.config.mch_id,
+                                                 self.limiter.acquire if self.limiter else None)
+
+        if error is not None:
+            _log.error('退款%s提交失败：%s' % (out_refund_no, error))
+            return BatchResult(out_refund_no, str(error), False, attempts)
+        try:
+            res = encodeXML(text)
+        except Exception as e:
+            _log.error('退款%s返回的不是合法的xml：%s' % (out_refund_no, e))
+            error = '返回报文无法解析：%s' % e
+            if self.journal is not None:
+                self.journal.record(out_refund_no, False, error, final=False)
+            return BatchResult(out_refund_no, error, False, attempts)
+        if not client._checkValues(res):
+            _log.error('退款%s提交失败，返回结果：%s' % (out_refund_no, res))
+            return BatchResult(out_refund_no, '返回参数校验不通过或者请求失败!', False, attempts)
+        ok = res.get('result_code') == 'SUCCESS'
+        if self.journal is not None and (ok or res.get('err_code') not in TRANSIENT_CODES):
+            self.journal.record(out_refund_no, ok, res)
+        return BatchResult(out_refund_no, res, ok, attempts)
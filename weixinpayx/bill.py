@@ -0,0 +1,289 @@
+import zlib
+import codecs
+from array import array
+from decimal import Decimal
+from datetime import datetime
+from collections import namedtuple
+from functools import lru_cache
+from itertools import chain
+from .wx_utils import encodeXML
+
+__all__ = ['BillReader', 'BillTable', 'iterBody', 'iterLines']
+
+# 对账单中文表头 -> 字段名，未列出的列命名为col序号
+FIELDS = {
+    # 交易账单
+    '交易时间': 'trade_time',
+    '公众账号ID': 'appid',
+    '商户号': 'mch_id',
+    '特约商户号': 'sub_mch_id',
+    '子商户号': 'sub_mch_id',
+    '设备号': 'device_info',
+    '微信订单号': 'transaction_id',
+    '商户订单号': 'out_trade_no',
+    '用户标识': 'openid',
+    '交易类型': 'trade_type',
+    '交易状态': 'trade_state',
+    '付款银行': 'bank_type',
+    '货币种类': 'fee_type',
+    '应结订单金额': 'settlement_total_fee',
+    '总金额': 'total_fee',
+    '代金券金额': 'coupon_fee',
+    '代金券或立减优惠金额': 'coupon_fee',
+    '企业红包金额': 'coupon_fee',
+    '退款申请时间': 'refund_time',
+    '退款成功时间': 'refund_success_time',
+    '微信退款单号': 'refund_id',
+    '商户退款单号': 'out_refund_no',
+    '退款金额': 'settlement_refund_fee',
+    '充值券退款金额': 'coupon_refund_fee',
+    '代金券或立减优惠退款金额': 'coupon_refund_fee',
+    '企业红包退款金额': 'coupon_refund_fee',
+    '退款类型': 'refund_channel',
+    '退款状态': 'refund_status',
+    '商品名称': 'body',
+    '商户数据包': 'attach',
+    '手续费': 'poundage',
+    '费率': 'rate',
+    '订单金额': 'total_fee',
+    '申请退款金额': 'refund_fee',
+    '费率备注': 'rate_remark',
+    # 交易账单汇总
+    '总交易单数': 'total_count',
+    '应结订单总金额': 'settlement_total_fee',
+    '总交易额': 'settlement_total_fee',
+    '退款总金额': 'settlement_refund_fee',
+    '总退款金额': 'settlement_refund_fee',
+    '充值券退款总金额': 'coupon_refund_fee',
+    '总代金券或立减优惠退款金额': 'coupon_refund_fee',
+    '总企业红包退款金额': 'coupon_refund_fee',
+    '手续费总金额': 'poundage',
+    '订单总金额': 'total_fee',
+    '申请退款总金额': 'refund_fee',
+    # 资金账单
+    '记账时间': 'bill_time',
+    '微信支付业务单号': 'biz_transaction_id',
+    '资金流水单号': 'fund_flow_id',
+    '业务名称': 'biz_name',
+    '业务类型': 'biz_type',
+    '收支类型': 'io_type',
+    '收支金额（元）': 'amount',
+    '账户结余（元）': 'balance',
+    '资金变更提交申请人': 'applicant',
+    '备注': 'remark',
+    '业务凭证号': 'voucher_no',
+    # 资金账单汇总
+    '资金流水总笔数': 'total_count',
+    '收入笔数': 'income_count',
+    '收入金额': 'income_amount',
+    '支出笔数': 'expense_count',
+    '支出金额': 'expense_amount',
+}
+
+# 列的类型
+STR, FEN, DECIMAL, COUNT, TIME = 'str', 'fen', 'decimal', 'count', 'time'
+
+
+def _fen(s):
+    ''' 元转分，除手续费外账单金额最多两位小数，不经过float
+    --
+    '''
+    yuan, _, cents = s.partition('.')
+    return int(yuan + (cents + '00')[:2])
+
+
+def _decimal(s):
+    ''' 手续费按原样的小数位数转换，不经过float
+    --
+    '''
+    return Decimal(s or '0')
+
+
+def _time(s):
+    return datetime.fromisoformat(s) if s else None
+
+
+_CONVERTERS = {STR: str, FEN: _fen, DECIMAL: _decimal, COUNT: int, TIME: _time}
+
+
+def columnKind(column):
+    ''' 根据中文表头判断列的类型
+    --
+        @return STR、FEN（金额，转换为分）、DECIMAL（手续费，单位元）、COUNT（笔数）、TIME（时间）之一
+    '''
+    if '手续费' in column:
+        # 手续费精确到小数点后5位，如0.00600，转换为分会丢掉不足一分的部分
+        return DECIMAL
+    if '金额' in column or '结余' in column or column == '总交易额':
+        return FEN
+    if '笔数' in column or '单数' in column:
+        return COUNT
+    if '时间' in column:
+        return TIME
+    return STR
+
+
+@lru_cache(64)
+def _rowType(fields):
+    return namedtuple('BillRow', fields, rename=True)
+
+
+def _split(line):
+    ''' 数据行每个字段以`开头，按",`"切分，字段内容中的逗号不影响切分
+    --
+    '''
+    return line[1:].split(',`')
+
+
+def iterBody(chunks):
+    ''' 检查下载结果并解压
+    --
+        下载失败时微信返回xml报文，成功时返回csv，tar_type=GZIP时为gzip压缩的csv
+        @param chunks: 响应体字节块的迭代器
+        @return 解压后的csv字节块的迭代器，失败时抛出异常
+    '''
+    chunks = iter(chunks)
+    first = b''
+    for first in chunks:
+        if first:
+            break
+    if first.lstrip()[:5] == b'<xml>':
+        res = encodeXML(first + b''.join(chunks))
+        raise Exception('下载账单失败：%s' % (res.get('err_code_des') or res.get('return_msg') or res.get('error_code')))
+    if first[:2] != b'\x1f\x8b':
+        return chain((first,), chunks)
+    return _gunzip(chain((first,), chunks))
+
+
+def _gunzip(chunks):
+    d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = d.decompress(chunk)
+        if data:
+            yield data
+    data = d.flush()
+    if data:
+        yield data
+    if not d.eof:
+        # 连接中途断开时压缩流不完整，不能当作账单已经读完
+        raise Exception('账单压缩数据不完整')
+
+
+def iterLines(chunks):
+    ''' 把csv字节块解码并按行切分，内存占用只与块大小有关
+    --
+        @param chunks: iterBody返回的字节块
+        @return 不含换行符的行
+    '''
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    rest = ''
+    for chunk in chunks:
+        lines = (rest + decoder.decode(chunk)).split('\n')
+        rest = lines.pop()
+        for line in lines:
+            yield line.rstrip('\r')
+    rest += decoder.decode(b'', True)
+    if rest:
+        yield rest.rstrip('\r')
+
+
+class BillReader(object):
+
+    def __init__(self, lines):
+        ''' 逐行解析对账单，迭代得到每一行的namedtuple
+        --
+            金额转换为整数分，手续费转换为Decimal（单位元），笔数转换为整数，时间转换为datetime，其余为字符串
+            读完后summary为汇总数据的字典
+            @param lines: iterLines返回的行
+        '''
+        self._lines = lines
+        # 中文表头
+        self.columns = None
+        # 字段名
+        self.fields = None
+        # 各列类型
+        self.kinds = None
+        self.summary = None
+
+    def _header(self, line):
+        self.columns = tuple(line.split(','))
+        # 重复的字段名由namedtuple改名为_序号
+        self.fields = _rowType(tuple(FIELDS.get(c, 'col%d' % i) for i, c in enumerate(self.columns)))._fields
+        self.kinds = tuple(columnKind(c) for c in self.columns)
+
+    def records(self):
+        ''' 逐行返回转换后的字段列表
+        --
+        '''
+        lines = self._lines
+        for line in lines:
+            if line:
+                self._header(line)
+                break
+        else:
+            return
+        converters = [_CONVERTERS[kind] for kind in self.kinds]
+        for line in lines:
+            if not line:
+                continue
+            if line[0] != '`':
+                # 数据行之后是汇总的表头和一行汇总数据
+                self._summary(line, lines)
+                return
+            yield [f(v) for f, v in zip(converters, _split(line))]
+
+    def _summary(self, header, lines):
+        columns = header.split(',')
+        for line in lines:
+            if line:
+                values = _split(line)
+                self.summary = {FIELDS.get(c, c): _CONVERTERS[columnKind(c)](v) for c, v in zip(columns, values)}
+                return
+
+    def __iter__(self):
+        records = self.records()
+        for values in records:
+            make = _rowType(self.fields)._make
+            yield make(values)
+            for values in records:
+                yield make(values)
+
+
+class BillTable(object):
+
+    def __init__(self, reader):
+        ''' 按列存储的对账单，金额和笔数列为array('q')，其余（包括手续费）为list
+        --
+            @param reader: BillReader
+        '''
+        columns = None
+        for values in reader.records():
+            if columns is None:
+                columns = [array('q') if kind in (FEN, COUNT) else [] for kind in reader.kinds]
+                appends = [c.append for c in columns]
+            for append, v in zip(appends, values):
+                append(v)
+        self.fields = reader.fields or ()
+        self.columns = dict(zip(self.fields, columns or ()))
+        self.summary = reader.summary
+
+    def __len__(self):
+        if not self.columns:
+            return 0
+        return len(next(iter(self.columns.values())))
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __iter__(self):
+        ''' 按行迭代
+        --
+        '''
+        Row = _rowType(self.fields)
+        return map(Row._make, zip(*self.columns.values()))
+
+    def sum(self, field):
+        ''' 某一列的合计
+        --
+        '''
+        return sum(self.columns[field])
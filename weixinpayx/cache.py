@@ -0,0 +1,153 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+
+__all__ = ['LRUCache', 'RedisCache', 'SingleFlight']
+
+_MISSING = object()
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=10000, ttl=None, on_evict=None):
+        ''' 线程安全的LRU缓存，可设置过期时间
+        --
+            @param maxsize: 最大条目数，超出时淘汰最久未使用的
+            @param ttl: 默认过期秒数，None为不过期
+            @param on_evict: 条目因超出maxsize被淘汰时调用on_evict(key, value)
+        '''
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        # key -> (过期时间, value)
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        ''' 获取缓存，不存在或已过期时返回default
+        --
+        '''
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            expire, value = item
+            if expire is not None and expire <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=_MISSING):
+        ''' 设置缓存
+        --
+            @param ttl: 本条的过期秒数，不传使用默认值，None为不过期
+        '''
+        if ttl is _MISSING:
+            ttl = self.ttl
+        expire = time.monotonic() + ttl if ttl is not None else None
+        evicted = []
+        with self._lock:
+            self._data[key] = (expire, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                evicted.append(self._data.popitem(last=False))
+        if self.on_evict is not None:
+            for k, (expire, v) in evicted:
+                self.on_evict(k, v)
+
+    def delete(self, key):
+        ''' 删除缓存
+        --
+        '''
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisCache(object):
+
+    def __init__(self, client, prefix='weixinpayx:', serializer=None):
+        ''' 基于redis的缓存，多个进程共享，接口与LRUCache相同
+        --
+            @param client: redis.Redis或兼容get、set(name, value, ex=秒数)、delete的客户端
+            @param prefix: key前缀
+            @param serializer: 有dumps、loads的序列化模块，默认json
+        '''
+        self.client = client
+        self.prefix = prefix
+        self.serializer = serializer or json
+
+    def get(self, key, default=None):
+        data = self.client.get(self.prefix + key)
+        if data is None:
+            return default
+        return self.serializer.loads(data)
+
+    def set(self, key, value, ttl=None):
+        ''' 设置缓存
+        --
+            @param ttl: 过期秒数，None为不过期
+        '''
+        ex = int(ttl + 0.999) if ttl is not None else None
+        self.client.set(self.prefix + key, self.serializer.dumps(value), ex=ex)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class _Call(object):
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+
+    def __init__(self):
+        ''' 合并并发的相同调用，同一个key同时只执行一次，其余调用等待并共享结果
+        --
+        '''
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        ''' 执行func，同一个key正在执行时等待其结果
+        --
+            @return 结果, 是否共享了其他调用的结果
+        '''
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result, False
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
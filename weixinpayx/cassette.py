@@ -0,0 +1,254 @@
+import os
+import mmap
+import struct
+import hashlib
+import threading
+from urllib.parse import urlsplit
+from .cache import LRUCache
+from .signer import Signer
+from .wx_utils import dumpXML, encodeXML
+
+__all__ = ['Cassette', 'CassetteMiss', 'RecordingTransport', 'ReplayTransport']
+
+# 文件头
+_MAGIC = b'WXPCAS1\n'
+# 每条记录的头：key长度、请求长度、响应长度，之后依次为key、请求、响应
+_HEADER = struct.Struct('<HII')
+
+# 计算请求摘要时忽略的字段，每次请求都不同
+_IGNORED = ('nonce_str', 'sign')
+
+
+class CassetteMiss(Exception):
+    ''' 回放时录制文件中没有对应的请求
+    --
+    '''
+    pass
+
+
+def requestKey(url, values):
+    ''' 请求的索引key：接口路径加上除nonce_str、sign外所有参数的摘要
+    --
+        @param url: 接口地址，只取路径，录制和回放可以使用不同的域名
+        @param values: 解析后的请求参数
+        @return 字节串
+    '''
+    parts = [f'{k}={v}' for k, v in sorted(values.items()) if k not in _IGNORED]
+    digest = hashlib.sha1('&'.join(parts).encode('utf-8')).hexdigest()
+    return ('%s %s' % (urlsplit(url).path, digest)).encode('ascii')
+
+
+class Cassette(object):
+
+    def __init__(self, path):
+        ''' 录制的请求和响应，只追加写入，读取时通过mmap直接从文件取响应
+        --
+            打开时扫描一遍文件建立索引：key -> 响应在文件中的位置，同一个请求录制多次时以最后一次为准
+            异常退出导致最后一条记录不完整时，打开时截掉
+            @param path: 录制文件路径，不存在时创建
+        '''
+        self.path = path
+        self._index = {}
+        self._map = None
+        self._lock = threading.Lock()
+        self._file = open(path, 'a+b')
+        self._load()
+
+    def _load(self):
+        f = self._file
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            f.write(_MAGIC)
+            f.flush()
+            return
+        self._remap()
+        data = self._map
+        if data[:len(_MAGIC)] != _MAGIC:
+            raise Exception('%s不是录制文件' % self.path)
+
+        offset = len(_MAGIC)
+        while offset + _HEADER.size <= size:
+            keyLen, requestLen, responseLen = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            end = start + keyLen + requestLen + responseLen
+            if end > size:
+                break
+            key = data[start:start + keyLen]
+            self._index[key] = (end - responseLen, responseLen)
+            offset = end
+        if offset < size:
+            f.truncate(offset)
+            self._remap()
+
+    def _remap(self):
+        ''' 重新映射整个文件，旧的映射不主动关闭，其他线程可能正在读取，没有引用后自动释放
+        --
+        '''
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def append(self, url, request, response):
+        ''' 追加一条记录
+        --
+            @param url: 接口地址
+            @param request: 请求的xml字节串
+            @param response: 响应体字节串
+            @return 记录的key
+        '''
+        if isinstance(request, str):
+            request = request.encode('utf-8')
+        key = requestKey(url, encodeXML(request))
+        with self._lock:
+            f = self._file
+            offset = f.seek(0, os.SEEK_END)
+            f.write(_HEADER.pack(len(key), len(request), len(response)) + key + request + response)
+            f.flush()
+            end = offset + _HEADER.size + len(key) + len(request) + len(response)
+            self._index[key] = (end - len(response), len(response))
+        return key
+
+    def get(self, key):
+        ''' 按key取响应
+        --
+            @return 响应体字节串，没有录制时返回None
+        '''
+        pos = self._index.get(key)
+        if pos is None:
+            return None
+        offset, length = pos
+        # 只读取一次self._map，之后都用局部引用，其他线程重新映射不影响这里
+        data = self._map
+        if data is None or offset + length > len(data):
+            # 打开之后追加的记录，重新映射
+            with self._lock:
+                data = self._map
+                if data is None or offset + length > len(data):
+                    data = self._remap()
+        return data[offset:offset + length]
+
+    def records(self):
+        ''' 按录制顺序返回所有记录，包含调用时已经写入的全部记录
+        --
+            @return (接口路径, 请求, 响应)的迭代器
+        '''
+        with self._lock:
+            data = self._remap()
+        offset = len(_MAGIC)
+        size = len(data)
+        while offset + _HEADER.size <= size:
+            keyLen, requestLen, responseLen = _HEADER.unpack_from(data, offset)
+            start = offset + _HEADER.size
+            key = data[start:start + keyLen]
+            start += keyLen
+            yield key.split(b' ')[0].decode('ascii'), data[start:start + requestLen], data[start + requestLen:start + requestLen + responseLen]
+            offset = start + requestLen + responseLen
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class RecordingTransport(object):
+
+    def __init__(self, transport, cassette):
+        ''' 录制经过transport的请求和响应，接口与Transport一致
+        --
+            @param transport: 实际发送请求的Transport，退款接口需要带证书的Transport
+            @param cassette: Cassette
+        '''
+        self.transport = transport
+        self.cassette = cassette
+        self.errors = transport.errors
+
+    def post(self, url, data, mch_id=None, timeout=None):
+        res = self.transport.post(url, data, mch_id, timeout)
+        self.cassette.append(url, data, res)
+        return res
+
+    def stream(self, *args, **kwargs):
+        ''' 下载账单不录制，直接转发
+        --
+        '''
+        return self.transport.stream(*args, **kwargs)
+
+    def close(self):
+        self.transport.close()
+
+
+class ReplayTransport(object):
+
+    # 回放没有网络错误
+    errors = ()
+
+    def __init__(self, cassette, key=None, maxsize=100000):
+        ''' 从录制文件回放响应，不发送请求，接口与Transport一致
+        --
+            按接口路径和请求参数摘要查找，请求中的nonce_str和sign不参与匹配
+            @param cassette: Cassette
+            @param key: 测试用的商户密钥，设置后响应用该密钥重新签名，客户端使用同一密钥即可通过验签
+            @param maxsize: 缓存重新签名后的响应的条数
+        '''
+        self.cassette = cassette
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._signers = {}
+        self._signed = LRUCache(maxsize) if key else None
+
+    def post(self, url, data, mch_id=None, timeout=None):
+        ''' 返回录制的响应
+        --
+            @raise CassetteMiss: 没有录制该请求
+        '''
+        values = encodeXML(data)
+        key = requestKey(url, values)
+        if self._signed is not None:
+            res = self._signed.get(key)
+            if res is not None:
+                self.hits += 1
+                return res
+
+        res = self.cassette.get(key)
+        if res is None:
+            self.misses += 1
+            raise CassetteMiss('录制文件中没有该请求：%s' % key.decode('ascii'))
+        self.hits += 1
+        if self._signed is None:
+            return res
+        res = self._resign(res, values.get('sign_type') or 'MD5')
+        self._signed.set(key, res)
+        return res
+
+    def _resign(self, res, sign_type):
+        ''' 用测试密钥重新签名，没有签名的响应（如通信失败）原样返回
+        --
+        '''
+        values = encodeXML(res)
+        if 'sign' not in values:
+            return res
+        signer = self._signers.get(sign_type)
+        if signer is None:
+            signer = self._signers[sign_type] = Signer(self.key, sign_type)
+        values['sign'] = signer.sign(values)
+        return dumpXML(values)
+
+    def stream(self, *args, **kwargs):
+        raise CassetteMiss('录制文件不支持下载账单')
+
+    def close(self):
+        pass
@@ -0,0 +1,114 @@
+from types import MappingProxyType
+from .models import MerchantConfig, ApiRequest
+from .signer import Signer
+from .wx_utils import getRandomStr, dumpXML
+from .bill import BillReader, BillTable, iterBody, iterLines
+
+__all__ = ['Downloadbill']
+
+# 接口地址
+_URL = 'https://api.mch.weixin.qq.com/pay/downloadbill'
+
+
+class Downloadbill(object):
+
+    def __init__(self, appid, mch_id, key, transport=None):
+        ''' 下载交易账单，商户可以通过该接口下载历史交易清单，用于对账。次日9点启动生成前一天的对账单
+        --
+            账单可能有几百MB，响应体按块读取、边下载边解压，不整体载入内存
+            @param appid: 微信分配的小程序ID
+            @param mch_id: 微信支付分配的商户号
+            @param key: key设置路径：微信商户平台(pay.weixin.qq.com)-->账户设置-->API安全-->密钥设置
+            @param transport: 连接池，默认使用全局共享的Transport
+        '''
+        # 商户配置，不随请求变化
+        self.config = MerchantConfig(appid, mch_id, key)
+        self.signer = Signer(key)
+        # 可选参数的默认值，设置时整体替换，请求时不修改，可在多个线程间共享
+        self.values = {}
+        self.transport = transport
+
+    def setSignType(self, sign_type='MD5'):
+        ''' 签名类型
+        --
+            @param sign_type: 签名类型['MD5', 'HMAC-SHA256']
+        '''
+        self.signer = Signer(self.config.key, sign_type)
+        self.config = self.config._replace(sign_type=sign_type)
+        # 非MD5签名时需要在请求中带上sign_type
+        self.values = dict(self.values, sign_type=sign_type)
+        return self
+
+    def rows(self, bill_date, bill_type='ALL', tar_type='GZIP'):
+        ''' 下载账单，逐行解析
+        --
+            @param bill_date: 对账单日期，格式20140603
+            @param bill_type: ALL（默认值），返回当日所有订单信息（不含充值退款订单）
+                              SUCCESS，返回当日成功支付的订单（不含充值退款订单）
+                              REFUND，返回当日退款订单（不含充值退款订单）
+                              RECHARGE_REFUND，返回当日充值退款订单
+            @param tar_type: GZIP为压缩传输，None为不压缩
+            @return BillReader，迭代得到每一行的namedtuple，读完后summary为汇总数据；下载失败时抛出异常
+        '''
+        return BillReader(iterLines(self.stream(bill_date, bill_type, tar_type)))
+
+    def table(self, bill_date, bill_type='ALL', tar_type='GZIP'):
+        ''' 下载账单，按列存储，参数见rows
+        --
+            @return BillTable
+        '''
+        return BillTable(self.rows(bill_date, bill_type, tar_type))
+
+    def download(self, bill_date, path, bill_type='ALL', tar_type='GZIP'):
+        ''' 下载账单，解压后写入文件，参数见rows
+        --
+            @param path: 保存的文件路径
+            @return path
+        '''
+        chunks = self.stream(bill_date, bill_type, tar_type)
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return path
+
+    def stream(self, bill_date, bill_type='ALL', tar_type='GZIP'):
+        ''' 下载账单，参数见rows
+        --
+            @return 解压后的csv字节块的迭代器
+        '''
+        request = self._prepare(bill_date, bill_type, tar_type)
+        if request is None:
+            raise Exception('参数不合法，请检查请求参数！')
+        from .transport import getDefaultTransport
+        transport = self.transport or getDefaultTransport()
+        return iterBody(transport.stream(request.url, request.body, self.config.mch_id))
+
+    def _prepare(self, bill_date, bill_type, tar_type):
+        ''' 生成请求参数并签名
+        --
+            @return ApiRequest，参数不合法时返回None
+        '''
+        values = dict(self.values, appid=self.config.appid, mch_id=self.config.mch_id)
+        values['bill_date'] = bill_date
+        values['bill_type'] = bill_type
+        if tar_type:
+            values['tar_type'] = tar_type
+
+        # 随机数
+        values['nonce_str'] = getRandomStr()
+        # 生成签名
+        sign = self.signer.sign(values)
+        values['sign'] = sign
+        if self._checkRequest(values):
+            return ApiRequest(_URL, MappingProxyType(values), dumpXML(values))
+        return None
+
+    def _checkRequest(self, values):
+        ''' 检查请求参数是否合法
+        --
+        :param values:请求参数
+        '''
+        if all(values.get(k) for k in ('appid', 'mch_id', 'nonce_str', 'sign', 'bill_date')):
+            return len(str(values['bill_date'])) == 8
+
+        return False
@@ -0,0 +1,100 @@
+from types import MappingProxyType
+from .models import MerchantConfig, ApiRequest
+from .signer import Signer
+from .wx_utils import getRandomStr, dumpXML
+from .bill import BillReader, BillTable, iterBody, iterLines
+
+__all__ = ['Downloadfundflow']
+
+# 接口地址
+_URL = 'https://api.mch.weixin.qq.com/pay/downloadfundflow'
+
+
+class Downloadfundflow(object):
+
+    def __init__(self, appid, mch_id, key, transport=None):
+        ''' 下载资金账单，商户可以通过该接口下载自2017年6月1日起的历史资金流水账单。需要证书，只支持HMAC-SHA256签名
+        --
+            @param appid: 微信分配的小程序ID
+            @param mch_id: 微信支付分配的商户号
+            @param key: key设置路径：微信商户平台(pay.weixin.qq.com)-->账户设置-->API安全-->密钥设置
+            @param transport: 带证书的连接池Transport(cert=..., key=...)，默认按cert、key参数共享证书连接池
+        '''
+        # 商户配置，不随请求变化
+        self.config = MerchantConfig(appid, mch_id, key, 'HMAC-SHA256')
+        self.signer = Signer(key, 'HMAC-SHA256')
+        # 可选参数的默认值，设置时整体替换，请求时不修改，可在多个线程间共享
+        self.values = {'sign_type': 'HMAC-SHA256'}
+        self.transport = transport
+
+    def rows(self, bill_date, account_type='Basic', tar_type='GZIP', cert='./cert.pem', key='./key.pem'):
+        ''' 下载资金账单，逐行解析
+        --
+            @param bill_date: 资金账单日期，格式20140603
+            @param account_type: 账单的资金来源账户：Basic 基本账户，Operation 运营账户，Fees 手续费账户
+            @param tar_type: GZIP为压缩传输，None为不压缩
+            @param cert, key: 微信支付证书
+            @return BillReader，迭代得到每一行的namedtuple，读完后summary为汇总数据；下载失败时抛出异常
+        '''
+        return BillReader(iterLines(self.stream(bill_date, account_type, tar_type, cert, key)))
+
+    def table(self, bill_date, account_type='Basic', tar_type='GZIP', cert='./cert.pem', key='./key.pem'):
+        ''' 下载资金账单，按列存储，参数见rows
+        --
+            @return BillTable
+        '''
+        return BillTable(self.rows(bill_date, account_type, tar_type, cert, key))
+
+    def download(self, bill_date, path, account_type='Basic', tar_type='GZIP', cert='./cert.pem', key='./key.pem'):
+        ''' 下载资金账单，解压后写入文件，参数见rows
+        --
+            @param path: 保存的文件路径
+            @return path
+        '''
+        chunks = self.stream(bill_date, account_type, tar_type, cert, key)
+        with open(path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        return path
+
+    def stream(self, bill_date, account_type='Basic', tar_type='GZIP', cert='./cert.pem', key='./key.pem'):
+        ''' 下载资金账单，参数见rows
+        --
+            @return 解压后的csv字节块的迭代器
+        '''
+        request = self._prepare(bill_date, account_type, tar_type)
+        if request is None:
+            raise Exception('参数不合法，请检查请求参数！')
+        from .transport import getCertTransport
+        transport = self.transport or getCertTransport(cert, key)
+        return iterBody(transport.stream(request.url, request.body, self.config.mch_id))
+
+    def _prepare(self, bill_date, account_type, tar_type):
+        ''' 生成请求参数并签名
+        --
+            @return ApiRequest，参数不合法时返回None
+        '''
+        values = dict(self.values, appid=self.config.appid, mch_id=self.config.mch_id)
+        values['bill_date'] = bill_date
+        values['account_type'] = account_type
+        if tar_type:
+            values['tar_type'] = tar_type
+
+        # 随机数
+        values['nonce_str'] = getRandomStr()
+        # 生成签名
+        sign = self.signer.sign(values)
+        values['sign'] = sign
+        if self._checkRequest(values):
+            return ApiRequest(_URL, MappingProxyType(values), dumpXML(values))
+        return None
+
+    def _checkRequest(self, values):
+        ''' 检查请求参数是否合法
+        --
+        :param values:请求参数
+        '''
+        if all(values.get(k) for k in ('appid', 'mch_id', 'nonce_str', 'sign', 'bill_date')):
+            return values.get('account_type') in ('Basic', 'Operation', 'Fees')
+
+        return False
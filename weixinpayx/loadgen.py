@@ -0,0 +1,316 @@
+''' 压测工具，按固定到达速率（开环）调用统一下单、查询订单、申请退款、查询退款，用于在大促前确定线程数和连接池大小
+
+    python -m weixinpayx.loadgen --qps 500 --duration 30
+    python -m weixinpayx.loadgen --qps 200 --mix unifiedorder=2,orderquery=7,refundquery=1 --mock-latency 0.02
+    python -m weixinpayx.loadgen --qps 300 --traffic traffic.jsonl --url http://10.0.0.8:8000 --key ...
+
+    不指定--url时在本进程中启动MockServer
+    traffic文件每行一个请求：{"api": "orderquery", "kwargs": {"out_trade_no": "..."}}
+'''
+import sys
+import json
+import logging
+import importlib
+import time
+import random
+import argparse
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count, cycle
+
+__all__ = ['LoadGenerator', 'LoadResult', 'syntheticTraffic', 'loadTraffic', 'main']
+
+# 接口名 -> (客户端类所在模块, 类名, 调用的方法)
+APIS = {
+    'unifiedorder': ('unifiedorder', 'Unifiedorder', 'pay'),
+    'orderquery': ('orderquery', 'Orderquery', 'query'),
+    'refund': ('refund', 'Refund', 'refund'),
+    'refundquery': ('refundquery', 'RefundQuery', 'query'),
+}
+
+DEFAULT_MIX = {'unifiedorder': 3, 'orderquery': 6, 'refund': 0.5, 'refundquery': 0.5}
+
+
+def syntheticTraffic(mix=None, seed=None):
+    ''' 按比例随机生成的请求，无限迭代
+    --
+        @param mix: 接口名 -> 权重，默认见DEFAULT_MIX
+        @return (接口名, 参数字典)的迭代器
+    '''
+    mix = mix or DEFAULT_MIX
+    apis = list(mix)
+    weights = [mix[api] for api in apis]
+    rng = random.Random(seed)
+    run = '%x' % int(time.time())
+    for i in count():
+        api = rng.choices(apis, weights)[0]
+        out_trade_no = 'lg%s%d' % (run, i)
+        if api == 'unifiedorder':
+            kwargs = {'total_fee': 1, 'out_trade_no': out_trade_no, 'body': 'loadgen', 'spbill_create_ip': '127.0.0.1',
+                      'notify_url': 'https://example.com/notify', 'openid': 'oUpF8uMuAJO_M2pxb1Q9zNjWeS6o'}
+        elif api == 'orderquery':
+            kwargs = {'out_trade_no': out_trade_no}
+        elif api == 'refund':
+            kwargs = {'out_refund_no': 'lr%s%d' % (run, i), 'total_fee': 1, 'refund_fee': 1, 'out_trade_no': out_trade_no}
+        else:
+            kwargs = {'out_refund_no': 'lr%s%d' % (run, i)}
+        yield api, kwargs
+
+
+def loadTraffic(path):
+    ''' 读取录制的请求文件
+    --
+        @param path: 每行一个json，{"api": 接口名, "kwargs": 参数字典}
+        @return [(接口名, 参数字典)]
+    '''
+    traffic = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if item['api'] not in APIS:
+                raise Exception('未知的接口：%s' % item['api'])
+            traffic.append((item['api'], item.get('kwargs') or {}))
+    return traffic
+
+
+def outcome(res):
+    ''' 把接口返回值归类为SUCCESS、return_code/err_code或失败信息
+    --
+    '''
+    if isinstance(res, tuple):
+        # Unifiedorder.pay返回(结果, 二次签名)，失败时为(False, 错误信息)
+        if res[0] is False:
+            return 'FAIL/' + res[1]
+        res = res[0]
+    if isinstance(res, str):
+        return 'ERROR/' + res
+    if res.get('return_code') != 'SUCCESS':
+        return '%s/%s' % (res.get('return_code'), res.get('return_msg'))
+    if res.get('result_code') != 'SUCCESS':
+        return '%s/%s' % (res.get('result_code'), res.get('err_code'))
+    return 'SUCCESS'
+
+
+def _percentile(values, p):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+class LoadResult(object):
+
+    def __init__(self):
+        ''' 一次压测的结果，多线程写入
+        --
+            latency为从计划到达时间到完成的耗时，包含在线程池中排队的时间
+            service为实际调用接口的耗时
+        '''
+        self.scheduled = 0
+        # 调度线程没能按时发出的请求数，较多时说明压测机本身成为瓶颈
+        self.late = 0
+        self.elapsed = 0.0
+        self.latencies = defaultdict(list)
+        self.service = defaultdict(list)
+        self.outcomes = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, api, label, latency, service):
+        with self._lock:
+            self.latencies[api].append(latency)
+            self.service[api].append(service)
+            self.outcomes[(api, label)] += 1
+
+    @property
+    def completed(self):
+        return sum(self.outcomes.values())
+
+    def summary(self):
+        ''' 汇总结果，时间单位为毫秒
+        --
+        '''
+        def stats(values):
+            values = sorted(values)
+            return {
+                'count': len(values),
+                'p50_ms': _percentile(values, 0.5) * 1e3,
+                'p90_ms': _percentile(values, 0.9) * 1e3,
+                'p99_ms': _percentile(values, 0.99) * 1e3,
+                'p999_ms': _percentile(values, 0.999) * 1e3,
+                'max_ms': (values[-1] if values else 0.0) * 1e3,
+            }
+
+        allLatencies = [v for values in self.latencies.values() for v in values]
+        allService = [v for values in self.service.values() for v in values]
+        errors = Counter()
+        for (api, label), n in self.outcomes.items():
+            if label != 'SUCCESS':
+                errors['%s %s' % (api, label)] += n
+        return {
+            'scheduled': self.scheduled,
+            'completed': self.completed,
+            'late': self.late,
+            'elapsed': self.elapsed,
+            'throughput': self.completed / self.elapsed if self.elapsed else 0.0,
+            'error_rate': sum(errors.values()) / self.completed if self.completed else 0.0,
+            'latency': stats(allLatencies),
+            'service': stats(allService),
+            'apis': {api: stats(values) for api, values in sorted(self.latencies.items())},
+            'errors': dict(errors.most_common()),
+        }
+
+    def format(self):
+        ''' 格式化为文本报告
+        --
+        '''
+        s = self.summary()
+        line = '%-14s p50 %8.2fms  p90 %8.2fms  p99 %8.2fms  p99.9 %8.2fms  max %8.2fms'
+        lines = [
+            '请求数   计划 %d，完成 %d，耗时 %.2fs，吞吐量 %.1f/s，调度延迟 %d' % (
+                s['scheduled'], s['completed'], s['elapsed'], s['throughput'], s['late']),
+            '延迟（含排队）',
+            line % (('all', ) + tuple(s['latency'][k] for k in ('p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms'))),
+        ]
+        for api, item in s['apis'].items():
+            lines.append(line % ((api, ) + tuple(item[k] for k in ('p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms'))))
+        lines.append('接口耗时（不含排队）')
+        lines.append(line % (('all', ) + tuple(s['service'][k] for k in ('p50_ms', 'p90_ms', 'p99_ms', 'p999_ms', 'max_ms'))))
+        lines.append('错误率   %.2f%%' % (s['error_rate'] * 100))
+        for label, n in s['errors'].items():
+            lines.append('  %-50s %d' % (label, n))
+        return '\n'.join(lines)
+
+
+class LoadGenerator(object):
+
+    def __init__(self, appid, mch_id, key, transport, workers=64):
+        ''' 开环压测：请求按计划时间发出，不等待前一个请求完成，接口变慢时排队时间计入延迟
+        --
+            @param appid, mch_id, key: 商户配置，压测MockServer时需与其密钥一致
+            @param transport: Transport，所有接口共享
+            @param workers: 执行请求的线程数，相当于被压测服务的工作线程数
+        '''
+        self.workers = workers
+        self.clients = {}
+        self.methods = {}
+        for api, (module, name, method) in APIS.items():
+            cls = getattr(importlib.import_module('.' + module, __package__), name)
+            client = cls(appid, mch_id, key, transport).setTyped()
+            self.clients[api] = client
+            self.methods[api] = getattr(client, method)
+
+    def _one(self, result, api, kwargs, scheduled):
+        begin = time.perf_counter()
+        try:
+            label = outcome(self.methods[api](**kwargs))
+        except Exception as e:
+            label = 'EXCEPTION/%s: %s' % (type(e).__name__, str(e)[:60])
+        end = time.perf_counter()
+        result.add(api, label, end - scheduled, end - begin)
+
+    def run(self, traffic, qps, duration=None, n=None, poisson=False, seed=None):
+        ''' 按qps发出请求，直到达到duration秒、n个请求或traffic用完
+        --
+            @param traffic: (接口名, 参数字典)的可迭代对象
+            @param qps: 目标到达速率
+            @param poisson: 到达间隔服从指数分布，否则为固定间隔
+            @return LoadResult
+        '''
+        result = LoadResult()
+        rng = random.Random(seed)
+        interval = 1.0 / qps
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        start = time.perf_counter()
+        due = start
+        try:
+            for i, (api, kwargs) in enumerate(traffic):
+                if n is not None and i >= n:
+                    break
+                if duration is not None and due - start >= duration:
+                    break
+                now = time.perf_counter()
+                if due > now:
+                    time.sleep(due - now)
+                elif now - due > 0.001:
+                    result.late += 1
+                executor.submit(self._one, result, api, kwargs, due)
+                result.scheduled += 1
+                due += rng.expovariate(qps) if poisson else interval
+        finally:
+            executor.shutdown(wait=True)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+def _parseMix(text):
+    mix = {}
+    for part in text.split(','):
+        api, _, weight = part.partition('=')
+        if api not in APIS:
+            raise argparse.ArgumentTypeError('未知的接口：%s' % api)
+        mix[api] = float(weight or 1)
+    return mix
+
+
+def parser():
+    p = argparse.ArgumentParser(prog='python -m weixinpayx.loadgen', description='weixinpayx开环压测工具')
+    p.add_argument('--qps', type=float, default=100, help='目标每秒请求数')
+    p.add_argument('--duration', type=float, default=10, help='压测秒数')
+    p.add_argument('-n', type=int, help='最多发出的请求数')
+    p.add_argument('--poisson', action='store_true', help='到达间隔服从指数分布，模拟真实流量的突发')
+    p.add_argument('--mix', type=_parseMix, help='接口比例，如unifiedorder=3,orderquery=6,refundquery=1')
+    p.add_argument('--traffic', help='录制的请求文件，循环使用')
+    p.add_argument('--workers', type=int, default=64, help='执行请求的线程数')
+    p.add_argument('--connections', type=int, default=64, help='连接池大小')
+    p.add_argument('--url', help='被压测的地址，默认在本进程启动MockServer')
+    p.add_argument('--appid', default='wx0000000000000000')
+    p.add_argument('--mch-id', default='10000100')
+    p.add_argument('--key', default='192006250b4c09247ec02edce69f6a2d', help='商户密钥，需与被压测服务一致')
+    p.add_argument('--mock-latency', type=float, default=0.005, help='MockServer固定延迟秒数')
+    p.add_argument('--mock-jitter', type=float, default=0.005, help='MockServer随机延迟秒数')
+    p.add_argument('--mock-error-rate', type=float, default=0.0, help='MockServer返回SYSTEMERROR的概率')
+    p.add_argument('--seed', type=int)
+    p.add_argument('--json', help='结果写入的json文件')
+    p.add_argument('--verbose', action='store_true', help='输出每个失败请求的日志')
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    from .transport import Transport
+    if not args.verbose:
+        # 失败的请求已计入报告，不再逐条打印日志
+        logging.disable(logging.ERROR)
+
+    mock = None
+    url = args.url
+    if url is None:
+        from .mock_server import MockServer
+        mock = MockServer(args.key, latency=args.mock_latency, jitter=args.mock_jitter,
+                          error_rate=args.mock_error_rate, seed=args.seed).start()
+        url = mock.url
+    try:
+        transport = Transport(pool_maxsize=args.connections, base_url=url)
+        generator = LoadGenerator(args.appid, args.mch_id, args.key, transport, args.workers)
+        if args.traffic:
+            traffic = cycle(loadTraffic(args.traffic))
+        else:
+            traffic = syntheticTraffic(args.mix, args.seed)
+        result = generator.run(traffic, args.qps, args.duration, args.n, args.poisson, args.seed)
+    finally:
+        if mock is not None:
+            mock.stop()
+
+    print(result.format())
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(dict(result.summary(), qps=args.qps, workers=args.workers, connections=args.connections),
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
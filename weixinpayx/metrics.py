@@ -0,0 +1,267 @@
+import os
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+
+__all__ = ['Metrics', 'Call', 'getMetrics', 'setMetrics', 'startCall']
+
+# 一次请求依次经过的阶段
+STAGES = ('nonce', 'sign', 'encode', 'http', 'decode', 'verify')
+
+# 默认的直方图桶上界，单位秒
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+_metrics = None
+_log = logging.getLogger()
+
+
+class _NullCall(object):
+    ''' 未开启统计时使用的空实现，所有方法什么都不做
+    --
+    '''
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def lap(self, stage):
+        pass
+
+    def done(self, res):
+        pass
+
+
+NULL_CALL = _NullCall()
+
+
+class Call(object):
+    ''' 一次接口调用的各阶段耗时
+    --
+        @param endpoint: 接口名，如orderquery
+        @param mch_id: 商户号
+        @param stages: [(阶段, 开始时间, 结束时间)]，时间为time.perf_counter_ns
+        @param return_code, result_code: 返回结果，参数不合法时为INVALID，抛出异常时return_code为EXCEPTION、result_code为异常类名
+        @param error: 抛出的异常
+    '''
+    __slots__ = ('metrics', 'endpoint', 'mch_id', 'stages', 'return_code', 'result_code', 'error',
+                 'start_ns', 'end_ns', 'start_time_ns', '_last')
+
+    def __init__(self, metrics, endpoint, mch_id=None):
+        self.metrics = metrics
+        self.endpoint = endpoint
+        self.mch_id = mch_id
+        self.stages = []
+        self.return_code = 'INVALID'
+        self.result_code = 'INVALID'
+        self.error = None
+        self.end_ns = None
+
+    def __enter__(self):
+        self.start_time_ns = time.time_ns()
+        self.start_ns = self._last = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc is not None:
+            self.error = exc
+            self.return_code = 'EXCEPTION'
+            self.result_code = exc_type.__name__
+        self.metrics._finish(self)
+
+    def lap(self, stage):
+        ''' 记录从上一阶段结束到现在的耗时
+        --
+            @param stage: 阶段名，见STAGES
+        '''
+        now = time.perf_counter_ns()
+        self.stages.append((stage, self._last, now))
+        self._last = now
+
+    def done(self, res):
+        ''' 记录返回结果
+        --
+            @param res: 解析后的返回参数
+        '''
+        res = res or {}
+        self.return_code = res.get('return_code') or 'NONE'
+        self.result_code = res.get('result_code') or 'NONE'
+
+    @property
+    def duration(self):
+        ''' 总耗时，单位秒
+        --
+        '''
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def toSpans(self):
+        ''' 转换为OpenTelemetry格式的span，一个表示整个调用的根span和每个阶段一个子span
+        --
+        '''
+        trace_id = os.urandom(16).hex()
+        root_id = os.urandom(8).hex()
+        offset = self.start_time_ns - self.start_ns
+        attributes = {
+            'weixinpay.endpoint': self.endpoint,
+            'weixinpay.mch_id': self.mch_id,
+            'weixinpay.return_code': self.return_code,
+            'weixinpay.result_code': self.result_code,
+        }
+        spans = [{
+            'name': 'weixinpay.' + self.endpoint,
+            'trace_id': trace_id,
+            'span_id': root_id,
+            'parent_span_id': None,
+            'start_time_unix_nano': self.start_time_ns,
+            'end_time_unix_nano': self.end_ns + offset,
+            'attributes': attributes,
+            'status': 'ERROR' if self.error is not None else 'OK',
+        }]
+        for stage, start, end in self.stages:
+            spans.append({
+                'name': stage,
+                'trace_id': trace_id,
+                'span_id': os.urandom(8).hex(),
+                'parent_span_id': root_id,
+                'start_time_unix_nano': start + offset,
+                'end_time_unix_nano': end + offset,
+                'attributes': {'weixinpay.endpoint': self.endpoint},
+                'status': 'OK',
+            })
+        return spans
+
+
+class _Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics(object):
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, spans=0, exporter=None):
+        ''' 接口调用耗时统计，按接口、阶段、return_code、result_code分别统计直方图
+        --
+            通过setMetrics(Metrics())开启，未开启时每次调用只多一次全局变量判断
+            @param buckets: 直方图桶上界，单位秒
+            @param spans: 保留最近多少次调用的span，0为不保留
+            @param exporter: 每次调用结束时调用exporter(spans)导出span，如发送到OpenTelemetry collector，抛出的异常只记录日志
+        '''
+        self.buckets = tuple(buckets)
+        self.exporter = exporter
+        self.spans = deque(maxlen=spans) if spans else None
+        self.hooks = []
+        # (endpoint, stage, return_code, result_code) -> _Histogram
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def addHook(self, hook):
+        ''' 添加回调，每次调用结束时调用hook(call)，抛出的异常只记录日志
+        --
+            @param hook: 接收Call的函数
+        '''
+        self.hooks.append(hook)
+        return self
+
+    def startCall(self, endpoint, mch_id=None):
+        return Call(self, endpoint, mch_id)
+
+    def _observe(self, key, seconds):
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            histogram = self._histograms.setdefault(key, _Histogram(len(self.buckets) + 1))
+        histogram.counts[bisect_left(self.buckets, seconds)] += 1
+        histogram.sum += seconds
+        histogram.count += 1
+
+    def _finish(self, call):
+        endpoint, return_code, result_code = call.endpoint, call.return_code, call.result_code
+        with self._lock:
+            for stage, start, end in call.stages:
+                self._observe((endpoint, stage, return_code, result_code), (end - start) / 1e9)
+            self._observe((endpoint, 'total', return_code, result_code), call.duration)
+        # 导出和回调在接口调用的with块中执行，出错只记录日志，不影响接口的返回结果
+        if self.spans is not None or self.exporter is not None:
+            try:
+                spans = call.toSpans()
+                if self.spans is not None:
+                    self.spans.append(spans)
+                if self.exporter is not None:
+                    self.exporter(spans)
+            except Exception:
+                _log.exception('导出span失败：%s' % call.endpoint)
+        for hook in self.hooks:
+            try:
+                hook(call)
+            except Exception:
+                _log.exception('统计回调失败：%s' % call.endpoint)
+
+    def snapshot(self):
+        ''' 当前的统计数据
+        --
+            @return {(endpoint, stage, return_code, result_code): {'count': 次数, 'sum': 总耗时, 'buckets': 各桶计数}}
+        '''
+        with self._lock:
+            return {k: {'count': h.count, 'sum': h.sum, 'buckets': list(h.counts)}
+                    for k, h in self._histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+        if self.spans is not None:
+            self.spans.clear()
+
+    def prometheus(self, name='weixinpay_request_duration_seconds'):
+        ''' 导出为Prometheus文本格式
+        --
+            @param name: 指标名
+        '''
+        lines = [
+            '# HELP %s WeChat Pay API call duration by stage.' % name,
+            '# TYPE %s histogram' % name,
+        ]
+        bounds = ['%g' % b for b in self.buckets] + ['+Inf']
+        for (endpoint, stage, return_code, result_code), h in sorted(self.snapshot().items()):
+            labels = 'endpoint="%s",stage="%s",return_code="%s",result_code="%s"' % (
+                endpoint, stage, return_code, result_code)
+            total = 0
+            for bound, count in zip(bounds, h['buckets']):
+                total += count
+                lines.append('%s_bucket{%s,le="%s"} %d' % (name, labels, bound, total))
+            lines.append('%s_sum{%s} %.9f' % (name, labels, h['sum']))
+            lines.append('%s_count{%s} %d' % (name, labels, h['count']))
+        return '\n'.join(lines) + '\n'
+
+
+def getMetrics():
+    ''' 获取当前的统计器，未开启时返回None
+    --
+    '''
+    return _metrics
+
+
+def setMetrics(metrics):
+    ''' 设置全局统计器，None为关闭统计
+    --
+        @param metrics: Metrics
+    '''
+    global _metrics
+    _metrics = metrics
+
+
+def startCall(endpoint, mch_id=None):
+    ''' 开始统计一次接口调用，未开启统计时返回空实现
+    --
+        用法：with startCall('orderquery', mch_id) as call: ... call.lap('sign') ...
+    '''
+    if _metrics is None:
+        return NULL_CALL
+    return _metrics.startCall(endpoint, mch_id)
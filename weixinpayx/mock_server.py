@@ -0,0 +1,268 @@
+import gzip
+import time
+import random
+import hashlib
+import logging
+import threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from . import xmlcodec
+from .signer import Signer
+from .nonce import NonceGenerator
+
+__all__ = ['MockServer']
+
+_log = logging.getLogger()
+
+
+def _id(prefix, *parts):
+    ''' 根据请求参数生成稳定的单号，同一笔订单重复请求返回相同结果
+    --
+    '''
+    return prefix + hashlib.md5('|'.join(parts).encode('utf-8')).hexdigest()[:24]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体一次写出，避免Nagle和延迟ACK带来的额外延迟
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        mock = self.server.mock
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length)
+        res = mock.handle(self.path, body)
+        if res is None:
+            # 模拟网络中断，不返回任何内容直接断开
+            self.close_connection = True
+            return
+        status, data = res
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockServer(object):
+
+    def __init__(self, key, host='127.0.0.1', port=0, latency=0, jitter=0, error_rate=0, drop_rate=0, trade_state='SUCCESS', refund_status='SUCCESS', bill_rows=100, seed=None):
+        ''' 本地模拟的微信支付服务，用于测试、压测和基准测试
+        --
+            校验请求签名，按请求的sign_type对返回结果签名，同一笔订单重复请求返回相同的prepay_id、refund_id
+            @param key: 商户平台API密钥
+            @param host, port: 监听地址，port为0时随机分配
+            @param latency: 每个请求固定增加的延迟秒数
+            @param jitter: 在latency之上随机增加[0, jitter]秒
+            @param error_rate: 返回SYSTEMERROR的概率
+            @param drop_rate: 不返回直接断开连接的概率
+            @param trade_state: 订单查询返回的交易状态
+            @param refund_status: 退款查询返回的退款状态
+            @param bill_rows: 下载的交易账单、资金账单的行数
+            @param seed: 随机数种子，用于复现
+        '''
+        self.key = key
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.trade_state = trade_state
+        self.refund_status = refund_status
+        self.bill_rows = bill_rows
+        # 每个接口收到的请求数
+        self.requests = Counter()
+        # (接口, 单号) -> 收到的nonce_str列表，用于检查重试是否原样重发
+        self.nonces = defaultdict(list)
+        self._random = random.Random(seed)
+        self._nonce = NonceGenerator()
+        self._signers = {}
+        self._orders = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._handlers = {
+            '/pay/unifiedorder': self._unifiedorder,
+            '/pay/orderquery': self._orderquery,
+            '/secapi/pay/refund': self._refund,
+            '/pay/refundquery': self._refundquery,
+            '/pay/downloadbill': self._downloadbill,
+            '/pay/downloadfundflow': self._downloadfundflow,
+        }
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % (self.host, self.port)
+
+    def start(self):
+        ''' 在后台线程启动服务
+        --
+        '''
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.mock = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def transport(self, **kwargs):
+        ''' 创建一个请求发往本服务的Transport
+        --
+        '''
+        from .transport import Transport
+        return Transport(base_url=self.url, **kwargs)
+
+    def _signer(self, sign_type):
+        signer = self._signers.get(sign_type)
+        if signer is None:
+            signer = self._signers[sign_type] = Signer(self.key, sign_type)
+        return signer
+
+    def handle(self, path, body):
+        ''' 处理一个请求
+        --
+            @return (状态码, 响应体)，返回None表示断开连接
+        '''
+        handler = self._handlers.get(path)
+        if handler is None:
+            return 404, b''
+        with self._lock:
+            self.requests[path] += 1
+            r = self._random.random()
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        if r < self.drop_rate:
+            return None
+
+        try:
+            req = xmlcodec.loads(body)
+        except Exception:
+            return 200, xmlcodec.dumps({'return_code': 'FAIL', 'return_msg': 'XML格式错误'})
+        signer = self._signer(req.get('sign_type', 'MD5'))
+        if not signer.verify(req):
+            return 200, xmlcodec.dumps({'return_code': 'FAIL', 'return_msg': '签名错误'})
+
+        orderNo = req.get('out_refund_no') or req.get('out_trade_no') or req.get('transaction_id') or ''
+        with self._lock:
+            self.nonces[(path, orderNo)].append(req.get('nonce_str'))
+
+        res = {
+            'return_code': 'SUCCESS',
+            'return_msg': 'OK',
+            'appid': req.get('appid', ''),
+            'mch_id': req.get('mch_id', ''),
+            'nonce_str': self._nonce.next(),
+        }
+        if r < self.drop_rate + self.error_rate:
+            res['result_code'] = 'FAIL'
+            res['err_code'] = 'SYSTEMERROR'
+            res['err_code_des'] = '系统超时'
+        else:
+            res['result_code'] = 'SUCCESS'
+            body = handler(req, res)
+            if body is not None:
+                # 账单接口成功时直接返回csv，tar_type=GZIP时压缩
+                if req.get('tar_type') == 'GZIP':
+                    body = gzip.compress(body, 1)
+                return 200, body
+        res['sign'] = signer.sign(res)
+        return 200, xmlcodec.dumps(res)
+
+    def _unifiedorder(self, req, res):
+        out_trade_no = req.get('out_trade_no', '')
+        with self._lock:
+            self._orders[out_trade_no] = req.get('total_fee', '1')
+        res['trade_type'] = req.get('trade_type', 'JSAPI')
+        res['prepay_id'] = _id('wx', req.get('mch_id', ''), out_trade_no)
+        if res['trade_type'] == 'NATIVE':
+            res['code_url'] = 'weixin://wxpay/bizpayurl?pr=' + res['prepay_id'][2:9]
+
+    def _orderquery(self, req, res):
+        out_trade_no = req.get('out_trade_no') or _id('', req.get('transaction_id', ''))
+        res['out_trade_no'] = out_trade_no
+        res['transaction_id'] = req.get('transaction_id') or _id('42', req.get('mch_id', ''), out_trade_no)
+        res['trade_state'] = self.trade_state
+        res['trade_type'] = 'JSAPI'
+        res['total_fee'] = self._orders.get(out_trade_no, '1')
+        res['fee_type'] = 'CNY'
+        if self.trade_state == 'SUCCESS':
+            res['bank_type'] = 'CMC'
+            res['cash_fee'] = res['total_fee']
+            res['time_end'] = time.strftime('%Y%m%d%H%M%S')
+
+    def _refund(self, req, res):
+        for k in ('transaction_id', 'out_trade_no', 'out_refund_no', 'total_fee', 'refund_fee'):
+            if k in req:
+                res[k] = req[k]
+        res['refund_id'] = _id('50', req.get('mch_id', ''), req.get('out_refund_no', ''))
+        res['cash_fee'] = req.get('total_fee', '')
+
+    def _refundquery(self, req, res):
+        out_refund_no = req.get('out_refund_no') or _id('', req.get('refund_id') or req.get('out_trade_no') or req.get('transaction_id', ''))
+        res['out_trade_no'] = req.get('out_trade_no') or _id('', out_refund_no)
+        res['transaction_id'] = req.get('transaction_id') or _id('42', req.get('mch_id', ''), res['out_trade_no'])
+        res['total_fee'] = '1'
+        res['cash_fee'] = '1'
+        res['refund_count'] = '1'
+        res['out_refund_no_0'] = out_refund_no
+        res['refund_id_0'] = req.get('refund_id') or _id('50', req.get('mch_id', ''), out_refund_no)
+        res['refund_channel_0'] = 'ORIGINAL'
+        res['refund_fee_0'] = '1'
+        res['refund_status_0'] = self.refund_status
+        res['refund_recv_accout_0'] = '支付用户的零钱'
+
+    def _downloadbill(self, req, res):
+        date = req.get('bill_date', '')
+        day = '%s-%s-%s' % (date[:4], date[4:6], date[6:8])
+        lines = ['交易时间,公众账号ID,商户号,特约商户号,设备号,微信订单号,商户订单号,用户标识,交易类型,交易状态,付款银行,'
+                 '货币种类,应结订单金额,代金券金额,微信退款单号,商户退款单号,退款金额,充值券退款金额,退款类型,退款状态,'
+                 '商品名称,商户数据包,手续费,费率,订单金额,申请退款金额,费率备注']
+        mch_id = req.get('mch_id', '')
+        total = 0
+        for i in range(self.bill_rows):
+            fee = i % 1000 + 1
+            total += fee
+            lines.append('`%s %02d:%02d:%02d,`%s,`%s,`0,`,`%s,`%s,`oUpF8uMuAJO_M2pxb1Q9zNjWeS6o,`JSAPI,`SUCCESS,`CMC,'
+                         '`CNY,`%d.%02d,`0.00,`0,`0,`0.00,`0.00,`,`,`商品,`附加数据,`0.00000,`0.60%%,`%d.%02d,`0.00,`' % (
+                             day, i // 3600 % 24, i // 60 % 60, i % 60, req.get('appid', ''), mch_id,
+                             _id('42', mch_id, str(i)), 'o%d' % i, fee // 100, fee % 100, fee // 100, fee % 100))
+        lines.append('总交易单数,应结订单总金额,退款总金额,充值券退款总金额,手续费总金额,订单总金额,申请退款总金额')
+        lines.append('`%d,`%d.%02d,`0.00,`0.00,`0.00000,`%d.%02d,`0.00' % (
+            self.bill_rows, total // 100, total % 100, total // 100, total % 100))
+        return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+    def _downloadfundflow(self, req, res):
+        date = req.get('bill_date', '')
+        day = '%s-%s-%s' % (date[:4], date[4:6], date[6:8])
+        lines = ['记账时间,微信支付业务单号,资金流水单号,业务名称,业务类型,收支类型,收支金额（元）,账户结余（元）,资金变更提交申请人,备注,业务凭证号']
+        mch_id = req.get('mch_id', '')
+        balance = income = 0
+        for i in range(self.bill_rows):
+            fee = i % 1000 + 1
+            balance += fee
+            income += fee
+            lines.append('`%s %02d:%02d:%02d,`%s,`%s,`交易,`交易,`收入,`%d.%02d,`%d.%02d,`system,`缺省,`%s' % (
+                day, i // 3600 % 24, i // 60 % 60, i % 60, _id('42', mch_id, str(i)), _id('', mch_id, date, str(i)),
+                fee // 100, fee % 100, balance // 100, balance % 100, _id('REQ', mch_id, str(i))))
+        lines.append('资金流水总笔数,收入笔数,收入金额,支出笔数,支出金额')
+        lines.append('`%d,`%d,`%d.%02d,`0,`0.00' % (self.bill_rows, self.bill_rows, income // 100, income % 100))
+        return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
@@ -0,0 +1,266 @@
+import re
+from sys import intern
+from collections import namedtuple
+
+__all__ = ['MerchantConfig', 'ApiRequest', 'UnifiedorderResult', 'OrderqueryResult', 'RefundResult',
+           'RefundqueryResult', 'RefundRecord']
+
+# 商户配置，创建后不可修改，可在多个线程间共享
+# appid: 微信分配的小程序ID
+# mch_id: 微信支付分配的商户号
+# key: 商户平台API密钥
+# sign_type: 签名类型MD5或HMAC-SHA256
+MerchantConfig = namedtuple('MerchantConfig', ['appid', 'mch_id', 'key', 'sign_type'])
+MerchantConfig.__new__.__defaults__ = ('MD5',)
+
+# 单次请求，每次调用生成一个，不可修改
+# url: 接口地址
+# values: 签名后的请求参数，只读
+# body: 请求的xml，utf-8编码的字节串，重试时原样发送
+ApiRequest = namedtuple('ApiRequest', ['url', 'values', 'body'])
+
+
+# 退款查询中带序号的字段，如refund_fee_0、coupon_refund_fee_0_1
+_INDEXED = re.compile(r'^(\D+?)_(\d+)(?:_(\d+))?$')
+
+# 代金券字段在RefundRecord.coupons元组中的位置
+_COUPON_FIELDS = {'coupon_refund_id': 0, 'coupon_type': 1, 'coupon_refund_fee': 2}
+
+
+def _int(v):
+    return int(v) if v else None
+
+
+class _Result(object):
+    ''' 接口返回结果的基类，字段用__slots__存储，金额、数量等字段解析为int
+    --
+        未声明的字段放在extra字典中，没有时为None；nonce_str和sign校验后不再保留
+    '''
+    __slots__ = ('return_code', 'return_msg', 'result_code', 'err_code', 'err_code_des', 'appid', 'mch_id', 'extra')
+
+    # 字符串字段和整数字段，子类扩展
+    _STR_FIELDS = ('return_code', 'return_msg', 'result_code', 'err_code', 'err_code_des', 'appid', 'mch_id')
+    _INT_FIELDS = ()
+    # 取值种类很少的字段，驻留后大量结果共享同一个字符串
+    _ENUM_FIELDS = ('return_code', 'return_msg', 'result_code', 'err_code', 'appid', 'mch_id')
+    _SKIP_FIELDS = frozenset(('nonce_str', 'sign'))
+
+    @classmethod
+    def fromDict(cls, res):
+        ''' 由encodeXML解析的字典创建
+        --
+        '''
+        obj = object.__new__(cls)
+        get = res.get
+        for name in cls._STR_FIELDS:
+            setattr(obj, name, get(name))
+        for name in cls._INT_FIELDS:
+            setattr(obj, name, _int(get(name)))
+        for name in cls._ENUM_FIELDS:
+            value = get(name)
+            if value is not None:
+                setattr(obj, name, intern(value))
+        obj.extra = obj._collect(res)
+        return obj
+
+    def _collect(self, res):
+        ''' 收集未声明的字段
+        --
+        '''
+        known = self._known()
+        extra = {k: v for k, v in res.items() if k not in known}
+        return extra or None
+
+    @classmethod
+    def _known(cls):
+        known = cls.__dict__.get('_knownFields')
+        if known is None:
+            known = cls._knownFields = frozenset(cls._STR_FIELDS + cls._INT_FIELDS) | cls._SKIP_FIELDS
+        return known
+
+    @property
+    def ok(self):
+        ''' 通信和业务结果都成功
+        --
+        '''
+        return self.return_code == 'SUCCESS' and self.result_code == 'SUCCESS'
+
+    def get(self, name, default=None):
+        ''' 按字段名取值，兼容原来按字典取值的写法
+        --
+        '''
+        value = getattr(self, name, None) if name in self._known() else None
+        if value is None and self.extra:
+            value = self.extra.get(name)
+        return default if value is None else value
+
+    def toDict(self):
+        ''' 转换为字典，整数字段保持为int，值为None的字段省略
+        --
+        '''
+        res = {}
+        for name in self._STR_FIELDS + self._INT_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                res[name] = value
+        if self.extra:
+            res.update(self.extra)
+        return res
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, ', '.join('%s=%r' % item for item in self.toDict().items()))
+
+
+class UnifiedorderResult(_Result):
+    ''' 统一下单返回结果
+    --
+    '''
+    __slots__ = ('device_info', 'trade_type', 'prepay_id', 'code_url', 'mweb_url')
+    _STR_FIELDS = _Result._STR_FIELDS + __slots__
+    _ENUM_FIELDS = _Result._ENUM_FIELDS + ('device_info', 'trade_type')
+
+
+class OrderqueryResult(_Result):
+    ''' 查询订单返回结果，金额单位为分
+    --
+    '''
+    __slots__ = ('device_info', 'openid', 'is_subscribe', 'trade_type', 'trade_state', 'trade_state_desc', 'bank_type',
+                 'fee_type', 'cash_fee_type', 'transaction_id', 'out_trade_no', 'attach', 'time_end',
+                 'total_fee', 'settlement_total_fee', 'cash_fee', 'coupon_fee', 'coupon_count')
+    _STR_FIELDS = _Result._STR_FIELDS + __slots__[:13]
+    _INT_FIELDS = __slots__[13:]
+    _ENUM_FIELDS = _Result._ENUM_FIELDS + ('device_info', 'is_subscribe', 'trade_type', 'trade_state', 'bank_type',
+                                           'fee_type', 'cash_fee_type')
+
+
+class RefundResult(_Result):
+    ''' 申请退款返回结果，金额单位为分
+    --
+    '''
+    __slots__ = ('transaction_id', 'out_trade_no', 'out_refund_no', 'refund_id', 'fee_type',
+                 'refund_fee', 'settlement_refund_fee', 'total_fee', 'settlement_total_fee', 'cash_fee',
+                 'cash_refund_fee', 'coupon_refund_fee', 'coupon_refund_count')
+    _STR_FIELDS = _Result._STR_FIELDS + __slots__[:5]
+    _INT_FIELDS = __slots__[5:]
+    _ENUM_FIELDS = _Result._ENUM_FIELDS + ('fee_type',)
+
+
+class RefundRecord(object):
+    ''' 退款查询结果中的一笔退款，对应refund_xxx_$n字段，金额单位为分
+    --
+        coupons: 该笔退款的代金券[(coupon_refund_id, coupon_type, coupon_refund_fee)]，没有时为空元组
+    '''
+    __slots__ = ('out_refund_no', 'refund_id', 'refund_channel', 'refund_status', 'refund_account',
+                 'refund_recv_accout', 'refund_success_time',
+                 'refund_fee', 'settlement_refund_fee', 'coupon_refund_fee', 'coupon_refund_count', 'coupons')
+    _STR_FIELDS = __slots__[:7]
+    _INT_FIELDS = __slots__[7:11]
+    _ENUM_FIELDS = ('refund_channel', 'refund_status', 'refund_account', 'refund_recv_accout')
+
+    @classmethod
+    def fromIndexed(cls, fields):
+        ''' 由一笔退款的字段创建
+        --
+            @param fields: 字段名 -> 值，字段名不含退款序号，代金券字段保留代金券序号
+        '''
+        obj = object.__new__(cls)
+        get = fields.get
+        for name in cls._STR_FIELDS:
+            setattr(obj, name, get(name))
+        for name in cls._INT_FIELDS:
+            setattr(obj, name, _int(get(name)))
+        for name in cls._ENUM_FIELDS:
+            value = get(name)
+            if value is not None:
+                setattr(obj, name, intern(value))
+        coupons = []
+        for m in range(obj.coupon_refund_count or 0):
+            suffix = '_%d' % m
+            coupons.append((get('coupon_refund_id' + suffix), get('coupon_type' + suffix),
+                            _int(get('coupon_refund_fee' + suffix))))
+        obj.coupons = tuple(coupons)
+        return obj
+
+    def __repr__(self):
+        return 'RefundRecord(%s)' % ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.__slots__)
+
+
+class RefundqueryResult(_Result):
+    ''' 查询退款返回结果，金额单位为分
+    --
+        带_$n序号的字段在第一次访问refunds时才整理为RefundRecord列表
+    '''
+    __slots__ = ('device_info', 'transaction_id', 'out_trade_no', 'fee_type',
+                 'total_fee', 'settlement_total_fee', 'cash_fee', 'refund_count', 'total_refund_count',
+                 '_indexed', '_refunds')
+    _STR_FIELDS = _Result._STR_FIELDS + __slots__[:4]
+    _INT_FIELDS = __slots__[4:9]
+    _ENUM_FIELDS = _Result._ENUM_FIELDS + ('device_info', 'fee_type')
+
+    def _collect(self, res):
+        # 字段名以数字结尾的是各笔退款的字段，原样保存，用到时再整理
+        known = self._known()
+        extra = {}
+        indexed = {}
+        for k, v in res.items():
+            if k in known:
+                continue
+            if k[-1].isdigit():
+                indexed[k] = v
+            else:
+                extra[k] = v
+        self._indexed = indexed
+        self._refunds = None
+        return extra or None
+
+    @property
+    def refunds(self):
+        ''' 各笔退款的RefundRecord列表，按序号排列
+        --
+        '''
+        if self._refunds is None:
+            groups = {}
+            for k, v in self._indexed.items():
+                m = _INDEXED.match(k)
+                if m is None:
+                    continue
+                name, n, sub = m.groups()
+                # coupon_refund_fee_0_1属于第0笔退款，组内字段名为coupon_refund_fee_1
+                groups.setdefault(int(n), {})[name if sub is None else name + '_' + sub] = v
+            self._refunds = [RefundRecord.fromIndexed(groups[n]) for n in sorted(groups)]
+            self._indexed = None
+        return self._refunds
+
+    def get(self, name, default=None):
+        ''' 按字段名取值，refund_status_0等带序号的字段从refunds中取
+        --
+        '''
+        m = _INDEXED.match(name) if name[-1:].isdigit() else None
+        if m is None:
+            return super(RefundqueryResult, self).get(name, default)
+        name, n, sub = m.groups()
+        refunds = self.refunds
+        n = int(n)
+        if n >= len(refunds):
+            return default
+        record = refunds[n]
+        if sub is None:
+            value = getattr(record, name, None) if name in RefundRecord.__slots__ else None
+        else:
+            i = _COUPON_FIELDS.get(name)
+            coupons = record.coupons
+            value = coupons[int(sub)][i] if i is not None and int(sub) < len(coupons) else None
+        return default if value is None else value
+
+    def toDict(self):
+        res = super(RefundqueryResult, self).toDict()
+        for n, record in enumerate(self.refunds):
+            for name in RefundRecord._STR_FIELDS + RefundRecord._INT_FIELDS:
+                value = getattr(record, name)
+                if value is not None:
+                    res['%s_%d' % (name, n)] = value
+            for m, coupon in enumerate(record.coupons):
+                for name, value in zip(_COUPON_FIELDS, coupon):
+                    if value is not None:
+                        res['%s_%d_%d' % (name, n, m)] = value
+        return res
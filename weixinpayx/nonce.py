@@ -0,0 +1,100 @@
+import os
+import threading
+from collections import deque
+
+__all__ = ['NonceGenerator', 'NoncePool', 'getNonceSource', 'setNonceSource']
+
+_chars = 'AaBbCcDdEeFfGgHhIiJjKkLlMmNnOoPpQqRrSsTtUuVvWwXxYyZz0123456789'
+
+# 0-247映射到62个字符（248 = 62 * 4），248-255直接删掉，保证每个字符概率相同
+_TABLE = bytes(ord(_chars[i % len(_chars)]) for i in range(248)) + bytes(8)
+_DELETE = bytes(range(248, 256))
+
+
+class NonceGenerator(object):
+
+    def __init__(self, bufsize=4096):
+        ''' 随机字符串生成器，线程安全
+        --
+            一次从os.urandom读取bufsize字节并转换成字符，之后每次生成只需要切片
+            @param bufsize: 每次读取的随机字节数
+        '''
+        self.bufsize = bufsize
+        self._buf = ''
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def _fill(self, length):
+        buf = ''
+        while len(buf) < length:
+            buf += os.urandom(self.bufsize).translate(_TABLE, _DELETE).decode('ascii')
+        self._buf = buf
+        self._pos = 0
+
+    def next(self, length=16):
+        ''' 生成一个随机字符串
+        --
+            @param length: 长度
+        '''
+        with self._lock:
+            if self._pos + length > len(self._buf):
+                self._fill(length)
+            pos = self._pos
+            self._pos = pos + length
+            return self._buf[pos:self._pos]
+
+
+class NoncePool(object):
+
+    def __init__(self, size=10000, length=16, generator=None):
+        ''' 预先生成的随机字符串池，用于批量任务
+        --
+            @param size: 每次补充生成的个数
+            @param length: 随机字符串长度
+            @param generator: 生成用的NonceGenerator，默认新建一个
+        '''
+        self.size = size
+        self.length = length
+        self.generator = generator or NonceGenerator(bufsize=max(4096, size * length * 2))
+        self._pool = deque()
+        self._lock = threading.Lock()
+
+    def fill(self):
+        ''' 补充size个随机字符串
+        --
+        '''
+        gen = self.generator.next
+        length = self.length
+        with self._lock:
+            self._pool.extend([gen(length) for i in range(self.size)])
+
+    def next(self, length=16):
+        ''' 从池中取一个随机字符串，长度和池不一致时直接生成
+        --
+        '''
+        if length != self.length:
+            return self.generator.next(length)
+        while True:
+            try:
+                return self._pool.popleft()
+            except IndexError:
+                self.fill()
+
+
+_source = NonceGenerator()
+
+
+def getNonceSource():
+    ''' 获取getRandomStr使用的随机字符串来源
+    --
+    '''
+    return _source
+
+
+def setNonceSource(source):
+    ''' 设置getRandomStr使用的随机字符串来源
+    --
+        @param source: NonceGenerator或NoncePool，需要有next(length)方法
+    '''
+    global _source
+    _source = source
@@ -0,0 +1,147 @@
+import logging
+from collections import namedtuple
+from .cache import LRUCache
+from .signer import Signer
+from .wx_utils import decodeXML, encodeXML
+
+__all__ = ['NotifyHandler', 'Notification']
+
+_log = logging.getLogger()
+
+# 处理成功时回复给微信的报文
+_SUCCESS_REPLY = decodeXML({'return_code': 'SUCCESS', 'return_msg': 'OK'})
+
+# 解析后的回调通知
+# type: pay支付结果通知，refund退款结果通知
+# values: 通知内容，退款通知中已合并req_info解密后的字段
+# key: 去重用的键，由appid、mch_id和支付的transaction_id或退款的out_refund_no组成，多个商户共用缓存时不会冲突
+# duplicate: 是否已经处理过
+Notification = namedtuple('Notification', ['type', 'values', 'key', 'duplicate'])
+
+
+class _NotifyBase(object):
+
+    def __init__(self, cache=None, maxsize=100000, ttl=86400):
+        ''' 通知的去重和回复，解析和校验由子类实现parse
+        --
+            微信会对同一个通知重复推送，处理成功过的通知记录在缓存中，再次收到时直接回复成功
+            @param cache: 去重缓存，需要支持get、set，默认使用进程内LRUCache
+            @param maxsize: 默认缓存的最大条目数
+            @param ttl: 默认缓存的过期秒数，微信最长在24小时内重复推送
+        '''
+        self.cache = cache if cache is not None else LRUCache(maxsize, ttl)
+
+    def parse(self, body):
+        ''' 解析通知，返回Notification，校验失败时返回None
+        --
+        '''
+        raise NotImplementedError
+
+    def markDone(self, notification):
+        ''' 记录通知已处理，之后重复推送的同一通知会被标记为duplicate
+        --
+        '''
+        self.cache.set(notification.key, True)
+
+    def handle(self, body, callback=None):
+        ''' 处理通知并返回回复给微信的xml
+        --
+            @param body: 微信POST过来的xml
+            @param callback: 首次收到的通知调用callback(notification)，返回False表示处理失败，微信会稍后重试
+        '''
+        return self.respond(self.parse(body), callback)
+
+    def respond(self, notification, callback=None):
+        ''' 根据解析结果处理通知并返回回复给微信的xml
+        --
+            @param notification: parse返回的Notification或None
+        '''
+        if notification is None:
+            return self.reply(False, '通知校验失败')
+        if notification.duplicate:
+            return _SUCCESS_REPLY
+        if callback is not None and callback(notification) is False:
+            return self.reply(False, '处理失败')
+        self.markDone(notification)
+        return _SUCCESS_REPLY
+
+    def reply(self, success=True, msg='OK'):
+        ''' 生成回复给微信的xml
+        --
+        '''
+        if success:
+            return _SUCCESS_REPLY
+        return decodeXML({'return_code': 'FAIL', 'return_msg': msg})
+
+
+class NotifyHandler(_NotifyBase):
+
+    def __init__(self, key, sign_type='MD5', cache=None, maxsize=100000, ttl=86400):
+        ''' 支付结果通知和退款结果通知处理，一步完成解析、验签、解密和去重
+        --
+            @param key: 商户平台API密钥
+            @param sign_type: 签名类型MD5或HMAC-SHA256
+            @param cache, maxsize, ttl: 去重缓存，见_NotifyBase
+        '''
+        super(NotifyHandler, self).__init__(cache, maxsize, ttl)
+        self.key = key
+        self.signer = Signer(key, sign_type)
+        self._refundDecode = None
+
+    @property
+    def refundDecode(self):
+        ''' 退款通知解密器，收到第一个退款通知时才创建，只处理支付通知时不需要加载AES
+        --
+        '''
+        if self._refundDecode is None:
+            from .refund_decode import RefundDecode
+            self._refundDecode = RefundDecode(self.key)
+        return self._refundDecode
+
+    def parse(self, body):
+        ''' 解析通知
+        --
+            @param body: 微信POST过来的xml
+            @return Notification，报文格式错误、通信失败、验签失败或解密失败时返回None
+        '''
+        try:
+            values = encodeXML(body)
+        except Exception as e:
+            _log.error('回调通知不是合法的xml：%s' % e)
+            return None
+        checked = self.check(values)
+        if checked is None:
+            return None
+        kind, key = checked
+        return Notification(kind, values, key, self.cache.get(key) is not None)
+
+    def check(self, values):
+        ''' 校验解析后的通知，退款通知解密req_info并合并到values中，不查询去重缓存
+        --
+            @param values: encodeXML解析后的通知内容
+            @return (type, key)，通信失败、验签失败或解密失败时返回None
+        '''
+        if values.get('return_code') != 'SUCCESS':
+            _log.error('回调通知通信失败：%s' % values)
+            return None
+
+        if 'req_info' in values:
+            # 退款通知不签名，内容加密在req_info中
+            try:
+                info = self.refundDecode.decode(values.pop('req_info'))
+            except Exception as e:
+                _log.error('退款通知解密失败：%s' % e)
+                return None
+            values.update(info)
+            return 'refund', self._dedupKey('refund', values, 'out_refund_no')
+
+        if not self.signer.verify(values):
+            _log.error('支付通知签名校验失败：%s' % values)
+            return None
+        return 'pay', self._dedupKey('pay', values, 'transaction_id')
+
+    def _dedupKey(self, kind, values, field):
+        ''' 去重用的键，带上appid和商户号，多个商户共用一个缓存时同号的通知不会被误判为重复
+        --
+        '''
+        return '%s:%s:%s:%s' % (kind, values.get('appid', ''), values.get('mch_id', ''), values.get(field, ''))
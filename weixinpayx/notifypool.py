@@ -0,0 +1,153 @@
+import os
+import logging
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from .notify import NotifyHandler, Notification, _NotifyBase
+from .wx_utils import encodeXML
+
+__all__ = ['NotifyPool']
+
+_log = logging.getLogger()
+
+# 工作进程中的商户号 -> NotifyHandler，进程启动时创建
+_workerHandlers = None
+
+
+def _createHandlers(keys, sign_type):
+    ''' 为每个商户创建NotifyHandler，并提前创建退款通知解密器
+    --
+    '''
+    handlers = {}
+    for mch_id, key in keys.items():
+        # 工作进程不做去重，缓存只需占位
+        handler = NotifyHandler(key, sign_type, maxsize=1)
+        handler.refundDecode
+        handlers[mch_id] = handler
+    return handlers
+
+
+def _check(handlers, values):
+    ''' 按通知中的商户号找到对应的密钥校验通知
+    --
+        @return (type, key)，失败时返回None
+    '''
+    handler = handlers.get(values.get('mch_id')) or handlers.get(None)
+    if handler is None:
+        _log.error('未配置密钥的商户号：%s' % values.get('mch_id'))
+        return None
+    return handler.check(values)
+
+
+def _initWorker(keys, sign_type):
+    global _workerHandlers
+    _workerHandlers = _createHandlers(keys, sign_type)
+
+
+def _checkBatch(bodies, handlers=None):
+    ''' 解析、验签、解密一批通知
+    --
+        @param bodies: 通知原始报文的列表，以pickle后的字节串传入工作进程
+        @param handlers: 商户号 -> NotifyHandler，默认使用工作进程中创建的
+        @return [(type, values, key)或None]，报文格式错误等单个通知的异常只使对应位置为None
+    '''
+    handlers = handlers or _workerHandlers
+    res = []
+    for body in bodies:
+        try:
+            values = encodeXML(body)
+            checked = _check(handlers, values)
+        except Exception as e:
+            _log.error('回调通知解析失败：%s' % e)
+            checked = None
+        res.append(None if checked is None else (checked[0], values, checked[1]))
+    return res
+
+
+class NotifyPool(_NotifyBase):
+
+    def __init__(self, key, sign_type='MD5', processes=None, chunksize=256, cache=None, maxsize=100000, ttl=86400):
+        ''' 多进程处理回调通知，微信集中补发大量通知时把解析、验签、解密分摊到多个CPU上
+        --
+            工作进程启动时按商户创建好签名器和解密器，之后每次只传入一批原始报文，返回校验后的字典
+            去重缓存和业务回调仍在当前进程中执行
+            @param key: 商户平台API密钥，多商户时为{mch_id: key}，按通知中的mch_id选择密钥
+            @param sign_type: 签名类型MD5或HMAC-SHA256
+            @param processes: 工作进程数，默认为CPU核数，0为在当前进程中处理
+            @param chunksize: 每次交给工作进程的最大通知数
+            @param cache, maxsize, ttl: 去重缓存，所有商户共用，见NotifyHandler
+        '''
+        super(NotifyPool, self).__init__(cache, maxsize, ttl)
+        self.keys = dict(key) if isinstance(key, dict) else {None: key}
+        self.sign_type = sign_type
+        self.processes = os.cpu_count() if processes is None else processes
+        self.chunksize = chunksize
+        self._handlers = None
+        self._executor = None
+
+    def start(self):
+        ''' 启动工作进程，不调用时在第一次处理通知时启动
+        --
+        '''
+        if self._executor is None and self.processes:
+            self._executor = ProcessPoolExecutor(self.processes, initializer=_initWorker, initargs=(self.keys, self.sign_type))
+            # 每个进程一个空任务，让工作进程提前启动并完成初始化
+            list(self._executor.map(_checkBatch, [()] * self.processes))
+        return self
+
+    def check(self, values):
+        ''' 在当前进程中校验解析后的通知，见NotifyHandler.check
+        --
+        '''
+        return _check(self._localHandlers(), values)
+
+    def _localHandlers(self):
+        if self._handlers is None:
+            self._handlers = _createHandlers(self.keys, self.sign_type)
+        return self._handlers
+
+    def parse(self, body):
+        ''' 解析一个通知，见NotifyHandler.parse
+        --
+        '''
+        return self.parseMany([body])[0]
+
+    def parseMany(self, bodies):
+        ''' 批量解析通知
+        --
+            @param bodies: 微信POST过来的xml的列表
+            @return Notification的列表，顺序与bodies一致，校验失败的位置为None
+        '''
+        bodies = list(bodies)
+        if not self.processes:
+            results = _checkBatch(bodies, self._localHandlers())
+        else:
+            self.start()
+            # 通知较少时平均分给各进程，较多时每批不超过chunksize
+            size = max(1, min(self.chunksize, -(-len(bodies) // self.processes)))
+            chunks = [bodies[i:i + size] for i in range(0, len(bodies), size)]
+            results = chain.from_iterable(self._executor.map(_checkBatch, chunks))
+
+        cache = self.cache
+        return [None if r is None else Notification(r[0], r[1], r[2], cache.get(r[2]) is not None) for r in results]
+
+    def handleMany(self, bodies, callback=None):
+        ''' 批量处理通知
+        --
+            @param callback: 见NotifyHandler.handle
+            @return 回复给微信的xml的列表，顺序与bodies一致
+        '''
+        return [self.respond(notification, callback) for notification in self.parseMany(bodies)]
+
+    def close(self):
+        ''' 关闭工作进程
+        --
+        '''
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
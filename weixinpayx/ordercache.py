@@ -0,0 +1,84 @@
+import logging
+from collections import Counter
+from .cache import LRUCache, SingleFlight
+from .models import OrderqueryResult
+
+__all__ = ['CachedOrderquery']
+
+_log = logging.getLogger()
+
+# 不会再变化的交易状态
+TERMINAL_STATES = ('SUCCESS', 'REFUND', 'CLOSED', 'REVOKED', 'PAYERROR')
+
+
+class CachedOrderquery(object):
+
+    def __init__(self, orderquery, cache=None, pending_ttl=3, final_ttl=86400, terminal_states=TERMINAL_STATES):
+        ''' 带缓存的订单查询，用于前端轮询支付状态
+        --
+            未支付、支付中的结果只缓存pending_ttl秒，终态缓存final_ttl秒；并发的相同查询只向微信发一次
+            @param orderquery: Orderquery实例
+            @param cache: 缓存，LRUCache或RedisCache，默认进程内LRUCache
+            @param pending_ttl: 非终态结果的缓存秒数
+            @param final_ttl: 终态结果的缓存秒数，None为永久
+            @param terminal_states: 视为终态的trade_state
+        '''
+        self.orderquery = orderquery
+        self.cache = cache if cache is not None else LRUCache(100000)
+        self.pending_ttl = pending_ttl
+        self.final_ttl = final_ttl
+        self.terminal_states = terminal_states
+        # hit命中缓存，miss查询微信，shared共享了并发查询的结果
+        self.stats = Counter()
+        self._flight = SingleFlight()
+
+    def _key(self, transaction_id, out_trade_no):
+        mch_id = self.orderquery.config.mch_id
+        if transaction_id:
+            return 'orderquery:%s:t:%s' % (mch_id, transaction_id)
+        return 'orderquery:%s:o:%s' % (mch_id, out_trade_no)
+
+    def query(self, transaction_id=None, out_trade_no=None):
+        ''' 查询订单，参数和返回值同Orderquery.query
+        --
+        '''
+        if not transaction_id and not out_trade_no:
+            raise Exception('transaction_id和out_trade_no必须有一个')
+
+        key = self._key(transaction_id, out_trade_no)
+        res = self.cache.get(key)
+        if res is not None:
+            self.stats['hit'] += 1
+            return self._result(res)
+
+        res, shared = self._flight.do(key, self._load, key, transaction_id, out_trade_no)
+        self.stats['shared' if shared else 'miss'] += 1
+        return self._result(res)
+
+    def _result(self, res):
+        ''' 由缓存的字典为每个调用方生成新的返回值，调用方修改不影响缓存和其他调用方
+        --
+        '''
+        if isinstance(res, str):
+            return res
+        if self.orderquery.typed:
+            return OrderqueryResult.fromDict(res)
+        return dict(res)
+
+    def _load(self, key, transaction_id, out_trade_no):
+        # 缓存和并发共享的都是解析后的字典，RedisCache可以直接序列化
+        res = self.orderquery._query(transaction_id, out_trade_no)
+        # 失败的结果不缓存
+        if not isinstance(res, str) and res.get('result_code') == 'SUCCESS':
+            if res.get('trade_state') in self.terminal_states:
+                ttl = self.final_ttl
+            else:
+                ttl = self.pending_ttl
+            self.cache.set(key, res, ttl)
+        return res
+
+    def invalidate(self, transaction_id=None, out_trade_no=None):
+        ''' 删除缓存，如收到支付通知后
+        --
+        '''
+        self.cache.delete(self._key(transaction_id, out_trade_no))
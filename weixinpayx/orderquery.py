@@ -1,7 +1,9 @@
-import json
+from types import MappingProxyType
 import logging
-import requests
-from .wx_utils import getRandomStr, createSign, decodeXML, encodeXML, post
+from .models import MerchantConfig, ApiRequest, OrderqueryResult
+from .signer import Signer
+from .metrics import startCall, NULL_CALL
+from .wx_utils import getRandomStr, dumpXML, encodeXML, post
 
 __all__ = ['Orderquery']
 
@@ -12,28 +14,47 @@ _log = logging.getLogger()
 
 class Orderquery(object):
 
-    def __init__(self, appid, mch_id, key):
+    def __init__(self, appid, mch_id, key, transport=None):
         ''' 该接口提供所有微信支付订单的查询，商户可以通过查询订单接口主动查询订单状态，完成下一步的业务逻辑。
         --
             @param appid: 微信分配的小程序ID
             @param mch_id: 微信支付分配的商户号
             @param key: key设置路径：微信商户平台(pay.weixin.qq.com)-->账户设置-->API安全-->密钥设置
+            @param transport: 连接池，默认使用全局共享的Transport
         '''
+        # 商户配置，不随请求变化
+        self.config = MerchantConfig(appid, mch_id, key)
+        self.signer = Signer(key)
+        # 可选参数的默认值，设置时整体替换，请求时不修改，可在多个线程间共享
         self.values = {}
-        self.values['appid'] = appid
-        self.values['mch_id'] = mch_id
-        self.key = key
-        self.sign_type = 'MD5'
+        self.transport = transport
+        self.retry = None
+        self.typed = False
 
     def setSignType(self, sign_type='MD5'):
         ''' 签名类型
         --
             @param sign_type: 签名类型['MD5', 'HMAC-SHA256']
         '''
-        if sign_type != 'MD5' or sign_type != 'HMAC-SHA256':
-            raise Exception('只能是HMAC-SHA256或MD5')
+        self.signer = Signer(self.config.key, sign_type)
+        self.config = self.config._replace(sign_type=sign_type)
+        # 非MD5签名时需要在请求中带上sign_type
+        self.values = dict(self.values, sign_type=sign_type)
+        return self
+
+    def setTyped(self, typed=True):
+        ''' 返回OrderqueryResult对象代替字典，金额等数值字段解析为int，字段存放在__slots__中，占用内存更少
+        --
+        '''
+        self.typed = typed
+        return self
 
-        self.sign_type = sign_type
+    def setRetry(self, retry=None):
+        ''' 设置失败重试策略，重试时原样发送同一个已签名的请求
+        --
+            @param retry: RetryPolicy，None为不重试
+        '''
+        self.retry = retry
         return self
 
     def query(self, transaction_id=None, out_trade_no=None):
@@ -43,50 +64,107 @@ class Orderquery(object):
                 @param transaction_id: 微信的订单号，建议优先使用
                 @param out_trade_no: 商户系统内部订单号，要求32个字符内，只能是数字、大小写字母_-|*@ ，且在同一个商户号下唯一
         '''
+        return self._result(self._query(transaction_id, out_trade_no))
+
+    def _query(self, transaction_id=None, out_trade_no=None):
+        ''' 发起查询请求，不做typed转换
+        --
+            @return 解析后的字典，失败时返回失败原因
+        '''
+        with startCall('orderquery', self.config.mch_id) as call:
+            request = self._prepare(transaction_id, out_trade_no, call=call)
+            if request is None:
+                return '参数不合法，请检查请求参数！'
+            text = self._post(request)
+            call.lap('http')
+            return self._decode(text, call)
+
+    def _result(self, res):
+        ''' query的返回值，setTyped时把字典转换为OrderqueryResult
+        --
+        '''
+        if self.typed and isinstance(res, dict):
+            return OrderqueryResult.fromDict(res)
+        return res
+
+    def _prepare(self, transaction_id=None, out_trade_no=None, call=NULL_CALL):
+        ''' 生成请求参数并签名
+        --
+            @return ApiRequest，参数不合法时返回None
+        '''
+        values = dict(self.values, appid=self.config.appid, mch_id=self.config.mch_id)
         if not transaction_id and not out_trade_no:
             raise Exception('transaction_id和out_trade_no必须有一个')
 
         if transaction_id:
-            self.values['transaction_id'] = transaction_id
+            values['transaction_id'] = transaction_id
         else:
-            self.values['out_trade_no'] = out_trade_no
+            values['out_trade_no'] = out_trade_no
 
         # 随机数
-        self.values['nonce_str'] = getRandomStr()
+        values['nonce_str'] = getRandomStr()
+        call.lap('nonce')
         # 生成签名
-        sign = createSign(self.values, self.key, self.sign_type)
-        self.values['sign'] = sign
-        if self._checkValues():
-            xmlStr = decodeXML(self.values)
-            res1 = post(_URL, xmlStr)
-            res2 = encodeXML(res1)
-            if self._checkValues(res2):
-                return res2
-            else:
-                _log.error('用户请求支付失败，返回结果：%s' % res2)
-                return '返回参数校验不通过或者请求失败!'
-        else:
-            return '参数不合法，请检查请求参数！'
+        sign = self.signer.sign(values)
+        values['sign'] = sign
+        call.lap('sign')
+        if self._checkRequest(values):
+            request = ApiRequest(_URL, MappingProxyType(values), dumpXML(values))
+            call.lap('encode')
+            return request
+        return None
+
+    def _post(self, request):
+        ''' 发送请求，设置了重试策略时失败重试
+        --
+        '''
+        if self.retry is None:
+            return post(request.url, request.body, self.transport, self.config.mch_id)
+        from .transport import getDefaultTransport
+        transport = self.transport or getDefaultTransport()
+        return self.retry.post(transport, request.url, request.body, self.config.mch_id)
 
-    def _checkValues(self, values=None):
-        ''' 检查参数是否合法
+    def _parse(self, text, call=NULL_CALL):
+        ''' 解析并校验返回结果
         --
-        :param values:如果为空检查请求参数，否则检查返回参数
         '''
-        if values:
-            if values['return_code'] == 'SUCCESS':
-                v = values.copy()
-                sign = v.pop('sign')
-                sign2 = createSign(v, self.key, self.sign_type)
-                if sign2 == sign:
-                    return True
-                else:
-                    return False
+        return self._result(self._decode(text, call))
+
+    def _decode(self, text, call=NULL_CALL):
+        ''' 解析并校验返回结果，不做typed转换
+        --
+            @return 解析后的字典，校验失败时返回失败原因
+        '''
+        res = encodeXML(text)
+        call.lap('decode')
+        ok = self._checkValues(res)
+        call.lap('verify')
+        call.done(res)
+        if ok:
+            return res
         else:
-            if all(k in self.values for k in ('appid', 'mch_id', 'nonce_str', 'sign')):
-                if 'transaction_id' in self.values:
-                    return True
-                elif 'out_trade_no' in self.values:
-                    return True
+            _log.error('用户请求支付失败，返回结果：%s' % res)
+            return '返回参数校验不通过或者请求失败!'
+
+    def _checkValues(self, values):
+        ''' 检查返回参数是否合法
+        --
+        :param values:返回参数
+        '''
+        if values and values.get('return_code') == 'SUCCESS':
+            return self.signer.verify(values)
+
+        return False
+
+    def _checkRequest(self, values):
+        ''' 检查请求参数是否合法
+        --
+        :param values:请求参数
+        '''
+        if all(k in values for k in ('appid', 'mch_id', 'nonce_str', 'sign')):
+            if 'transaction_id' in values:
+                return True
+            elif 'out_trade_no' in values:
+                return True
 
         return False
@@ -0,0 +1,238 @@
+import time
+import threading
+from urllib.parse import urlsplit
+
+__all__ = ['TokenBucket', 'CircuitBreaker', 'CircuitOpenError', 'RateLimiter']
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate, capacity=None):
+        ''' 令牌桶限流，线程安全
+        --
+            @param rate: 每秒产生的令牌数，即允许的QPS
+            @param capacity: 桶容量，即允许的突发请求数，默认等于rate
+        '''
+        self.rate = float(rate)
+        self.capacity = float(capacity or max(1, rate))
+        self.tokens = self.capacity
+        self.timestamp = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.timestamp) * self.rate)
+        self.timestamp = now
+
+    def reserve(self, n=1):
+        ''' 预定n个令牌，返回需要等待的秒数
+        --
+        '''
+        with self._lock:
+            self._refill()
+            self.tokens -= n
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self, n=1):
+        ''' 获取令牌，令牌不足时阻塞等待
+        --
+            @return 等待的秒数
+        '''
+        wait = self.reserve(n)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def tryAcquire(self, n=1):
+        ''' 尝试获取令牌，不等待
+        --
+            @return 是否获取成功
+        '''
+        with self._lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return True
+            return False
+
+
+class CircuitOpenError(Exception):
+    ''' 熔断打开时拒绝请求
+    --
+    '''
+    pass
+
+
+class CircuitBreaker(object):
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30):
+        ''' 熔断器，线程安全
+        --
+            连续失败failure_threshold次后打开，recovery_timeout秒后放行一个试探请求，成功则关闭，失败则重新打开
+            @param failure_threshold: 连续失败多少次打开熔断
+            @param recovery_timeout: 打开后多少秒进入半开状态
+        '''
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._openedAt = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        ''' 是否允许发起请求
+        --
+        '''
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._openedAt >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def recordSuccess(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._probing = False
+
+    def recordFailure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self._openedAt = time.monotonic()
+                self._probing = False
+
+
+class _Endpoint(object):
+    ''' 单个接口和商户号的限流、熔断状态
+    --
+        计数不加锁，多线程下为近似值
+    '''
+    __slots__ = ('bucket', 'breaker', 'requests', 'waits', 'waitTime')
+
+    def __init__(self, bucket, breaker):
+        self.bucket = bucket
+        self.breaker = breaker
+        self.requests = 0
+        self.waits = 0
+        self.waitTime = 0.0
+
+
+class RateLimiter(object):
+
+    # 这些错误码说明微信侧过载，计入熔断失败
+    FAILURE_CODES = ('SYSTEMERROR', 'FREQUENCY_LIMITED')
+    _FAILURE_BYTES = tuple(code.encode('ascii') for code in FAILURE_CODES)
+
+    def __init__(self, rates=None, default_rate=None, burst=None, failure_threshold=5, recovery_timeout=30):
+        ''' 按接口和商户号分别限流、熔断，挂在Transport上对四个接口类统一生效
+        --
+            @param rates: 各接口每个商户号的QPS，如{'/pay/orderquery': 100, '/pay/refundquery': 50}
+            @param default_rate: 没有在rates中配置的接口的QPS，None为不限流
+            @param burst: 令牌桶容量，默认等于QPS
+            @param failure_threshold: 连续多少次超时或SYSTEMERROR后熔断，None为不熔断
+            @param recovery_timeout: 熔断多少秒后试探恢复
+        '''
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self.burst = burst
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, url, mch_id):
+        k = (url, mch_id)
+        endpoint = self._endpoints.get(k)
+        if endpoint is None:
+            with self._lock:
+                endpoint = self._endpoints.get(k)
+                if endpoint is None:
+                    rate = self.rates.get(urlsplit(url).path, self.default_rate)
+                    bucket = TokenBucket(rate, self.burst) if rate else None
+                    breaker = CircuitBreaker(self.failure_threshold, self.recovery_timeout) if self.failure_threshold else None
+                    endpoint = _Endpoint(bucket, breaker)
+                    self._endpoints[k] = endpoint
+        return endpoint
+
+    def reserve(self, url, mch_id=None):
+        ''' 预定一次请求
+        --
+            @return 发请求前需要等待的秒数
+            @raise CircuitOpenError: 熔断打开
+        '''
+        endpoint = self._endpoint(url, mch_id)
+        if endpoint.breaker is not None and not endpoint.breaker.allow():
+            raise CircuitOpenError('%s(%s)熔断中，暂停请求' % (url, mch_id))
+        endpoint.requests += 1
+        if endpoint.bucket is None:
+            return 0.0
+        wait = endpoint.bucket.reserve()
+        if wait > 0:
+            endpoint.waits += 1
+            endpoint.waitTime += wait
+        return wait
+
+    def acquire(self, url, mch_id=None):
+        ''' 预定一次请求并阻塞等待到可以发送
+        --
+        '''
+        wait = self.reserve(url, mch_id)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record(self, url, mch_id=None, text=None, error=None):
+        ''' 记录请求结果
+        --
+            @param text: 返回的报文，字节串或字符串，包含SYSTEMERROR或FREQUENCY_LIMITED时记为失败
+            @param error: 请求异常，超时或连接失败
+        '''
+        breaker = self._endpoint(url, mch_id).breaker
+        if breaker is None:
+            return
+        codes = self._FAILURE_BYTES if isinstance(text, bytes) else self.FAILURE_CODES
+        if error is not None or (text and any(code in text for code in codes)):
+            breaker.recordFailure()
+        else:
+            breaker.recordSuccess()
+
+    def metrics(self):
+        ''' 各接口的限流和熔断状态
+        --
+            @return {(url, mch_id): {...}}
+        '''
+        res = {}
+        for (url, mch_id), endpoint in list(self._endpoints.items()):
+            item = {
+                'rate': endpoint.bucket.rate if endpoint.bucket else None,
+                'requests': endpoint.requests,
+                'waits': endpoint.waits,
+                'wait_seconds': endpoint.waitTime,
+            }
+            breaker = endpoint.breaker
+            if breaker is not None:
+                item['state'] = breaker.state
+                item['failures'] = breaker.failures
+                item['opened'] = breaker.opened
+                item['rejected'] = breaker.rejected
+            res[(url, mch_id)] = item
+        return res
@@ -1,7 +1,9 @@
-import json
+from types import MappingProxyType
 import logging
-import requests
-from .wx_utils import getRandomStr, createSign, decodeXML, encodeXML
+from .models import MerchantConfig, ApiRequest, RefundResult
+from .signer import Signer
+from .metrics import startCall, NULL_CALL
+from .wx_utils import getRandomStr, dumpXML, encodeXML
 
 __all__ = ['Refund']
 
@@ -12,7 +14,7 @@ _log = logging.getLogger()
 
 class Refund(object):
 
-    def __init__(self, appid, mch_id, key):
+    def __init__(self, appid, mch_id, key, transport=None):
         ''' 当交易发生之后一段时间内，由于买家或者卖家的原因需要退款时，卖家可以通过退款接口将支付款退还给买家，微信支付将在收到退款请求并且验证成功之后，按照退款规则将支付款按原路退到买家帐号上。
         --
             注意，此接口需要证书
@@ -20,18 +22,22 @@ class Refund(object):
             @param appid: 微信分配的小程序ID
             @param mch_id: 微信支付分配的商户号
             @param key: key设置路径：微信商户平台(pay.weixin.qq.com)-->账户设置-->API安全-->密钥设置
+            @param transport: 带证书的连接池Transport(cert=..., key=...)，默认按refund的cert、key参数共享证书连接池
         '''
+        # 商户配置，不随请求变化
+        self.config = MerchantConfig(appid, mch_id, key)
+        self.signer = Signer(key)
+        # 可选参数的默认值，设置时整体替换，请求时不修改，可在多个线程间共享
         self.values = {}
-        self.values['appid'] = appid
-        self.values['mch_id'] = mch_id
-        self.key = key
-        self.sign_type = 'MD5'
+        self.transport = transport
+        self.retry = None
+        self.typed = False
 
     def setRefundFeeType(self, refund_fee_type='CNY'):
         ''' 符合ISO 4217标准的三位字母代码，默认人民币：CNY
         --
         '''
-        self.values['refund_fee_type'] = refund_fee_type
+        self.values = dict(self.values, refund_fee_type=refund_fee_type)
         return self
 
     def setSignType(self, sign_type='MD5'):
@@ -39,17 +45,32 @@ class Refund(object):
         --
             @param sign_type: 签名类型['MD5', 'HMAC-SHA256']
         '''
-        if sign_type != 'MD5' or sign_type != 'HMAC-SHA256':
-            raise Exception('只能是HMAC-SHA256或MD5')
+        self.signer = Signer(self.config.key, sign_type)
+        self.config = self.config._replace(sign_type=sign_type)
+        # 非MD5签名时需要在请求中带上sign_type
+        self.values = dict(self.values, sign_type=sign_type)
+        return self
+
+    def setTyped(self, typed=True):
+        ''' 返回RefundResult对象代替字典，金额等数值字段解析为int，字段存放在__slots__中，占用内存更少
+        --
+        '''
+        self.typed = typed
+        return self
 
-        self.sign_type = sign_type
+    def setRetry(self, retry=None):
+        ''' 设置失败重试策略，重试时原样发送同一个已签名的请求
+        --
+            @param retry: RetryPolicy，None为不重试
+        '''
+        self.retry = retry
         return self
 
     def setRefundDesc(self, refund_desc=''):
         ''' 若商户传入，会在下发给用户的退款消息中体现退款原因
         --
         '''
-        self.values['refund_desc'] = refund_desc
+        self.values = dict(self.values, refund_desc=refund_desc)
         return self
 
     def setRefundAccount(self, refund_account=''):
@@ -58,7 +79,7 @@ class Refund(object):
                 REFUND_SOURCE_RECHARGE_FUNDS---可用余额退款
         --
         '''
-        self.values['refund_account'] = refund_account
+        self.values = dict(self.values, refund_account=refund_account)
         return self
 
     def refund(self, out_refund_no, total_fee, refund_fee, transaction_id=None, out_trade_no=None, refund_desc='', notify_url='', cert = './cert.pem', key = './key.pem'):
@@ -73,67 +94,91 @@ class Refund(object):
             @param notify_url: 退款结果通知url
             @param cert, key: 微信支付证书
         '''
+        with startCall('refund', self.config.mch_id) as call:
+            request = self._prepare(out_refund_no, total_fee, refund_fee, transaction_id, out_trade_no, refund_desc, notify_url, call=call)
+            if request is None:
+                return '参数不合法，请检查请求参数！'
+            text = self._post(request.url, request.body, cert, key)
+            call.lap('http')
+            return self._parse(text, call)
+
+    def _prepare(self, out_refund_no, total_fee, refund_fee, transaction_id, out_trade_no, refund_desc, notify_url, call=NULL_CALL):
+        ''' 生成请求参数并签名
+        --
+            @return ApiRequest，参数不合法时返回None
+        '''
+        values = dict(self.values, appid=self.config.appid, mch_id=self.config.mch_id)
         if not transaction_id and not out_trade_no:
             raise Exception('transaction_id和out_trade_no必须有一个')
 
         if transaction_id:
-            self.values['transaction_id'] = transaction_id
+            values['transaction_id'] = transaction_id
         else:
-            self.values['out_trade_no'] = out_trade_no
+            values['out_trade_no'] = out_trade_no
 
-        self.values['out_refund_no'] = out_refund_no
-        self.values['total_fee'] = total_fee
-        self.values['refund_fee'] = refund_fee
-        self.values['refund_desc'] = refund_desc
-        self.values['notify_url'] = notify_url
+        values['out_refund_no'] = out_refund_no
+        values['total_fee'] = total_fee
+        values['refund_fee'] = refund_fee
+        values['refund_desc'] = refund_desc
+        values['notify_url'] = notify_url
 
         # 随机数
-        self.values['nonce_str'] = getRandomStr()
+        values['nonce_str'] = getRandomStr()
+        call.lap('nonce')
         # 生成签名
-        sign = createSign(self.values, self.key, self.sign_type)
-        self.values['sign'] = sign
-        if self._checkValues():
-            xmlStr = decodeXML(self.values)
-            res1 = self._post(_URL, xmlStr, cert, key)
-            res2 = encodeXML(res1)
-            if self._checkValues(res2):
-                return res2
-            else:
-                _log.error('用户请求支付失败，返回结果：%s' % res2)
-                return '返回参数校验不通过或者请求失败!'
+        sign = self.signer.sign(values)
+        values['sign'] = sign
+        call.lap('sign')
+        if self._checkRequest(values):
+            request = ApiRequest(_URL, MappingProxyType(values), dumpXML(values))
+            call.lap('encode')
+            return request
+        return None
+
+    def _parse(self, text, call=NULL_CALL):
+        ''' 解析并校验返回结果
+        --
+        '''
+        res = encodeXML(text)
+        call.lap('decode')
+        ok = self._checkValues(res)
+        call.lap('verify')
+        call.done(res)
+        if ok:
+            return RefundResult.fromDict(res) if self.typed else res
         else:
-            return '参数不合法，请检查请求参数！'
-    
+            _log.error('用户请求支付失败，返回结果：%s' % res)
+            return '返回参数校验不通过或者请求失败!'
+
     def _post(self, url, data, cert, key):
         ''' 发送post请求
         --
         '''
-        import requests
-        r = requests.post(url, data.encode('utf-8'), cert = (cert, key))
-        text = r.text.encode(r.encoding).decode('utf-8')
-        
-        return text
-
-    def _checkValues(self, values=None):
-        ''' 检查参数是否合法
+        from .transport import getCertTransport
+        transport = self.transport or getCertTransport(cert, key)
+        if self.retry is None:
+            return transport.post(url, data, self.config.mch_id)
+        return self.retry.post(transport, url, data, self.config.mch_id)
+
+    def _checkValues(self, values):
+        ''' 检查返回参数是否合法
         --
-        :param values:如果为空检查请求参数，否则检查返回参数
+        :param values:返回参数
         '''
-        if values:
-            if values['return_code'] == 'SUCCESS':
-                v = values.copy()
-                sign = v['sign']
-                v.pop('sign')
-                sign2 = createSign(v, self.key, self.sign_type)
-                if sign2 == sign:
-                    return True
-                else:
-                    return False
-        else:
-            if all(k in self.values for k in ('appid', 'mch_id', 'nonce_str', 'out_refund_no', 'total_fee', 'refund_fee', 'refund_desc', 'notify_url', 'sign')):
-                if 'transaction_id' in self.values or 'out_trade_no' in self.values:
-                    return True
-                else:
-                    return False
+        if values and values.get('return_code') == 'SUCCESS':
+            return self.signer.verify(values)
+
+        return False
+
+    def _checkRequest(self, values):
+        ''' 检查请求参数是否合法
+        --
+        :param values:请求参数
+        '''
+        if all(k in values for k in ('appid', 'mch_id', 'nonce_str', 'out_refund_no', 'total_fee', 'refund_fee', 'refund_desc', 'notify_url', 'sign')):
+            if 'transaction_id' in values or 'out_trade_no' in values:
+                return True
+            else:
+                return False
 
         return False
@@ -1,21 +1,80 @@
 import base64
 import hashlib
+import logging
 from Crypto.Cipher import AES
-from .wx_utils import decodeXML
+from .wx_utils import encodeXML
 
 __all__ = ['RefundDecode']
 
+_log = logging.getLogger()
+
+_BLOCK = AES.block_size
+
+
 class RefundDecode(object):
     def __init__(self, key):
         ''' 退款回调解密
+        --
+            解密密钥为商户key的md5小写十六进制，创建时计算一次，解密器复用
+            @param key: 商户平台API密钥
         '''
         self.key = key
-        
+        self._aesKey = hashlib.md5(key.encode('utf-8')).hexdigest().encode('utf-8')
+        # ECB模式各分组独立，没有链式状态，同一个解密器可以反复使用
+        self._cipher = AES.new(self._aesKey, AES.MODE_ECB)
+
+    def _unpad(self, data):
+        ''' 去掉PKCS#7填充，data为memoryview时返回的切片不复制数据
+        --
+        '''
+        if not data:
+            raise ValueError('req_info解密结果为空')
+        pad = data[-1]
+        if pad < 1 or pad > _BLOCK or data[-pad:] != bytes((pad,)) * pad:
+            raise ValueError('req_info填充不正确')
+        return data[:-pad]
+
     def decode(self, req_info):
+        ''' 解密退款回调中的req_info
+        --
+            @param req_info: 退款通知中的req_info字段
+            @return 解密后的字典
+        '''
         mima_b = base64.b64decode(req_info)
-        key2 = hashlib.md5(self.key.encode('utf-8')).hexdigest()
+        text = self._unpad(memoryview(self._cipher.decrypt(mima_b)))
 
-        aes = AES.new(str.encode(key2), AES.MODE_ECB)
-        text = str(aes.decrypt(mima_b).rstrip(b'\0').decode("utf8"))
+        # 解密后的报文根节点是<root>
+        return encodeXML(text, 'root')
+
+    def decodeMany(self, req_infos):
+        ''' 批量解密，所有密文拼在一起只调用一次AES，再按各自长度切片解析
+        --
+            @param req_infos: req_info字段的列表
+            @return 解密后的字典列表，顺序与req_infos一致，无法解密或解析的位置为None，不影响其他项
+        '''
+        blobs = []
+        for req_info in req_infos:
+            try:
+                blob = base64.b64decode(req_info)
+                if len(blob) % _BLOCK:
+                    raise ValueError('req_info长度不是%d的整数倍' % _BLOCK)
+            except Exception as e:
+                _log.error('req_info解密失败：%s' % e)
+                blob = None
+            blobs.append(blob)
 
-        return decodeXML(text)
\ No newline at end of file
+        plain = memoryview(self._cipher.decrypt(b''.join(blob for blob in blobs if blob)))
+        res = []
+        offset = 0
+        for blob in blobs:
+            if blob is None:
+                res.append(None)
+                continue
+            end = offset + len(blob)
+            try:
+                res.append(encodeXML(self._unpad(plain[offset:end]), 'root'))
+            except Exception as e:
+                _log.error('req_info解密失败：%s' % e)
+                res.append(None)
+            offset = end
+        return res
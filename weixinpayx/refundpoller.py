@@ -0,0 +1,217 @@
+import time
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+__all__ = ['RefundPoller']
+
+_log = logging.getLogger()
+
+# 不会再变化的退款状态，SUCCESS退款成功，REFUNDCLOSE退款关闭，CHANGE退款异常需人工处理
+FINAL_STATES = ('SUCCESS', 'REFUNDCLOSE', 'CHANGE')
+
+# 退款入账渠道 -> (最短查询间隔, 最长查询间隔)，单位秒
+# 退到零钱20分钟内到账，退到银行卡3个工作日内到账，未知渠道按较快的频率查询直到拿到渠道
+DEFAULT_INTERVALS = {
+    'BALANCE': (60, 600),
+    'BANK': (1800, 6 * 3600),
+    None: (60, 3600),
+}
+
+
+def refundChannel(res):
+    ''' 根据退款查询结果判断退款入账渠道
+    --
+        @return BALANCE（零钱）、BANK（银行卡）或None
+    '''
+    account = res.get('refund_recv_accout_0') or ''
+    if res.get('refund_channel_0') == 'BALANCE' or '零钱' in account:
+        return 'BALANCE'
+    if account:
+        return 'BANK'
+    return None
+
+
+class _Pending(object):
+    ''' 一笔待查询的退款，字段尽量少，几十万笔时内存占用可控
+    --
+    '''
+    __slots__ = ('out_refund_no', 'due', 'added', 'checks', 'channel', 'status')
+
+    def __init__(self, out_refund_no, due, added, channel, status):
+        self.out_refund_no = out_refund_no
+        self.due = due
+        self.added = added
+        self.checks = 0
+        self.channel = channel
+        self.status = status
+
+    def __lt__(self, other):
+        return self.due < other.due
+
+
+class RefundPoller(object):
+
+    def __init__(self, client, callback=None, concurrency=10, batch_size=500, intervals=None, factor=0.25, max_age=None, clock=time.time):
+        ''' 退款状态轮询，只在每笔退款到期时查询，查询间隔按入账渠道和退款时长逐渐拉长
+        --
+            待查询的退款按下次查询时间放在堆中，每次取出到期的一批并发查询
+            查询间隔为退款已经过的时长乘以factor，限制在渠道对应的[最短间隔, 最长间隔]内
+            @param client: RefundQuery，多个线程共享
+            @param callback: 退款状态变化时调用callback(out_refund_no, 原状态, 新状态, 查询结果)
+                             退款不存在时新状态为REFUNDNOTEXIST，超过max_age时新状态为TIMEOUT，查询结果为None
+            @param concurrency: 同时进行的查询数
+            @param batch_size: 每批最多查询的退款数
+            @param intervals: 渠道 -> (最短间隔, 最长间隔)，默认见DEFAULT_INTERVALS
+            @param factor: 查询间隔相对退款时长的比例
+            @param max_age: 退款超过多少秒仍未完成时放弃查询，None为一直查询
+            @param clock: 返回当前时间戳的函数，测试时可替换
+        '''
+        self.client = client
+        self.callback = callback
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.intervals = dict(DEFAULT_INTERVALS, **(intervals or {}))
+        self.factor = factor
+        self.max_age = max_age
+        self.clock = clock
+        self._heap = []
+        # out_refund_no -> _Pending，删除时只从这里删，堆中的记录取出时再丢弃
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def __contains__(self, out_refund_no):
+        return out_refund_no in self._pending
+
+    def add(self, out_refund_no, added=None, channel=None, status=None):
+        ''' 添加一笔待查询的退款，已存在时忽略
+        --
+            @param out_refund_no: 商户退款单号
+            @param added: 提交退款的时间戳，默认当前时间
+            @param channel: 已知的入账渠道BALANCE或BANK
+            @param status: 已知的退款状态
+        '''
+        now = self.clock()
+        added = now if added is None else added
+        with self._lock:
+            if out_refund_no in self._pending:
+                return
+            rec = _Pending(out_refund_no, 0, added, channel, status)
+            rec.due = added + self._interval(rec, now)
+            self._pending[out_refund_no] = rec
+            heapq.heappush(self._heap, rec)
+
+    def remove(self, out_refund_no):
+        ''' 不再查询某笔退款，如已经收到退款结果通知
+        --
+        '''
+        with self._lock:
+            self._pending.pop(out_refund_no, None)
+
+    def nextDue(self):
+        ''' 下一笔到期的时间戳，没有待查询的退款时返回None
+        --
+        '''
+        with self._lock:
+            heap = self._heap
+            while heap and self._pending.get(heap[0].out_refund_no) is not heap[0]:
+                heapq.heappop(heap)
+            return heap[0].due if heap else None
+
+    def _interval(self, rec, now):
+        low, high = self.intervals.get(rec.channel) or self.intervals[None]
+        return max(low, min(high, (now - rec.added) * self.factor))
+
+    def poll(self):
+        ''' 查询一批到期的退款
+        --
+            @return 本次查询的退款数
+        '''
+        now = self.clock()
+        due = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0].due <= now and len(due) < self.batch_size:
+                rec = heapq.heappop(heap)
+                if self._pending.get(rec.out_refund_no) is rec:
+                    due.append(rec)
+        if not due:
+            return 0
+
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        results = self._executor.map(self._query, due)
+        for rec, res in zip(due, results):
+            self._update(rec, res)
+        return len(due)
+
+    def _query(self, rec):
+        try:
+            res = self.client.query(out_refund_no=rec.out_refund_no)
+        except Exception as e:
+            _log.error('退款%s查询失败：%s' % (rec.out_refund_no, e))
+            return None
+        return None if isinstance(res, str) else res
+
+    def _update(self, rec, res):
+        ''' 根据查询结果更新状态，未完成的按新的间隔放回堆中
+        --
+        '''
+        now = self.clock()
+        rec.checks += 1
+        status = None
+        if res is not None:
+            if res.get('result_code') == 'SUCCESS':
+                status = res.get('refund_status_0')
+                rec.channel = refundChannel(res) or rec.channel
+            elif res.get('err_code') == 'REFUNDNOTEXIST':
+                status = 'REFUNDNOTEXIST'
+                res = None
+
+        if status and status != rec.status:
+            old, rec.status = rec.status, status
+            self._emit(rec, old, status, res)
+        if status in FINAL_STATES or status == 'REFUNDNOTEXIST':
+            self.remove(rec.out_refund_no)
+            return
+        if self.max_age is not None and now - rec.added >= self.max_age:
+            self.remove(rec.out_refund_no)
+            self._emit(rec, rec.status, 'TIMEOUT', None)
+            return
+
+        rec.due = now + self._interval(rec, now)
+        with self._lock:
+            if self._pending.get(rec.out_refund_no) is rec:
+                heapq.heappush(self._heap, rec)
+
+    def _emit(self, rec, old, new, res):
+        if self.callback is None:
+            return
+        try:
+            self.callback(rec.out_refund_no, old, new, res)
+        except Exception:
+            _log.exception('退款%s状态回调失败' % rec.out_refund_no)
+
+    def run(self, stop=None, idle=1):
+        ''' 循环查询直到stop被设置
+        --
+            @param stop: threading.Event
+            @param idle: 没有到期的退款时最多等待的秒数，期间新添加的退款在下次检查时生效
+        '''
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            if self.poll():
+                continue
+            due = self.nextDue()
+            wait = idle if due is None else min(idle, due - self.clock())
+            stop.wait(max(0, wait))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
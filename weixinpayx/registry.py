@@ -0,0 +1,154 @@
+import threading
+from .cache import LRUCache
+from .models import MerchantConfig
+from .signer import Signer
+from .transport import Transport, getDefaultTransport
+from .unifiedorder import Unifiedorder
+from .orderquery import Orderquery
+from .refund import Refund
+from .refundquery import RefundQuery
+
+__all__ = ['MerchantRegistry', 'Merchant']
+
+
+class Merchant(object):
+    ''' 一个商户的签名器、连接池和接口客户端，均在第一次使用时创建并复用
+    --
+    '''
+    __slots__ = ('config', 'cert', 'cert_key', 'signer', 'transport', 'cert_transport_kwargs',
+                 '_certTransport', '_clients', '_lock')
+
+    def __init__(self, config, cert=None, cert_key=None, transport=None, cert_transport_kwargs=None):
+        self.config = config
+        self.cert = cert
+        self.cert_key = cert_key
+        self.signer = Signer(config.key, config.sign_type)
+        self.transport = transport
+        self.cert_transport_kwargs = cert_transport_kwargs or {}
+        self._certTransport = None
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    @property
+    def certTransport(self):
+        ''' 加载了本商户证书的连接池
+        --
+        '''
+        if self._certTransport is None:
+            if not self.cert:
+                raise Exception('商户%s没有配置证书' % self.config.mch_id)
+            with self._lock:
+                if self._certTransport is None:
+                    self._certTransport = Transport(cert=self.cert, key=self.cert_key, **self.cert_transport_kwargs)
+        return self._certTransport
+
+    def _client(self, cls, transport):
+        client = self._clients.get(cls)
+        if client is None:
+            config = self.config
+            client = cls(config.appid, config.mch_id, config.key, transport)
+            if config.sign_type != 'MD5':
+                client.setSignType(config.sign_type)
+            # 同一商户的客户端共享签名器
+            client.signer = self.signer
+            client = self._clients.setdefault(cls, client)
+        return client
+
+    def unifiedorder(self):
+        return self._client(Unifiedorder, self.transport)
+
+    def orderquery(self):
+        return self._client(Orderquery, self.transport)
+
+    def refundquery(self):
+        return self._client(RefundQuery, self.transport)
+
+    def refund(self):
+        return self._client(Refund, self.certTransport)
+
+    def close(self):
+        ''' 关闭本商户的证书连接池
+        --
+        '''
+        if self._certTransport is not None:
+            self._certTransport.close()
+            self._certTransport = None
+
+
+class MerchantRegistry(object):
+
+    def __init__(self, configs=None, loader=None, maxsize=1000, transport=None, cert_transport_kwargs=None):
+        ''' 多商户客户端注册表，按mch_id O(1)取出可直接使用的客户端
+        --
+            不需要证书的接口所有商户共享一个连接池；需要证书的接口每个商户一个连接池，证书只加载一次
+            商户数很多时只在内存中保留最近使用的maxsize个商户，淘汰时关闭其证书连接池
+            @param configs: 商户配置列表，每项为包含appid、mch_id、key，可选sign_type、cert、cert_key的字典
+            @param loader: 按需加载配置的函数loader(mch_id)，返回同样格式的字典，不存在时返回None
+                           加载的配置只随商户保存在最近使用的maxsize个商户中，淘汰后再次使用时重新加载
+            @param maxsize: 内存中最多保留的商户数
+            @param transport: 共享的连接池，默认使用全局共享的Transport
+            @param cert_transport_kwargs: 创建证书连接池时传给Transport的参数，如pool_maxsize
+        '''
+        self.loader = loader
+        self.transport = transport or getDefaultTransport()
+        self.cert_transport_kwargs = cert_transport_kwargs
+        # add注册的配置，常驻内存；loader加载的不放在这里
+        self._configs = {}
+        self._merchants = LRUCache(maxsize, on_evict=lambda mch_id, merchant: merchant.close())
+        self._lock = threading.Lock()
+        for config in configs or ():
+            self.add(**config)
+
+    def add(self, appid, mch_id, key, sign_type='MD5', cert=None, cert_key=None):
+        ''' 注册一个商户，已存在时覆盖
+        --
+        '''
+        self._configs[mch_id] = self._item(appid, mch_id, key, sign_type, cert, cert_key)
+        old = self._merchants.get(mch_id)
+        if old is not None:
+            self._merchants.delete(mch_id)
+            old.close()
+
+    def get(self, mch_id):
+        ''' 获取商户
+        --
+            @return Merchant，商户不存在时抛出KeyError
+        '''
+        merchant = self._merchants.get(mch_id)
+        if merchant is not None:
+            return merchant
+        with self._lock:
+            merchant = self._merchants.get(mch_id)
+            if merchant is None:
+                item = self._configs.get(mch_id)
+                if item is None and self.loader is not None:
+                    config = self.loader(mch_id)
+                    if config is not None:
+                        item = self._item(**config)
+                if item is None:
+                    raise KeyError(mch_id)
+                config, cert, cert_key = item
+                merchant = Merchant(config, cert, cert_key, self.transport, self.cert_transport_kwargs)
+                self._merchants.set(mch_id, merchant)
+        return merchant
+
+    def _item(self, appid, mch_id, key, sign_type='MD5', cert=None, cert_key=None):
+        return MerchantConfig(appid, mch_id, key, sign_type), cert, cert_key
+
+    def __contains__(self, mch_id):
+        ''' 是否已注册或已加载在内存中，不调用loader
+        --
+        '''
+        return mch_id in self._configs or mch_id in self._merchants
+
+    def unifiedorder(self, mch_id):
+        return self.get(mch_id).unifiedorder()
+
+    def orderquery(self, mch_id):
+        return self.get(mch_id).orderquery()
+
+    def refund(self, mch_id):
+        return self.get(mch_id).refund()
+
+    def refundquery(self, mch_id):
+        return self.get(mch_id).refundquery()
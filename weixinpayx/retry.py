@@ -0,0 +1,144 @@
+import re
+import time
+import random
+import asyncio
+import logging
+from .ratelimit import CircuitOpenError
+
+__all__ = ['RetryPolicy', 'isTransient']
+
+_log = logging.getLogger()
+
+# 微信文档中说明可以用相同参数重试的错误码
+TRANSIENT_CODES = ('SYSTEMERROR', 'FREQUENCY_LIMITED', 'BIZERR_NEED_RETRY')
+
+_TRANSIENT_RE = re.compile(
+    r'<err_code>\s*(?:<!\[CDATA\[)?(?:%s)(?:\]\]>)?\s*</err_code>' % '|'.join(TRANSIENT_CODES))
+_TRANSIENT_RE_BYTES = re.compile(_TRANSIENT_RE.pattern.encode('ascii'))
+
+
+def isTransient(text):
+    ''' 返回报文的err_code是否是可以重试的错误，不解析整个报文
+    --
+        @param text: 响应体，字节串或字符串
+    '''
+    if not text:
+        return False
+    pattern = _TRANSIENT_RE_BYTES if isinstance(text, bytes) else _TRANSIENT_RE
+    return pattern.search(text) is not None
+
+
+class RetryPolicy(object):
+
+    def __init__(self, retries=3, backoff=0.2, max_backoff=5, jitter=True, timeout=None, deadline=None):
+        ''' 重试策略，指数退避加随机抖动
+        --
+            每次重试发送的是同一个已签名的请求体，nonce_str和sign不变，微信按同一笔订单处理，不会重复下单或退款
+            @param retries: 最多重试次数，不含第一次请求
+            @param backoff: 第一次重试前等待的秒数，之后每次翻倍
+            @param max_backoff: 单次等待的最大秒数
+            @param jitter: 是否在[0, 等待时间]之间随机取值，避免大量请求同时重试
+            @param timeout: 每次请求的超时秒数，可以是(连接超时, 读取超时)，None使用Transport的设置
+            @param deadline: 包括重试在内的总耗时上限，单位秒，None为不限制
+        '''
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.deadline = deadline
+
+    def _delay(self, attempt):
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def _timeout(self, remaining):
+        ''' 本次请求的超时，不超过剩余时间
+        --
+        '''
+        timeout = self.timeout
+        if remaining is None:
+            return timeout
+        if timeout is None:
+            return remaining
+        if isinstance(timeout, tuple):
+            return tuple(min(t, remaining) for t in timeout)
+        return min(timeout, remaining)
+
+    def _send(self, transport, url, data, mch_id=None, before=None):
+        ''' 发送请求，失败时按策略重试
+        --
+            @param before: 每次请求前调用，如令牌桶限流，重试也计入限流
+            @return 最后一次返回的报文, 请求次数, 最后一次的异常，熔断打开时不重试
+        '''
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = None
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - start)
+            error = None
+            if before is not None:
+                before()
+            try:
+                text = transport.post(url, data, mch_id, timeout=self._timeout(remaining))
+                if not isTransient(text):
+                    return text, attempt, None
+            except CircuitOpenError as e:
+                return None, attempt, e
+            except transport.errors as e:
+                error = e
+                text = None
+
+            delay = self._delay(attempt)
+            if attempt > self.retries or (self.deadline is not None and
+                                          time.monotonic() - start + delay >= self.deadline):
+                return text, attempt, error
+            _log.warning('%s第%d次请求失败，%.2f秒后重试：%s' % (url, attempt, delay, error or '系统繁忙'))
+            time.sleep(delay)
+
+    def post(self, transport, url, data, mch_id=None):
+        ''' 发送请求，失败时按策略重试
+        --
+            @param transport: Transport
+            @param url: 接口地址
+            @param data: 已签名的请求体，每次重试原样发送
+            @param mch_id: 商户号
+            @return 最后一次请求返回的报文，网络错误重试用完时抛出最后一次的异常
+        '''
+        text, attempts, error = self._send(transport, url, data, mch_id)
+        if error is not None:
+            raise error
+        return text
+
+    async def apost(self, transport, url, data, mch_id=None):
+        ''' post的异步版本，transport为AsyncTransport
+        --
+        '''
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = None
+            if self.deadline is not None:
+                remaining = self.deadline - (time.monotonic() - start)
+            error = None
+            try:
+                text = await transport.post(url, data, mch_id, timeout=self._timeout(remaining))
+                if not isTransient(text):
+                    return text
+            except transport.errors as e:
+                error = e
+                text = None
+
+            delay = self._delay(attempt)
+            if attempt > self.retries or (self.deadline is not None and
+                                          time.monotonic() - start + delay >= self.deadline):
+                if error is not None:
+                    raise error
+                return text
+            _log.warning('%s第%d次请求失败，%.2f秒后重试：%s' % (url, attempt, delay, error or '系统繁忙'))
+            await asyncio.sleep(delay)
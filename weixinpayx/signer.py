@@ -0,0 +1,75 @@
+import hmac
+import hashlib
+from functools import lru_cache
+
+__all__ = ['Signer', 'getSigner']
+
+SIGN_TYPES = ('MD5', 'HMAC-SHA256')
+
+
+class Signer(object):
+
+    def __init__(self, key, sign_type='MD5'):
+        ''' 绑定一个商户密钥的签名器，密钥只编码一次，HMAC预先设置好密钥，每次签名复制使用
+        --
+            @param key: 商户平台API密钥
+            @param sign_type: 签名算法MD5或HMAC-SHA256
+        '''
+        if sign_type not in SIGN_TYPES:
+            raise Exception('只能是HMAC-SHA256或MD5')
+
+        self.key = key
+        self.sign_type = sign_type
+        # 拼在签名串最后的key
+        self._keyPart = 'key=' + key
+        if sign_type == 'HMAC-SHA256':
+            self._hmac = hmac.new(key.encode('utf-8'), digestmod=hashlib.sha256)
+        else:
+            self._hmac = None
+
+    def _signStr(self, values):
+        ''' 按字典序拼接非空参数，sign字段不参与签名
+        --
+        '''
+        parts = [f'{k}={v}' for k, v in sorted(values.items()) if v and k != 'sign']
+        parts.append(self._keyPart)
+        return '&'.join(parts).encode('utf-8')
+
+    def sign(self, values):
+        ''' 生成签名
+        --
+            @param values: 签名数据
+        '''
+        data = self._signStr(values)
+        if self._hmac is None:
+            return hashlib.md5(data).hexdigest().upper()
+        h = self._hmac.copy()
+        h.update(data)
+        return h.hexdigest().upper()
+
+    def signMany(self, valuesList):
+        ''' 批量签名
+        --
+            @param valuesList: 签名数据列表
+            @return 签名列表，顺序与valuesList一致
+        '''
+        sign = self.sign
+        return [sign(values) for values in valuesList]
+
+    def verify(self, values):
+        ''' 校验values中的sign字段
+        --
+            直接比较十六进制字符串，不再编码成字节串；非ASCII的sign一定不合法
+        '''
+        sign = values.get('sign')
+        if not sign or not isinstance(sign, str) or not sign.isascii():
+            return False
+        return hmac.compare_digest(self.sign(values), sign)
+
+
+@lru_cache(maxsize=256)
+def getSigner(key, sign_type='MD5'):
+    ''' 获取缓存的签名器，相同密钥和算法共享同一个
+    --
+    '''
+    return Signer(key, sign_type)
@@ -0,0 +1,204 @@
+import ssl
+import threading
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+__all__ = ['Transport', 'getDefaultTransport', 'setDefaultTransport', 'getCertTransport']
+
+# 默认共享连接池
+_default = None
+# 证书连接池，按(cert, key)路径缓存
+_certTransports = {}
+_lock = threading.Lock()
+
+
+class _CertAdapter(HTTPAdapter):
+    ''' 带客户端证书的连接池适配器
+    --
+        证书在创建时加载进SSLContext，之后所有连接复用该上下文，不再重复读取pem文件
+    '''
+
+    def __init__(self, cert, key, **kwargs):
+        # HTTPAdapter.__init__会调用init_poolmanager，必须先准备好ssl_context
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.load_cert_chain(cert, key)
+        super(_CertAdapter, self).__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super(_CertAdapter, self).init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, *args, **kwargs):
+        kwargs['ssl_context'] = self.ssl_context
+        return super(_CertAdapter, self).proxy_manager_for(*args, **kwargs)
+
+
+class Transport(object):
+
+    # 可以重试的网络错误
+    errors = (requests.RequestException,)
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, connect_timeout=5, read_timeout=10, keep_alive=True, pool_block=False, cert=None, key=None, limiter=None, base_url=None):
+        ''' 基于requests.Session的长连接池，可被Unifiedorder、Orderquery、Refund、RefundQuery共享
+        --
+            @param pool_connections: 缓存的连接池个数（按host区分）
+            @param pool_maxsize: 每个连接池保持的最大连接数
+            @param connect_timeout: 建立连接超时时间，单位秒
+            @param read_timeout: 读取响应超时时间，单位秒
+            @param keep_alive: 是否保持长连接
+            @param pool_block: 连接池满时是否阻塞等待，否则临时新建连接
+            @param cert, key: 微信支付证书路径，退款等接口需要
+            @param limiter: RateLimiter，按接口和商户号限流、熔断
+            @param base_url: 替换接口地址的域名，如备用域名https://api2.mch.weixin.qq.com或本地MockServer
+        '''
+        self.timeout = (connect_timeout, read_timeout)
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self.cert = cert
+        self.limiter = limiter
+        kwargs = {
+            'pool_connections': pool_connections,
+            'pool_maxsize': pool_maxsize,
+            'pool_block': pool_block,
+        }
+        if cert:
+            adapter = _CertAdapter(cert, key, **kwargs)
+        else:
+            adapter = HTTPAdapter(**kwargs)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+
+    def post(self, url, data, mch_id=None, timeout=None):
+        ''' 发送post请求
+        --
+            @param url: 接口地址
+            @param data: 请求的xml，字节串直接发送，字符串按utf-8编码
+            @param mch_id: 商户号，用于按商户限流
+            @param timeout: 本次请求的超时秒数或(连接超时, 读取超时)，默认使用创建时的设置
+            @return 响应体字节串，不经过requests按响应头猜测编码再解码
+            @raise requests.HTTPError: 状态码为5xx
+        '''
+        if self.base_url:
+            url = self.base_url + urlsplit(url).path
+        limiter = self.limiter
+        if limiter is None:
+            return self._post(url, data, timeout)
+
+        limiter.acquire(url, mch_id)
+        try:
+            text = self._post(url, data, timeout)
+        except self.errors as e:
+            limiter.record(url, mch_id, error=e)
+            raise
+        limiter.record(url, mch_id, text)
+        return text
+
+    def _post(self, url, data, timeout):
+        ''' 发送请求
+        --
+            负载均衡、代理返回的5xx错误页按网络错误处理，抛出的requests.HTTPError属于errors，可以重试，也计入熔断
+        '''
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        r = self.session.post(url, data, timeout=timeout or self.timeout)
+        if r.status_code >= 500:
+            r.raise_for_status()
+        return r.content
+
+    def stream(self, url, data, mch_id=None, timeout=None, chunk_size=64 * 1024):
+        ''' 发送post请求，分块读取响应体，用于下载对账单等大文件
+        --
+            请求和第一块响应体在调用时读取，用于记录限流和熔断结果，其余响应体在迭代时才读取
+            @param chunk_size: 每块的字节数
+            @return 响应体字节块的迭代器，迭代结束或关闭时释放连接
+            @raise requests.HTTPError: 状态码不是2xx
+        '''
+        if self.base_url:
+            url = self.base_url + urlsplit(url).path
+        limiter = self.limiter
+        if limiter is not None:
+            limiter.acquire(url, mch_id)
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        try:
+            r = self.session.post(url, data, timeout=timeout or self.timeout, stream=True)
+        except self.errors as e:
+            if limiter is not None:
+                limiter.record(url, mch_id, error=e)
+            raise
+        chunks = r.iter_content(chunk_size)
+        try:
+            # 先读第一块，失败时微信返回的是xml报文，与post一样按报文内容记录结果
+            first = next(chunks, b'')
+        except self.errors as e:
+            r.close()
+            if limiter is not None:
+                limiter.record(url, mch_id, error=e)
+            raise
+        error = None
+        if not 200 <= r.status_code < 300:
+            # 负载均衡、代理返回的错误页，不能当作账单内容
+            error = requests.HTTPError('HTTP %d：%r' % (r.status_code, first[:200]), response=r)
+        if limiter is not None:
+            if r.status_code >= 500:
+                limiter.record(url, mch_id, error=error)
+            else:
+                limiter.record(url, mch_id, first if first.lstrip()[:5] == b'<xml>' else None)
+        if error is not None:
+            r.close()
+            raise error
+        return self._iterContent(r, first, chunks)
+
+    def _iterContent(self, r, first, chunks):
+        with r:
+            if first:
+                yield first
+            yield from chunks
+
+    def close(self):
+        ''' 关闭连接池
+        --
+        '''
+        self.session.close()
+
+
+def getDefaultTransport():
+    ''' 获取全局共享的连接池
+    --
+    '''
+    global _default
+    if _default is None:
+        with _lock:
+            if _default is None:
+                _default = Transport()
+    return _default
+
+
+def setDefaultTransport(transport):
+    ''' 替换全局共享的连接池，如录制或回放时替换为RecordingTransport、ReplayTransport
+    --
+        @param transport: 与Transport接口一致的对象，None时下次使用重新创建
+    '''
+    global _default
+    with _lock:
+        _default = transport
+
+
+def getCertTransport(cert, key):
+    ''' 获取带证书的连接池，相同证书路径共享同一个连接池
+    --
+        @param cert, key: 微信支付证书路径
+    '''
+    k = (cert, key)
+    transport = _certTransports.get(k)
+    if transport is None:
+        with _lock:
+            transport = _certTransports.get(k)
+            if transport is None:
+                transport = Transport(cert=cert, key=key)
+                _certTransports[k] = transport
+    return transport
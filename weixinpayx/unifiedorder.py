@@ -1,8 +1,13 @@
-import json
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 import time
+import hashlib
 import logging
-import requests
-from .wx_utils import getRandomStr, createSign, decodeXML, encodeXML, post
+from .cache import SingleFlight
+from .models import MerchantConfig, ApiRequest, UnifiedorderResult
+from .signer import Signer
+from .metrics import startCall, NULL_CALL
+from .wx_utils import getRandomStr, dumpXML, encodeXML, post
 
 __all__ = ['Unifiedorder']
 
@@ -13,24 +18,31 @@ _log = logging.getLogger()
 
 class Unifiedorder(object):
 
-    def __init__(self, appid, mch_id, key):
+    def __init__(self, appid, mch_id, key, transport=None):
         ''' 商户在小程序中先调用该接口在微信支付服务后台生成预支付交易单，返回正确的预支付交易后调起支付。
         --
             @param appid: 微信分配的小程序ID
             @param mch_id: 微信支付分配的商户号
             @param key: key设置路径：微信商户平台(pay.weixin.qq.com)-->账户设置-->API安全-->密钥设置
+            @param transport: 连接池，默认使用全局共享的Transport
         '''
+        # 商户配置，不随请求变化
+        self.config = MerchantConfig(appid, mch_id, key)
+        self.signer = Signer(key)
+        # 可选参数的默认值，设置时整体替换，请求时不修改，可在多个线程间共享
         self.values = {}
-        self.values['appid'] = appid
-        self.values['mch_id'] = mch_id
-        self.key = key
-        self.sign_type = 'MD5'
+        self.transport = transport
+        self.retry = None
+        self.typed = False
+        self.prepayCache = None
+        self.prepay_ttl = None
+        self._flight = SingleFlight()
 
     def setDeviceInfo(self, device_info):
         ''' 自定义参数，可以为终端设备号(门店号或收银设备ID)，PC网页或公众号内支付可以传"WEB"
         --
         '''
-        self.values['device_info'] = device_info
+        self.values = dict(self.values, device_info=device_info)
         return self
 
     def setSignType(self, sign_type='MD5'):
@@ -38,73 +50,99 @@ class Unifiedorder(object):
         --
             @param sign_type: 签名类型['MD5', 'HMAC-SHA256']
         '''
-        if sign_type != 'MD5' or sign_type != 'HMAC-SHA256':
-            raise Exception('只能是HMAC-SHA256或MD5')
+        self.signer = Signer(self.config.key, sign_type)
+        self.config = self.config._replace(sign_type=sign_type)
+        # 非MD5签名时需要在请求中带上sign_type
+        self.values = dict(self.values, sign_type=sign_type)
+        return self
+
+    def setTyped(self, typed=True):
+        ''' 返回UnifiedorderResult对象代替字典，金额等数值字段解析为int，字段存放在__slots__中，占用内存更少
+        --
+        '''
+        self.typed = typed
+        return self
+
+    def setRetry(self, retry=None):
+        ''' 设置失败重试策略，重试时原样发送同一个已签名的请求
+        --
+            @param retry: RetryPolicy，None为不重试
+        '''
+        self.retry = retry
+        return self
 
-        self.sign_type = sign_type
+    def setPrepayCache(self, cache=None, ttl=6900):
+        ''' 缓存预支付交易单，重复点击、刷新页面等同一订单参数不变的重复下单直接返回缓存的prepay_id，并重新做二次签名
+        --
+            缓存key为商户号、out_trade_no和除nonce_str、sign外所有请求参数的摘要，参数变化时重新下单
+            @param cache: LRUCache或RedisCache，None为不缓存
+            @param ttl: 缓存秒数，prepay_id有效期2小时，默认提前5分钟过期给用户留出支付时间
+        '''
+        self.prepayCache = cache
+        self.prepay_ttl = ttl
         return self
 
     def setBody(self, body=''):
         ''' 商品简单描述，该字段请按照规范传递
         --
         '''
-        self.values['body'] = body
+        self.values = dict(self.values, body=body)
         return self
 
     def setDetail(self, detail=''):
         ''' 商品详细描述，对于使用单品优惠的商户，该字段必须按照规范上传
         --
         '''
-        self.values['detail'] = detail
+        self.values = dict(self.values, detail=detail)
         return self
 
     def setAttach(self, attach=''):
         ''' 附加数据，在查询API和支付通知中原样返回，可作为自定义参数使用
         --
         '''
-        self.values['attach'] = attach
+        self.values = dict(self.values, attach=attach)
         return self
 
     def setFeeType(self, fee_type='CNY'):
         ''' 符合ISO 4217标准的三位字母代码，默认人民币：CNY
         --
         '''
-        self.values['fee_type'] = fee_type
+        self.values = dict(self.values, fee_type=fee_type)
         return self
 
     def setGoodsTag(self, goods_tag=''):
         ''' 订单优惠标记，使用代金券或立减优惠功能时需要的参数
         --
         '''
-        self.values['goods_tag'] = goods_tag
+        self.values = dict(self.values, goods_tag=goods_tag)
         return self
 
     def noCredit(self):
         ''' 不允许使用信用卡。默认允许使用
         --
         '''
-        self.values['limit_pay'] = 'no_credit'
+        self.values = dict(self.values, limit_pay='no_credit')
         return self
 
     def useCredit(self):
         ''' 允许使用信用卡，默认值
         --
         '''
-        self.values['limit_pay'] = ''
+        self.values = dict(self.values, limit_pay='')
         return self
 
     def receipt(self):
         ''' 支付成功消息和支付详情页将出现开票入口。需要在微信支付商户平台或微信公众平台开通电子发票功能，才可生效。默认不开启
         --
         '''
-        self.values['receipt'] = 'Y'
+        self.values = dict(self.values, receipt='Y')
         return self
 
     def noReceipt(self):
         ''' 不提供开票入口，默认值
         --
         '''
-        self.values['receipt'] = ''
+        self.values = dict(self.values, receipt='')
         return self
 
     def pay(self, total_fee, out_trade_no, body, spbill_create_ip, notify_url, trade_type='JSAPI', openid='', product_id='', time_start='', time_expire='', scene_info=''):
@@ -125,39 +163,157 @@ class Unifiedorder(object):
             @return 成功：微信返回的结果（后端保存支付结果用）, 二次签名（将此签名发给前端）
             @return 失败：False, 失败原因
         '''
+        with startCall('unifiedorder', self.config.mch_id) as call:
+            request = self._prepare(total_fee, out_trade_no, body, spbill_create_ip, notify_url, trade_type,
+                                   openid, product_id, time_start, time_expire, scene_info, call=call)
+            if request is None:
+                return False, '参数不合法，请检查请求参数！'
+            if self.prepayCache is None:
+                res, msg = self._send(request, call)
+            else:
+                key, res = self._fromCache(request, call)
+                if res is None:
+                    # 并发的重复下单只请求一次，共享的是解析后的原始字典，各调用方分别生成返回值和二次签名
+                    (res, msg), shared = self._flight.do(key, self._send, request, call, key)
+                    if shared:
+                        call.done(res)
+            if res is False:
+                return res, msg
+            return self._result(res)
+
+    def payMany(self, carts, concurrency=10):
+        ''' 并发下单，所有请求共享同一个连接池
+        --
+            @param carts: 每项为pay的参数字典
+            @param concurrency: 并发数，不超过Transport的pool_maxsize时连接全部复用
+            @return 与carts顺序一致的pay返回值列表，参数不合法抛出异常时对应位置为(False, 异常信息)
+        '''
+        def payOne(cart):
+            try:
+                return self.pay(**cart)
+            except Exception as e:
+                _log.error('下单失败：%s' % e)
+                return False, str(e)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            return list(executor.map(payOne, carts))
+
+    def _send(self, request, call=NULL_CALL, key=None):
+        ''' 发送请求并解析，传入key时把成功的结果写入预支付缓存
+        --
+            @return 成功：解析后的字典, None
+            @return 失败：False, 失败原因
+        '''
+        text = self._post(request)
+        call.lap('http')
+        res, msg = self._decode(text, call)
+        self._toCache(key, res)
+        return res, msg
+
+    def _prepayKey(self, values):
+        parts = [f'{k}={v}' for k, v in sorted(values.items()) if v and k != 'nonce_str' and k != 'sign']
+        digest = hashlib.md5('&'.join(parts).encode('utf-8')).hexdigest()
+        return 'prepay:%s:%s:%s' % (self.config.mch_id, values['out_trade_no'], digest)
+
+    def _fromCache(self, request, call=NULL_CALL):
+        ''' 查询预支付缓存
+        --
+            @return 缓存key, 命中时缓存的字典，未命中为None
+        '''
+        key = self._prepayKey(request.values)
+        res = self.prepayCache.get(key)
+        if res is not None:
+            call.done(res)
+        return key, res
+
+    def _toCache(self, key, res):
+        ''' 成功的结果写入预支付缓存，返回给调用方的都是_result生成的新对象，缓存中的字典不会被修改
+        --
+        '''
+        if key is not None and res is not False:
+            self.prepayCache.set(key, res, self.prepay_ttl)
+
+    def _result(self, res):
+        ''' pay的返回值，每次返回新的对象，调用方修改不影响缓存
+        --
+        '''
+        return (UnifiedorderResult.fromDict(res) if self.typed else dict(res)), self._reSign(res)
+
+    def _prepare(self, total_fee, out_trade_no, body, spbill_create_ip, notify_url, trade_type, openid, product_id, time_start, time_expire, scene_info, call=NULL_CALL):
+        ''' 生成请求参数并签名
+        --
+            @return ApiRequest，参数不合法时返回None
+        '''
+        values = dict(self.values, appid=self.config.appid, mch_id=self.config.mch_id)
         if trade_type == 'JSAPI' and openid == '':
             raise Exception('trade_type=JSAPI，openid必传')
         if trade_type == 'NATIVE' and product_id == '':
             raise Exception(' trade_type=NATIVE时，product_id必传')
 
-        self.values['total_fee'] = total_fee
-        self.values['out_trade_no'] = out_trade_no
-        self.values['body'] = body
-        self.values['spbill_create_ip'] = spbill_create_ip
-        self.values['notify_url'] = notify_url
-        self.values['trade_type'] = trade_type
-        self.values['openid'] = openid
-        self.values['product_id'] = product_id
-        self.values['time_start'] = time_start
-        self.values['time_expire'] = time_expire
-        self.values['scene_info'] = scene_info
+        values['total_fee'] = total_fee
+        values['out_trade_no'] = out_trade_no
+        values['body'] = body
+        values['spbill_create_ip'] = spbill_create_ip
+        values['notify_url'] = notify_url
+        values['trade_type'] = trade_type
+        values['openid'] = openid
+        values['product_id'] = product_id
+        values['time_start'] = time_start
+        values['time_expire'] = time_expire
+        values['scene_info'] = scene_info
 
         # 随机数
-        self.values['nonce_str'] = getRandomStr()
+        values['nonce_str'] = getRandomStr()
+        call.lap('nonce')
         # 生成签名
-        sign = createSign(self.values, self.key, self.sign_type)
-        self.values['sign'] = sign
-        if self._checkValues():
-            xmlStr = decodeXML(self.values)
-            res1 = post(_URL, xmlStr)
-            res2 = encodeXML(res1)
-            if self._checkValues(res2):
-                return res2, self._reSign(res2)
-            else:
-                _log.error('用户请求支付失败，返回结果：%s' % res2)
-                return False, '返回参数校验不通过或者请求失败!'
+        sign = self.signer.sign(values)
+        values['sign'] = sign
+        call.lap('sign')
+        if self._checkRequest(values):
+            request = ApiRequest(_URL, MappingProxyType(values), dumpXML(values))
+            call.lap('encode')
+            return request
+        return None
+
+    def _post(self, request):
+        ''' 发送请求，设置了重试策略时失败重试
+        --
+        '''
+        if self.retry is None:
+            return post(request.url, request.body, self.transport, self.config.mch_id)
+        from .transport import getDefaultTransport
+        transport = self.transport or getDefaultTransport()
+        return self.retry.post(transport, request.url, request.body, self.config.mch_id)
+
+    def _parse(self, text, call=NULL_CALL):
+        ''' 解析并校验返回结果
+        --
+            @return 同pay
+        '''
+        res, msg = self._decode(text, call)
+        if res is False:
+            return res, msg
+        return self._result(res)
+
+    def _decode(self, text, call=NULL_CALL):
+        ''' 解析并校验返回结果
+        --
+            @return 成功：解析后的字典, None
+            @return 失败：False, 失败原因
+        '''
+        res = encodeXML(text)
+        call.lap('decode')
+        ok = self._checkValues(res)
+        call.lap('verify')
+        call.done(res)
+        if ok:
+            if res.get('result_code') != 'SUCCESS':
+                _log.error('下单失败，返回结果：%s' % res)
+                return False, res.get('err_code_des') or res.get('err_code') or '下单失败'
+            return res, None
         else:
-            return False, '参数不合法，请检查请求参数！'
+            _log.error('用户请求支付失败，返回结果：%s' % res)
+            return False, '返回参数校验不通过或者请求失败!'
 
     def _reSign(self, res):
         ''' 二次签名
@@ -167,38 +323,37 @@ class Unifiedorder(object):
         re['appId'] = res['appid']
         re['timeStamp'] = str(int(time.time()))
         re['package'] = 'prepay_id=' + res['prepay_id']
-        re['signType'] = self.sign_type
+        re['signType'] = self.config.sign_type
         re['nonceStr'] = getRandomStr()
-        sign = createSign(re, self.key, self.sign_type)
+        sign = self.signer.sign(re)
         re['paySign'] = sign
         return re
 
-    def _checkValues(self, values=None):
-        ''' 检查参数是否合法
+    def _checkValues(self, values):
+        ''' 检查返回参数是否合法
         --
-        :param values:如果为空检查请求参数，否则检查返回参数
+        :param values:返回参数
         '''
-        if values:
-            if values['return_code'] == 'SUCCESS':
-                v = values.copy()
-                sign = v['sign']
-                v.pop('sign')
-                sign2 = createSign(v, self.key, self.sign_type)
-                if sign2 == sign:
+        if values and values.get('return_code') == 'SUCCESS':
+            return self.signer.verify(values)
+
+        return False
+
+    def _checkRequest(self, values):
+        ''' 检查请求参数是否合法
+        --
+        :param values:请求参数
+        '''
+        if all(k in values for k in ('appid', 'mch_id', 'nonce_str', 'body', 'out_trade_no', 'total_fee', 'spbill_create_ip', 'notify_url', 'trade_type', 'sign')):
+            if values['trade_type'] == 'NATIVE':
+                if 'product_id' in values:
+                    return True
+                else:
+                    return False
+            if values['trade_type'] == 'JSAPI':
+                if 'openid' in values:
                     return True
                 else:
                     return False
-        else:
-            if all(k in self.values for k in ('appid', 'mch_id', 'nonce_str', 'body', 'out_trade_no', 'total_fee', 'spbill_create_ip', 'notify_url', 'trade_type', 'sign')):
-                if self.values['trade_type'] == 'NATIVE':
-                    if 'product_id' in self.values:
-                        return True
-                    else:
-                        return False
-                if self.values['trade_type'] == 'JSAPI':
-                    if 'openid' in self.values:
-                        return True
-                    else:
-                        return False
 
         return False
@@ -1,29 +1,18 @@
-from .dict2xml import Dict2XML
-from .xml2dict import XML2Dict
-from random import Random
-import requests
-import hashlib
-import base64
-import hmac
+from . import xmlcodec
+from .signer import getSigner
+from .nonce import getNonceSource
 import json
 
 __all__ = ['getRandomStr', 'createSign',
-           'decodeXML', 'encodeXML', 'post', 'getIp']
-
-_chars = 'AaBbCcDdEeFfGgHhIiJjKkLlMmNnOoPpQqRrSsTtUuVvWwXxYyZz0123456789'
+           'decodeXML', 'dumpXML', 'encodeXML', 'post', 'getIp']
 
 
 def getRandomStr(length=16):
     ''' 获取随机字符串
     --
+        默认从全局NonceGenerator取，可通过nonce.setNonceSource换成NoncePool
     '''
-    salt = ''
-    len_chars = len(_chars) - 1
-    random = Random()
-    for i in range(length):
-        # 每次从chars中随机取一位
-        salt += _chars[random.randint(0, len_chars)]
-    return salt
+    return getNonceSource().next(length)
 
 
 def createSign(values, key, sign_type='MD5'):
@@ -33,29 +22,7 @@ def createSign(values, key, sign_type='MD5'):
         @param key：签名key
         @param sign_type：签名算法MD5或HMAC-SHA256
     '''
-    # 字典序
-    sortArr = sorted(values.items(), key=lambda item: item[0])
-    signStr = ''
-    # 拼接
-    for i in sortArr:
-        if i[1]:
-            signStr += str(i[0]) + '=' + str(i[1]) + '&'
-
-    # 最后再拼上key
-    signStr += 'key=' + key
-
-    if sign_type == 'MD5':
-        # MD5签名
-        m2 = hashlib.md5()
-        m2.update(signStr.encode('utf-8'))
-        return m2.hexdigest().upper()
-    elif sign_type == 'HMAC-SHA256':
-        appsecret = key.encode('utf-8')  # 秘钥
-
-        data = signStr.encode('utf-8')  # 加密数据
-        signature = base64.b64encode(
-            hmac.new(appsecret, data, digestmod=hashlib.sha256).digest())
-        return signature.upper()
+    return getSigner(key, sign_type).sign(values)
 
 
 def decodeXML(data, rootName='xml'):
@@ -64,40 +31,45 @@ def decodeXML(data, rootName='xml'):
         @param data
         @param rootName:跟节点名字
     '''
-    values = {rootName: {}}
+    return dumpXML(data, rootName).decode('utf-8')
+
+
+def dumpXML(data, rootName='xml'):
+    ''' 字典编码成utf-8的XML字节串，可以直接作为请求体发送
+    --
+        @param data: 字典，值为列表、字典时编码成json
+        @param rootName: 根节点名字
+    '''
+    values = {}
     for k, v in data.items():
-        if v:
-            if not isinstance(v, str):
-                if isinstance(v, list) or isinstance(v, dict) or isinstance(v, tuple):
-                    v = json.dumps(v)
-                else:
-                    v = str(v)
-            values[rootName][k] = v
-    x = Dict2XML()
-    return x.parse(values)
+        if isinstance(v, list) or isinstance(v, dict) or isinstance(v, tuple):
+            v = json.dumps(v)
+        values[k] = v
+    return xmlcodec.dumps(values, rootName)
 
 
 def encodeXML(xmlStr, rootName='xml'):
     ''' XML解析成字典
     -- 
-        @param data
+        @param xmlStr: XML，可以直接传入响应体的字节串，按XML声明的编码（默认utf-8）解析
         @param rootName:跟节点名字
     '''
-    x = XML2Dict()
-    res = x.parse(xmlStr)[rootName]
-    for k, v in res.items():
-        if isinstance(v, bytes):
-            res[k] = v.decode('UTF-8')
-    return res
+    return xmlcodec.loads(xmlStr, rootName)
 
 
-def post(url, data):
+def post(url, data, transport=None, mch_id=None):
     ''' 发送post请求
     --
+        @param data: 请求的XML，字节串或字符串
+        @return 响应体字节串
+        @param transport: 连接池，默认使用全局共享的Transport
+        @param mch_id: 商户号，Transport按商户限流时使用
     '''
-    r = requests.post(url, data.encode('utf-8'))
-    text = r.text.encode(r.encoding).decode('utf-8')
-    return text
+    if transport is None:
+        # requests只在真正发送请求时才导入
+        from .transport import getDefaultTransport
+        transport = getDefaultTransport()
+    return transport.post(url, data, mch_id)
 
 
 def getIp(env):
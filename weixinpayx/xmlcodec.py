@@ -0,0 +1,65 @@
+try:
+    import xml.etree.ElementTree as ET
+except:
+    import cElementTree as ET
+from .dict2xml import Dict2XML
+from .xml2dict import XML2Dict
+
+__all__ = ['dumps', 'loads']
+
+# 微信支付的报文都是只有一层的<xml>，按这种结构单独做编解码，嵌套的报文仍走Dict2XML、XML2Dict
+# 解析用C实现的TreeBuilder建树后只遍历一层，实测比XMLParser自定义target或XMLPullParser逐个回调Python更快
+
+
+def _cdata(v):
+    ''' CDATA中不能出现]]>，拆成两段
+    --
+    '''
+    return v.replace(']]>', ']]]]><![CDATA[>')
+
+
+def dumps(data, rootName='xml'):
+    ''' 一层的字典直接编码成xml字节串，值为空的字段跳过
+    --
+        @param data: 字典
+        @param rootName: 根节点名字
+    '''
+    parts = ['<', rootName, '>']
+    append = parts.append
+    for k, v in data.items():
+        if not v:
+            continue
+        if not isinstance(v, str):
+            if isinstance(v, (dict, list, tuple)):
+                # 嵌套结构，整体交给通用实现
+                return Dict2XML().parse({rootName: data}).encode('utf-8')
+            v = str(v)
+        append('<')
+        append(k)
+        append('><![CDATA[')
+        append(_cdata(v) if ']]>' in v else v)
+        append(']]></')
+        append(k)
+        append('>')
+    parts.append('</')
+    parts.append(rootName)
+    parts.append('>')
+    return ''.join(parts).encode('utf-8')
+
+
+def loads(data, rootName='xml'):
+    ''' xml解析成字典，一层的报文直接取子节点文本，嵌套的报文回退到XML2Dict
+    --
+        @param data: xml，bytes或字符串
+        @param rootName: 根节点名字
+    '''
+    root = ET.fromstring(data)
+    if root.tag != rootName:
+        raise KeyError(rootName)
+    values = {}
+    for child in root:
+        if len(child) or child.attrib or child.tag in values:
+            return XML2Dict()._make_dict(root)
+        text = child.text
+        values[child.tag] = text.strip() if text else ''
+    return values